@@ -1,11 +1,11 @@
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Form, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from jose import jwt
 from passlib.context import CryptContext
 from core.db import get_db
-from core.deps import get_current_user
+from core.deps import CurrentUser, get_current_user, principal_cache
 from models.Models import AppUser
 
 # from models import AppUser
@@ -60,7 +60,10 @@ def login(
 
 
 @router.post("/logout")
-def logout():
+def logout(request: Request):
+    token = request.cookies.get("access_token")
+    if token:
+        principal_cache.invalidate_token(token)
     response = JSONResponse({"message": "Logged out"})
     response.delete_cookie("access_token")
     return response
@@ -107,8 +110,32 @@ def register(
     return response
 
 
+@router.post("/change-password")
+def change_password(
+    current_password: str = Form(...),
+    new_password: str = Form(...),
+    db: Session = Depends(get_db),
+    me: CurrentUser = Depends(get_current_user),
+):
+    user = db.get(AppUser, me.user_id)
+    if not user or not user.verify_password(current_password):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    user.set_password(new_password)
+    db.commit()
+    # cached principals for any of this user's tokens go with the old password
+    principal_cache.invalidate_user(me.user_id)
+    return {"message": "Password changed"}
+
+
 @router.get("/me")
-def get_profile(user: AppUser = Depends(get_current_user)):
+def get_profile(
+    me: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    user = db.get(AppUser, me.user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
     return {
         "display_name": user.display_name,
         "last_login": user.last_login,
@@ -5,6 +5,7 @@ from core.db import get_db
 from core.deps import get_current_user
 from models.Models import DocumentChunk
 from schemas.chunks import ChunkBatchIn, ChunkOut
+from services.acl_service import visibility_for
 
 router = APIRouter()
 
@@ -31,8 +32,10 @@ def get_chunks_batch(
         .all()
     )
 
-    # Return in the same order requested
-    by_id = {r.chunk_id: r for r in rows}
+    # Return in the same order requested; chunks of documents the caller
+    # can't see are left out like unknown ids
+    visibility = visibility_for(db, me)
+    by_id = {r.chunk_id: r for r in rows if visibility.can_see(int(r.doc_id))}
     out: list[ChunkOut] = []
     for cid in chunk_ids:
         r = by_id.get(cid)
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from core.db import get_db
 from core.deps import get_current_user
+from core.pagination import decode_cursor, encode_cursor
 from core.config import settings
 from schemas.conversations import (
     ConversationCreate,
@@ -12,6 +16,7 @@ from schemas.conversations import (
     ChatMessageRecord,
 )
 from models.Models import Conversation, MessageCitation, Message
+from services.acl_service import visibility_for
 from services.ollama_client import OllamaClient
 from services.retrieval_service import RetrievalService
 from services.chat_service import ChatService
@@ -81,23 +86,14 @@ async def send_message(
             k_vec=k_vec,
             k_text=k_text,
             use_text=body.use_text,
+            visibility=visibility_for(db, me),
         )
     except ValueError as e:
         raise HTTPException(404, str(e))
     except Exception as e:
         raise HTTPException(500, f"Chat failed: {e}")
 
-    citations = [
-        Citation(
-            chunk_id=c.chunk_id,
-            doc_id=c.doc_id,
-            page_start=c.page_start,
-            page_end=c.page_end,
-            section_path=c.section_path,
-            score=float(c.score or 0.0),
-        )
-        for c in (citations_rows or [])
-    ]
+    citations = [Citation(**c) for c in (citations_rows or [])]
 
     return ChatMessageOut(
         conversation_id=conversation_id,
@@ -107,14 +103,7 @@ async def send_message(
     )
 
 
-@router.get(
-    "/conversations/{conversation_id}/messages", response_model=list[ChatMessageRecord]
-)
-def list_messages(
-    conversation_id: int,
-    db: Session = Depends(get_db),
-    me=Depends(get_current_user),
-):
+def _get_own_conversation(db: Session, conversation_id: int, me) -> Conversation:
     convo = (
         db.query(Conversation)
         .filter(
@@ -126,47 +115,121 @@ def list_messages(
     )
     if not convo:
         raise HTTPException(404, "Conversation not found")
+    return convo
 
-    msgs = (
-        db.query(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at.asc())
-        .all()
-    )
 
-    msg_ids = [m.message_id for m in msgs]
-    cits = (
-        db.query(MessageCitation).filter(MessageCitation.message_id.in_(msg_ids)).all()
+def _citation_out(c: MessageCitation) -> Citation:
+    return Citation(
+        chunk_id=c.chunk_id,
+        doc_id=c.doc_id,
+        page_start=c.page_start,
+        page_end=c.page_end,
+        section_path=c.section_path,
+        score=float(c.score or 0.0),
     )
 
-    cits_by_msg: dict[int, list[MessageCitation]] = {}
-    for c in cits:
-        cits_by_msg.setdefault(c.message_id, []).append(c)
-
-    out = []
-    for m in msgs:
-        citations = [
-            Citation(
-                chunk_id=c.chunk_id,
-                doc_id=c.doc_id,
-                page_start=c.page_start,
-                page_end=c.page_end,
-                section_path=c.section_path,
-                score=float(c.score or 0.0),
-            )
-            for c in sorted(
-                cits_by_msg.get(m.message_id, []),
-                key=lambda x: (x.score or 0),
-                reverse=True,
-            )
-        ]
-        out.append(
-            ChatMessageRecord(
-                message_id=m.message_id,
-                role=m.role,
-                content=m.content,
-                citations=citations if m.role == "assistant" else [],
+
+@router.get(
+    "/conversations/{conversation_id}/messages", response_model=list[ChatMessageRecord]
+)
+def list_messages(
+    conversation_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_citations: bool = True,
+    db: Session = Depends(get_db),
+    me=Depends(get_current_user),
+):
+    """
+    Without `limit` (and cursor) the whole history is returned, as before
+    pagination. With it, pages walk from the newest message back (keyset on
+    created_at, message_id); X-Next-Cursor points at the next older page.
+    Messages in a page are returned oldest-first for display. Citations are
+    loaded for the returned assistant messages only, already ordered by
+    score, or skipped with include_citations=false (then fetch them per
+    message from /messages/{message_id}/citations).
+    """
+    _get_own_conversation(db, conversation_id, me)
+    try:
+        before = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    q = db.query(
+        Message.message_id, Message.role, Message.content, Message.created_at
+    ).filter(Message.conversation_id == conversation_id)
+    if before:
+        created_at, message_id = before
+        q = q.filter(
+            or_(
+                Message.created_at < created_at,
+                and_(
+                    Message.created_at == created_at, Message.message_id < message_id
+                ),
             )
         )
+    q = q.order_by(Message.created_at.desc(), Message.message_id.desc())
+    if limit is None and cursor:
+        limit = 50
+    msgs = q.limit(limit + 1).all() if limit is not None else q.all()
+    if limit is not None and len(msgs) > limit:
+        msgs = msgs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            msgs[-1].created_at, msgs[-1].message_id
+        )
+    msgs.reverse()
+
+    cits_by_msg: dict[int, list[Citation]] = {}
+    asst_ids = [m.message_id for m in msgs if m.role == "assistant"]
+    if include_citations and asst_ids:
+        cq = db.query(MessageCitation)
+        if limit is None:
+            # whole history: join instead of binding an unbounded id list
+            # (Oracle caps IN lists at 1000 expressions)
+            cq = cq.join(
+                Message, Message.message_id == MessageCitation.message_id
+            ).filter(Message.conversation_id == conversation_id)
+        else:
+            # at most `limit` (<= 200) ids
+            cq = cq.filter(MessageCitation.message_id.in_(asst_ids))
+        cits = cq.order_by(
+            MessageCitation.message_id,
+            MessageCitation.score.desc().nullslast(),
+        ).all()
+        for c in cits:
+            cits_by_msg.setdefault(c.message_id, []).append(_citation_out(c))
+
+    return [
+        ChatMessageRecord(
+            message_id=m.message_id,
+            role=m.role,
+            content=m.content,
+            citations=cits_by_msg.get(m.message_id, []),
+        )
+        for m in msgs
+    ]
 
-    return out
+
+@router.get(
+    "/conversations/{conversation_id}/messages/{message_id}/citations",
+    response_model=list[Citation],
+)
+def list_message_citations(
+    conversation_id: int,
+    message_id: int,
+    db: Session = Depends(get_db),
+    me=Depends(get_current_user),
+):
+    _get_own_conversation(db, conversation_id, me)
+    cits = (
+        db.query(MessageCitation)
+        .join(Message, Message.message_id == MessageCitation.message_id)
+        .filter(
+            Message.conversation_id == conversation_id,
+            MessageCitation.message_id == message_id,
+        )
+        .order_by(MessageCitation.score.desc().nullslast())
+        .all()
+    )
+    return [_citation_out(c) for c in cits]
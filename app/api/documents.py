@@ -1,9 +1,23 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Response
+from sqlalchemy import and_, func, or_, select, text
 from sqlalchemy.orm import Session
 
 from core.db import get_db
 from core.deps import get_current_user
-from schemas.documents import DocumentOut, UploadResponse
+from core.pagination import decode_cursor, encode_cursor
+from schemas.documents import (
+    DocumentOut,
+    DocumentPermissionIn,
+    DocumentPermissionOut,
+    UploadResponse,
+)
+from services import acl_service
 from services.ingestion_service import IngestionService
 from models.Models import Document
 from schemas.documents import ProcessResponse
@@ -17,6 +31,21 @@ from core.config import settings
 
 router = APIRouter()
 
+# only what DocumentOut needs
+LIST_COLUMNS = (
+    Document.doc_id,
+    Document.title,
+    Document.filename,
+    Document.mime_type,
+    Document.status,
+    Document.tenant_id,
+    Document.owner_user_id,
+    Document.created_at,
+)
+
+_count_cache: Dict[Tuple, Tuple[float, str]] = {}
+_count_cache_lock = threading.Lock()
+
 
 @router.post("/documents", response_model=UploadResponse)
 async def upload_document(
@@ -26,20 +55,63 @@ async def upload_document(
     me=Depends(get_current_user),
 ):
 
-    data = await file.read()
-    if not data:
+    # Stream the upload in fixed-size pieces: hash incrementally and enforce
+    # the size limit without ever holding the whole file in memory.
+    # (UploadFile is already spooled to a temp file by the multipart parser.)
+    h = hashlib.sha256()
+    size = 0
+    while True:
+        piece = await file.read(settings.UPLOAD_CHUNK_BYTES)
+        if not piece:
+            break
+        size += len(piece)
+        if size > settings.UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                413, f"File exceeds limit of {settings.UPLOAD_MAX_BYTES} bytes"
+            )
+        h.update(piece)
+    if size == 0:
         raise HTTPException(400, "Empty file")
+    await file.seek(0)
+    digest = h.hexdigest()
 
     svc = IngestionService()
-    doc, ver = svc.create_document_with_version(
+
+    if settings.UPLOAD_DEDUP:
+        source = svc.find_ready_duplicate(db, tenant_id=me.tenant_id, digest=digest)
+        if source:
+            doc, ver = svc.create_deduplicated_document(
+                db=db,
+                tenant_id=me.tenant_id,
+                owner_user_id=me.user_id,
+                filename=file.filename,
+                mime_type=file.content_type,
+                title=title,
+                source=source,
+                size_bytes=size,
+            )
+            # allow-list visibility sets don't know the new doc yet
+            acl_service.visibility_cache.invalidate_tenant(db, me.tenant_id)
+            return UploadResponse(
+                doc_id=doc.doc_id,
+                version_id=ver.version_id,
+                status=doc.status,
+                job_id=None,
+            )
+
+    # LOB write is blocking I/O proportional to file size; keep it off the loop
+    doc, ver = await asyncio.to_thread(
+        svc.create_document_with_version,
         db=db,
         tenant_id=me.tenant_id,
         owner_user_id=me.user_id,
         filename=file.filename,
         mime_type=file.content_type,
         title=title,
-        file_bytes=data,
+        fileobj=file.file,
+        digest=digest,
     )
+    acl_service.visibility_cache.invalidate_tenant(db, me.tenant_id)
     job = JobService().enqueue_ingest(db, tenant_id=me.tenant_id, doc_id=doc.doc_id)
     print(job)
     return UploadResponse(
@@ -71,20 +143,166 @@ def to_document_out(
     return out
 
 
+def _estimate_count(db: Session, filters: list, key: Tuple) -> str:
+    """
+    Matching rows, capped at DOCUMENT_COUNT_CAP ("10000+") and cached for
+    DOCUMENT_COUNT_TTL_SECONDS per principal/filter set: the list is polled,
+    and an exact COUNT(*) over a large tenant costs more than the page.
+    """
+    now = time.monotonic()
+    with _count_cache_lock:
+        hit = _count_cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+
+    cap = settings.DOCUMENT_COUNT_CAP
+    capped = select(Document.doc_id).where(*filters).limit(cap + 1).subquery()
+    n = db.execute(select(func.count()).select_from(capped)).scalar() or 0
+    value = f"{cap}+" if n > cap else str(n)
+
+    with _count_cache_lock:
+        if len(_count_cache) > 10_000:
+            _count_cache.clear()
+        _count_cache[key] = (now + settings.DOCUMENT_COUNT_TTL_SECONDS, value)
+    return value
+
+
 @router.get("/documents", response_model=list[DocumentOut])
 def list_documents(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    mime_type: Optional[str] = None,
+    owner_user_id: Optional[int] = None,
     db: Session = Depends(get_db),
     me=Depends(get_current_user),
 ):
+    """
+    Newest first, keyset-paginated on (created_at, doc_id). The next page's
+    cursor comes back in X-Next-Cursor (absent on the last page); the first
+    page also carries X-Total-Estimate.
+    """
+    try:
+        after = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    # documents the caller can't retrieve aren't listed either
+    visibility = acl_service.visibility_for(db, me)
+    acl_sql, acl_binds = visibility.filter_sql(db, column="documents.doc_id")
+
+    filters = [Document.tenant_id == me.tenant_id]
+    if visibility.mode != "all":
+        filters.append(text(acl_sql).bindparams(**acl_binds))
+    if status:
+        filters.append(Document.status == status)
+    if mime_type:
+        filters.append(Document.mime_type == mime_type)
+    if owner_user_id is not None:
+        filters.append(Document.owner_user_id == owner_user_id)
+
+    page_filters = list(filters)
+    if after:
+        created_at, doc_id = after
+        page_filters.append(
+            or_(
+                Document.created_at < created_at,
+                and_(Document.created_at == created_at, Document.doc_id < doc_id),
+            )
+        )
+
+    rows = db.execute(
+        select(*LIST_COLUMNS)
+        .where(*page_filters)
+        .order_by(Document.created_at.desc(), Document.doc_id.desc())
+        .limit(limit + 1)
+    ).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.doc_id)
+    if not after:
+        # unrestricted principals share the tenant-wide count
+        principal = (
+            None
+            if visibility.mode == "all"
+            else (me.user_id, tuple(sorted(me.group_ids)))
+        )
+        response.headers["X-Total-Estimate"] = _estimate_count(
+            db, filters, (me.tenant_id, principal, status, mime_type, owner_user_id)
+        )
+
+    return [to_document_out(r, me.user_id) for r in rows]
+
+
+def _get_managed_document(db: Session, doc_id: int, me) -> Document:
+    """Document of the caller's tenant that the caller owns (or is admin)."""
+    doc = db.get(Document, doc_id)
+    if not doc or doc.tenant_id != me.tenant_id:
+        raise HTTPException(404, "Document not found")
+    if doc.owner_user_id != me.user_id and "admin" not in me.roles:
+        raise HTTPException(403, "Only the owner can change permissions")
+    return doc
 
-    docs = (
-        db.query(Document)
-        .filter(Document.tenant_id == me.tenant_id)
-        .order_by(Document.created_at.desc())
-        .all()
-    )
 
-    return [to_document_out(d, me.user_id) for d in docs]
+@router.get(
+    "/documents/{doc_id}/permissions", response_model=list[DocumentPermissionOut]
+)
+def list_document_permissions(
+    doc_id: int,
+    db: Session = Depends(get_db),
+    me=Depends(get_current_user),
+):
+    _get_managed_document(db, doc_id, me)
+    return acl_service.list_permissions(db, doc_id)
+
+
+@router.put("/documents/{doc_id}/permissions", response_model=DocumentPermissionOut)
+def grant_document_permission(
+    doc_id: int,
+    body: DocumentPermissionIn,
+    db: Session = Depends(get_db),
+    me=Depends(get_current_user),
+):
+    """
+    Adds (or changes the role of) one principal. A document with no
+    permission rows is visible to the whole tenant; the first grant makes
+    it private to its owner and the listed principals.
+    """
+    _get_managed_document(db, doc_id, me)
+    try:
+        return acl_service.grant(
+            db,
+            tenant_id=me.tenant_id,
+            doc_id=doc_id,
+            principal_type=body.principal_type,
+            principal_id=body.principal_id,
+            role=body.role,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@router.delete("/documents/{doc_id}/permissions/{principal_type}/{principal_id}")
+def revoke_document_permission(
+    doc_id: int,
+    principal_type: str,
+    principal_id: int,
+    db: Session = Depends(get_db),
+    me=Depends(get_current_user),
+):
+    _get_managed_document(db, doc_id, me)
+    if not acl_service.revoke(
+        db,
+        tenant_id=me.tenant_id,
+        doc_id=doc_id,
+        principal_type=principal_type,
+        principal_id=principal_id,
+    ):
+        raise HTTPException(404, "Permission not found")
+    return {"ok": True}
 
 
 @router.post("/documents/{doc_id}/process", response_model=ProcessResponse)
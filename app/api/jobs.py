@@ -0,0 +1,106 @@
+import asyncio
+import time
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from core.db import SessionLocal
+from core.deps import get_current_user
+from schemas.jobs import JobStatusOut
+from services.job_service import JobService, TERMINAL_STATUSES
+
+router = APIRouter()
+
+# Each poll is a single primary-key lookup on document_jobs, far cheaper than
+# re-listing every document to watch one upload.
+POLL_SECONDS = 1.0
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def _read_job(tenant_id: int, job_id: int) -> JobStatusOut | None:
+    # fresh short-lived session per read so we never hold a pooled connection
+    # for the lifetime of a long-poll / SSE stream
+    db = SessionLocal()
+    try:
+        job = JobService().get_job(db, tenant_id=tenant_id, job_id=job_id)
+        return JobStatusOut.model_validate(job) if job else None
+    finally:
+        db.close()
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusOut)
+async def get_job_status(
+    job_id: int,
+    wait: float = Query(0, ge=0, le=30),
+    since: datetime | None = None,
+    me=Depends(get_current_user),
+):
+    """
+    Long-poll: with `wait` > 0 and `since` (the last updated_at seen), blocks
+    until the job changes, reaches a terminal status, or `wait` elapses.
+    """
+    tenant_id = me.tenant_id
+    deadline = time.monotonic() + wait
+    if since is not None and since.tzinfo is not None:
+        # updated_at is a naive DB timestamp; clients echo it back, sometimes
+        # with a "Z" or offset attached
+        since = since.replace(tzinfo=None)
+
+    while True:
+        job = _read_job(tenant_id, job_id)
+        if not job:
+            raise HTTPException(404, "Job not found")
+
+        changed = since is None or (job.updated_at is not None and job.updated_at > since)
+        if changed or job.status in TERMINAL_STATUSES or time.monotonic() >= deadline:
+            return job
+
+        await asyncio.sleep(POLL_SECONDS)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_status(
+    job_id: int,
+    request: Request,
+    me=Depends(get_current_user),
+):
+    """
+    Server-sent events: emits a `progress` event whenever the job changes and
+    closes the stream once it reaches a terminal status.
+    """
+    tenant_id = me.tenant_id
+    if not _read_job(tenant_id, job_id):
+        raise HTTPException(404, "Job not found")
+
+    async def events():
+        last_payload = None
+        last_sent = time.monotonic()
+        while True:
+            if await request.is_disconnected():
+                return
+
+            job = _read_job(tenant_id, job_id)
+            if not job:
+                yield "event: gone\ndata: {}\n\n"
+                return
+
+            payload = job.model_dump_json()
+            if payload != last_payload:
+                last_payload = payload
+                last_sent = time.monotonic()
+                yield f"event: progress\ndata: {payload}\n\n"
+            elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+
+            if job.status in TERMINAL_STATUSES:
+                return
+
+            await asyncio.sleep(POLL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
@@ -5,7 +5,9 @@ from core.db import get_db
 from core.deps import get_current_user
 from core.config import settings
 
+from services.acl_service import visibility_for
 from services.ollama_client import OllamaClient
+from services.embedding_models import embedding_registry
 from services.embedding_service import EmbeddingService
 from services.retrieval_service import RetrievalService
 
@@ -25,12 +27,13 @@ async def retrieve(
     if not q:
         raise HTTPException(400, "query must not be empty")
 
-    # 1) Embed the query using the same embedding model used for chunks
+    # 1) Embed the query using the tenant's active embedding model
     ollama = OllamaClient(settings.OLLAMA_BASE_URL)
     emb = EmbeddingService(ollama)
+    spec = embedding_registry.for_tenant(db, me.tenant_id).active
 
     try:
-        query_vec = await emb.embed_text(q)
+        query_vec = await emb.embed_text(q, spec)
     except Exception as e:
         raise HTTPException(502, f"Embedding provider error: {e}")
 
@@ -47,6 +50,11 @@ async def retrieve(
             k_text=payload.k_text,
             use_text=payload.use_text,
             alpha=payload.alpha,
+            token_budget=payload.token_budget,
+            visibility=visibility_for(db, me),
+            mode=payload.mode,
+            top_docs=payload.top_docs,
+            spec=spec,
         )
     except Exception as e:
         raise HTTPException(500, f"Retrieval failed: {e}")
@@ -61,5 +69,9 @@ async def retrieve(
             "k_text": payload.k_text,
             "use_text": payload.use_text,
             "alpha": payload.alpha,
+            "token_budget": payload.token_budget,
+            "mode": payload.mode or settings.RETRIEVAL_MODE,
+            "embedding_model": spec.model_key,
+            "tokens": sum(int(r.get("token_count") or 0) for r in results),
         },
     )
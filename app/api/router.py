@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends
-from api import documents, conversations, retrieve, chunks, auth
+from api import documents, conversations, retrieve, chunks, auth, jobs
 from core.deps import get_current_user
 
 
@@ -25,3 +25,8 @@ router.include_router(
     tags=["chunks"],
     dependencies=[Depends(get_current_user)],
 )
+router.include_router(
+    jobs.router,
+    tags=["jobs"],
+    dependencies=[Depends(get_current_user)],
+)
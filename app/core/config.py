@@ -10,7 +10,7 @@ print("env load: ", os.getenv("SECRET_KEY"))
 
 
 class Settings(BaseModel):
-    ORACLE_DSN: str = os.getenv("ORACLE_DSN", "localhost/orclpdb1")
+    ORACLE_DSN: str = os.getenv("ORACLE_DSN", "127.0.0.1:1521/freepdb1")
     ORACLE_USER: str = os.getenv("ORACLE_USER", "app_user")
     ORACLE_PASSWORD: str = os.getenv("ORACLE_PASSWORD", "4432")
 
@@ -19,6 +19,175 @@ class Settings(BaseModel):
     EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "4096"))
 
     DEFAULT_CHAT_MODEL: str = os.getenv("DEFAULT_CHAT_MODEL", "gpt-oss:20b")
+    # how long Ollama keeps models loaded after a request ("30m", "-1" = forever)
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    # load the chat + embedding models at startup
+    OLLAMA_WARMUP: bool = os.getenv("OLLAMA_WARMUP", "1") == "1"
+
+    # Document worker / job queue
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "4"))
+    JOB_TENANT_MAX_RUNNING: int = int(os.getenv("JOB_TENANT_MAX_RUNNING", "2"))
+    # queued jobs gain one priority point per JOB_PRIORITY_AGING_SECONDS waited
+    JOB_PRIORITY_AGING_SECONDS: int = int(
+        os.getenv("JOB_PRIORITY_AGING_SECONDS", "60")
+    )
+    JOB_QUEUE_METRICS_SECONDS: float = float(
+        os.getenv("JOB_QUEUE_METRICS_SECONDS", "15")
+    )
+    # running jobs whose worker hasn't renewed locked_at for this long are
+    # requeued (or failed at max_attempts); workers renew every third of it
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+
+    # Ingestion: chunks/embeddings committed (and checkpointed) per batch
+    INGEST_COMMIT_BATCH: int = int(os.getenv("INGEST_COMMIT_BATCH", "64"))
+
+    # Embedding batches (shared across concurrent jobs in the worker)
+    EMBED_BATCH_MAX_SIZE: int = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+    EMBED_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "20"))
+
+    # PDF extraction: fan pages out to a process pool above this page count
+    PDF_PARALLEL_PAGE_THRESHOLD: int = int(
+        os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "64")
+    )
+    PDF_EXTRACT_WORKERS: int = int(
+        os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 2))
+    )
+
+    # Uploads are hashed and written to the BLOB in fixed-size pieces
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
+    UPLOAD_CHUNK_BYTES: int = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+    # Reuse text/chunks/embeddings of an identical ready upload in the tenant
+    UPLOAD_DEDUP: bool = os.getenv("UPLOAD_DEDUP", "1") == "1"
+
+    # PDF extraction sandbox (child processes with rlimits + timeouts)
+    EXTRACT_SANDBOX: bool = os.getenv("EXTRACT_SANDBOX", "1") == "1"
+    EXTRACT_PAGE_TIMEOUT_SECONDS: float = float(
+        os.getenv("EXTRACT_PAGE_TIMEOUT_SECONDS", "30")
+    )
+    # per-document budget; also each child's RLIMIT_CPU
+    EXTRACT_DOC_TIMEOUT_SECONDS: float = float(
+        os.getenv("EXTRACT_DOC_TIMEOUT_SECONDS", "600")
+    )
+    EXTRACT_MEMORY_MB: int = int(os.getenv("EXTRACT_MEMORY_MB", "1024"))
+    EXTRACT_MAX_RESTARTS: int = int(os.getenv("EXTRACT_MAX_RESTARTS", "8"))
+
+    # Chunking: "token" (structure-aware, token-bounded) or "chars" (legacy)
+    CHUNKER: str = os.getenv("CHUNKER", "token")
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+    TOKENIZER_ENCODING: str = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+    # Chat prompt budget (tokens); num_ctx is sized per request up to CHAT_MAX_CTX
+    CHAT_MAX_CTX: int = int(os.getenv("CHAT_MAX_CTX", "32768"))
+    CHAT_MIN_CTX: int = int(os.getenv("CHAT_MIN_CTX", "4096"))
+    CHAT_RESPONSE_TOKENS: int = int(os.getenv("CHAT_RESPONSE_TOKENS", "2048"))
+    # share of the prompt budget reserved for retrieved chunks (rest: history)
+    CHAT_CONTEXT_SHARE: float = float(os.getenv("CHAT_CONTEXT_SHARE", "0.6"))
+    CHAT_HISTORY_MAX_MESSAGES: int = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "20"))
+
+    # History mode: "summary" (rolling summary + recent turns) or "turns"
+    CHAT_HISTORY_MODE: str = os.getenv("CHAT_HISTORY_MODE", "summary")
+    # messages kept verbatim after the summary
+    CHAT_SUMMARY_RECENT_MESSAGES: int = int(
+        os.getenv("CHAT_SUMMARY_RECENT_MESSAGES", "4")
+    )
+    SUMMARY_MODEL: str = os.getenv(
+        "SUMMARY_MODEL", os.getenv("DEFAULT_CHAT_MODEL", "gpt-oss:20b")
+    )
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS", "400"))
+
+    # Semantic answer cache (same tenant, model and retrieved chunk set)
+    ANSWER_CACHE: bool = os.getenv("ANSWER_CACHE", "1") == "1"
+    # max cosine distance between query embeddings for a hit
+    ANSWER_CACHE_MAX_DISTANCE: float = float(
+        os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.05")
+    )
+    ANSWER_CACHE_TTL_SECONDS: int = int(
+        os.getenv("ANSWER_CACHE_TTL_SECONDS", str(7 * 24 * 3600))
+    )
+
+    # Write-behind queue for retrieval events / citations
+    WRITE_BEHIND_MAX_ITEMS: int = int(os.getenv("WRITE_BEHIND_MAX_ITEMS", "10000"))
+    WRITE_BEHIND_BATCH: int = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+    WRITE_BEHIND_FLUSH_MS: float = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+    # "block" | "drop_newest" | "drop_oldest"
+    WRITE_BEHIND_OVERFLOW: str = os.getenv("WRITE_BEHIND_OVERFLOW", "block")
+
+    # GET /documents total estimate: capped count, cached per tenant/filters
+    DOCUMENT_COUNT_CAP: int = int(os.getenv("DOCUMENT_COUNT_CAP", "10000"))
+    DOCUMENT_COUNT_TTL_SECONDS: float = float(
+        os.getenv("DOCUMENT_COUNT_TTL_SECONDS", "30")
+    )
+
+    # Validated principal cache (per process), keyed by access token
+    AUTH_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+    AUTH_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+    # Chunk embedding storage (services/vector_codec.py): search format
+    # "float32" | "int8" | "binary", optional Matryoshka truncation
+    # (0 = EMBEDDING_DIM) and an optional full-precision copy for reranking.
+    # The copy is float32 at EMBEDDING_DIM in the same row, so it costs more
+    # than a compact format saves; off unless rerank recall needs it
+    EMBEDDING_STORAGE_FORMAT: str = os.getenv("EMBEDDING_STORAGE_FORMAT", "float32")
+    EMBEDDING_SEARCH_DIM: int = int(os.getenv("EMBEDDING_SEARCH_DIM", "0"))
+    EMBEDDING_KEEP_FULL: bool = os.getenv("EMBEDDING_KEEP_FULL", "0") == "1"
+    # "compact": search representation only; "rerank": compact shortlist of
+    # k * RERANK_SHORTLIST_FACTOR reordered at full precision; "full": exact.
+    # Rows without a full-precision copy keep their compact distance
+    RETRIEVAL_PRECISION: str = os.getenv("RETRIEVAL_PRECISION", "rerank")
+    RERANK_SHORTLIST_FACTOR: int = int(os.getenv("RERANK_SHORTLIST_FACTOR", "4"))
+
+    # Embedding model registry and re-embedding migrations
+    # (services/embedding_migration.py): registry cache TTL, backfill batch
+    # size, throttle and tenant lease, share of chat queries shadow-read
+    # against the target model, and how long previous-model vectors survive
+    # a cutover
+    EMBEDDING_REGISTRY_TTL_SECONDS: float = float(
+        os.getenv("EMBEDDING_REGISTRY_TTL_SECONDS", "10")
+    )
+    EMBEDDING_BACKFILL_BATCH: int = int(os.getenv("EMBEDDING_BACKFILL_BATCH", "64"))
+    EMBEDDING_BACKFILL_CHUNKS_PER_SECOND: float = float(
+        os.getenv("EMBEDDING_BACKFILL_CHUNKS_PER_SECOND", "20")
+    )
+    EMBEDDING_BACKFILL_POLL_SECONDS: float = float(
+        os.getenv("EMBEDDING_BACKFILL_POLL_SECONDS", "30")
+    )
+    EMBEDDING_BACKFILL_LEASE_SECONDS: int = int(
+        os.getenv("EMBEDDING_BACKFILL_LEASE_SECONDS", "300")
+    )
+    EMBEDDING_SHADOW_SAMPLE: float = float(os.getenv("EMBEDDING_SHADOW_SAMPLE", "0.1"))
+    EMBEDDING_SHADOW_MAX_INFLIGHT: int = int(
+        os.getenv("EMBEDDING_SHADOW_MAX_INFLIGHT", "4")
+    )
+    EMBEDDING_GC_GRACE_SECONDS: float = float(
+        os.getenv("EMBEDDING_GC_GRACE_SECONDS", "3600")
+    )
+    EMBEDDING_GC_BATCH: int = int(os.getenv("EMBEDDING_GC_BATCH", "1000"))
+
+    # "flat": chunk vector search over the tenant; "hierarchical": pick the
+    # RETRIEVAL_TOP_DOCS closest documents first, then search their chunks
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "flat")
+    RETRIEVAL_TOP_DOCS: int = int(os.getenv("RETRIEVAL_TOP_DOCS", "20"))
+
+    # Per-document ACLs in retrieval; visibility sets cached per principal and
+    # checked against tenants.acl_version on every lookup (TTL frees idle ones)
+    RETRIEVAL_ACL: bool = os.getenv("RETRIEVAL_ACL", "1") == "1"
+    ACL_CACHE_TTL_SECONDS: float = float(os.getenv("ACL_CACHE_TTL_SECONDS", "300"))
+    ACL_CACHE_MAX_ENTRIES: int = int(os.getenv("ACL_CACHE_MAX_ENTRIES", "5000"))
+
+    # DB connection pool (core.db). With ORACLE_DRCP=1 python-oracledb's pool
+    # is used against DRCP pooled servers instead of SQLAlchemy's QueuePool.
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    # connections opened at startup
+    DB_POOL_MIN: int = int(os.getenv("DB_POOL_MIN", "2"))
+    DB_STMT_CACHE_SIZE: int = int(os.getenv("DB_STMT_CACHE_SIZE", "200"))
+    ORACLE_DRCP: bool = os.getenv("ORACLE_DRCP", "0") == "1"
+    ORACLE_DRCP_CLASS: str = os.getenv("ORACLE_DRCP_CLASS", "SIMPLERAG")
 
     SECRET_KEY: str = os.getenv("SECRET_KEY", "itsasecret")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
@@ -1,17 +1,107 @@
-from dataclasses import dataclass
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set, Tuple
+
 from fastapi import Depends, HTTPException, Request, status
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 from core.db import get_db
+from core.metrics import registry
 from models.Models import AppUser
 
 from core.config import settings
 
+auth_cache_lookups = registry.counter(
+    "auth_cache_lookups_total", "Principal cache lookups by outcome (hit/miss)"
+)
+
 
 @dataclass(frozen=True)
 class CurrentUser:
     user_id: int
     tenant_id: int
+    roles: Tuple[str, ...] = field(default_factory=tuple)
+    group_ids: Tuple[int, ...] = field(default_factory=tuple)
+
+
+class PrincipalCache:
+    """
+    Process-local cache of validated principals keyed by (a hash of) the
+    access token. Entries live for AUTH_CACHE_TTL_SECONDS, never past the
+    token's own exp, and the least recently used are evicted beyond
+    AUTH_CACHE_MAX_ENTRIES. A hit skips both JWT verification and the
+    app_users lookup.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, CurrentUser]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def put(self, token: str, principal: CurrentUser, token_exp: Optional[float]) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+        key = self._key(token)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (expires_at, principal)
+            self._by_user.setdefault(principal.user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_token(self, token: str) -> None:
+        with self._lock:
+            self._drop(self._key(token))
+
+    def invalidate_user(self, user_id: int) -> None:
+        # password change etc.: every token of the user
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry[1].user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry[1].user_id]
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+)
 
 
 # use for dev testing for now
@@ -21,7 +111,7 @@ class CurrentUser:
 #     return CurrentUser(user_id=3, tenant_id=1)
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+def get_current_user(request: Request, db: Session = Depends(get_db)) -> CurrentUser:
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(
@@ -29,6 +119,12 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             detail="Missing authentication cookie",
         )
 
+    principal = principal_cache.get(token)
+    if principal is not None:
+        auth_cache_lookups.inc(outcome="hit")
+        return principal
+    auth_cache_lookups.inc(outcome="miss")
+
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -45,9 +141,33 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             detail="Invalid or expired token",
         )
 
-    user = db.query(AppUser).filter(AppUser.user_id == user_id).first()
+    user = (
+        db.query(AppUser.user_id, AppUser.tenant_id, AppUser.preferences)
+        .filter(AppUser.user_id == user_id)
+        .first()
+    )
 
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    return user
+    # no roles/groups tables yet; both ride along in preferences JSON
+    prefs = user.preferences or {}
+    roles = prefs.get("roles") or []
+    groups = prefs.get("groups") or []
+    principal = CurrentUser(
+        user_id=int(user.user_id),
+        tenant_id=int(user.tenant_id),
+        roles=tuple(str(r) for r in roles),
+        group_ids=tuple(int(g) for g in groups),
+    )
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+
+def require_admin(me: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if "admin" not in me.roles:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin role required",
+        )
+    return me
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+# Opaque keyset cursors: base64(JSON) of the last row's sort key. Clients
+# pass them back unchanged; they are not a security boundary (every query
+# still filters by tenant/owner).
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "id": int(row_id)})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Returns (created_at, id) or None; raises ValueError on a bad cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data: Dict[str, Any] = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(data["t"]), int(data["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
@@ -1,27 +1,72 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from contextlib import asynccontextmanager
 from api.router import router as v1_router
 import uvicorn
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from workers.document_worker import DocumentWorker
+from core.metrics import registry
+from services.conversation_summarizer import summarizer
+from services.embedding_migration import EmbeddingBackfiller, shadow_reader
+from services.ollama_client import OllamaClient
+from services.write_behind import write_behind
 import asyncio
 import os
 
+from core.config import settings
+from core.db import warm_pool
+from core.deps import CurrentUser, require_admin
+
+
+async def warmup_models() -> None:
+    # load models ahead of the first request; keep_alive holds them after
+    ollama = OllamaClient(settings.OLLAMA_BASE_URL)
+    try:
+        await ollama.warmup_chat(settings.DEFAULT_CHAT_MODEL, num_ctx=settings.CHAT_MIN_CTX)
+        print(f"warmed up {settings.DEFAULT_CHAT_MODEL}")
+    except Exception as e:
+        print(f"warmup of {settings.DEFAULT_CHAT_MODEL} failed: {e}")
+    try:
+        await ollama.warmup_embedding(settings.EMBEDDING_MODEL)
+        print(f"warmed up {settings.EMBEDDING_MODEL}")
+    except Exception as e:
+        print(f"warmup of {settings.EMBEDDING_MODEL} failed: {e}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    Starts the background document worker on startup
-    and shuts it down gracefully on shutdown.
+    Starts the background document worker and embedding backfill on
+    startup and shuts them down gracefully on shutdown (along with the
+    conversation summarizer and shadow reader, which start on first use).
     """
     worker: DocumentWorker | None = None
     worker_task: asyncio.Task | None = None
+    backfiller: EmbeddingBackfiller | None = None
+    backfill_task: asyncio.Task | None = None
+    warmup_task: asyncio.Task | None = None
+
+    try:
+        warmed = await asyncio.to_thread(warm_pool, settings.DB_POOL_MIN)
+        print(f"db pool warmed: {warmed} connections")
+    except Exception as e:
+        # the pool still opens connections on demand
+        print("db pool warmup failed:", e)
+
+    if settings.OLLAMA_WARMUP:
+        # in the background so startup doesn't wait on model loads
+        warmup_task = asyncio.create_task(warmup_models())
 
     if os.getenv("RUN_DOCUMENT_WORKER", "1") == "1":
-        worker = DocumentWorker(poll_seconds=1.0)
+        worker = DocumentWorker(
+            poll_seconds=1.0, concurrency=settings.WORKER_CONCURRENCY
+        )
         worker_task = asyncio.create_task(worker.run_forever())
 
+    if os.getenv("RUN_EMBEDDING_BACKFILL", "1") == "1":
+        backfiller = EmbeddingBackfiller()
+        backfill_task = asyncio.create_task(backfiller.run_forever())
+
     try:
         yield
     finally:
@@ -33,6 +78,20 @@ async def lifespan(app: FastAPI):
                 await worker_task
             except asyncio.CancelledError:
                 pass
+        if backfiller:
+            backfiller.stop()
+        if backfill_task:
+            backfill_task.cancel()
+            try:
+                await backfill_task
+            except asyncio.CancelledError:
+                pass
+        if warmup_task and not warmup_task.done():
+            warmup_task.cancel()
+        await summarizer.stop()
+        await shadow_reader.stop()
+        # rows still queued (retrieval events, citations) go out before exit
+        await write_behind.stop()
 
 
 app = FastAPI(
@@ -51,6 +110,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor", "X-Total-Estimate"],  # list pagination
 )
 
 app.include_router(v1_router)
@@ -62,6 +122,12 @@ def health():
     return {"ok": True}
 
 
+@app.get("/metrics")
+def metrics(me: CurrentUser = Depends(require_admin)):
+    # series carry tenant_id labels; an admin only sees their own tenant's
+    return registry.snapshot(tenant_id=me.tenant_id)
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
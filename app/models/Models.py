@@ -17,6 +17,7 @@ from sqlalchemy import (
     func,
     Float,
     JSON,
+    Boolean,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.types import UserDefinedType
@@ -44,6 +45,24 @@ class OracleVector4096F32(UserDefinedType):
         return "VECTOR(4096, FLOAT32)"
 
 
+class OracleVector(UserDefinedType):
+    """
+    Compiles to Oracle VECTOR(dim, fmt); "*" leaves either flexible, as for
+    chunk_embeddings.embedding whose format/dims follow
+    EMBEDDING_STORAGE_FORMAT / EMBEDDING_SEARCH_DIM. Bind values are
+    array.array ('f' float32, 'b' int8, 'B' packed binary).
+    """
+
+    cache_ok = True
+
+    def __init__(self, dim: str = "*", fmt: str = "*"):
+        self.dim = dim
+        self.fmt = fmt
+
+    def get_col_spec(self, **kw) -> str:
+        return f"VECTOR({self.dim}, {self.fmt})"
+
+
 # -------------------------
 # Tables
 # -------------------------
@@ -52,6 +71,7 @@ class Tenant(Base):
 
     tenant_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(200), nullable=False)
+    acl_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.systimestamp(), nullable=False
     )
@@ -179,6 +199,10 @@ class DocumentVersion(Base):
     )
     version_num: Mapped[int] = mapped_column(Integer, nullable=False)
     sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    # upload dedup: bytes live in this other version's document_blobs row
+    content_version_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("document_versions.version_id", ondelete="SET NULL")
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.systimestamp(), nullable=False
     )
@@ -262,38 +286,140 @@ class DocumentChunk(Base):
     document: Mapped["Document"] = relationship(back_populates="chunks")
     tenant: Mapped["Tenant"] = relationship()
 
-    embedding: Mapped[Optional["ChunkEmbedding"]] = relationship(
-        back_populates="chunk", cascade="all, delete-orphan", uselist=False
+    # one per embedding model (active + any model being backfilled)
+    embeddings: Mapped[List["ChunkEmbedding"]] = relationship(
+        back_populates="chunk", cascade="all, delete-orphan"
     )
 
 
 class ChunkEmbedding(Base):
     __tablename__ = "chunk_embeddings"
 
-    # PK is also FK to chunks (1:1)
+    # one row per (chunk, embedding model)
     chunk_id: Mapped[int] = mapped_column(
         Integer,
         ForeignKey("document_chunks.chunk_id", ondelete="CASCADE"),
         primary_key=True,
     )
+    embedding_model_id: Mapped[str] = mapped_column(String(200), primary_key=True)
     tenant_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("tenants.tenant_id"), nullable=False, index=True
     )
 
-    embedding_model_id: Mapped[str] = mapped_column(String(200), nullable=False)
+    # dims/format of `embedding` (the search representation)
     embedding_dim: Mapped[int] = mapped_column(Integer, nullable=False)
+    embedding_format: Mapped[str] = mapped_column(
+        String(10), nullable=False, server_default="float32"
+    )
 
-    # Oracle VECTOR(4096, FLOAT32)
-    embedding: Mapped[object] = mapped_column(OracleVector4096F32(), nullable=False)
+    # search representation (services/vector_codec.py)
+    embedding: Mapped[object] = mapped_column(OracleVector(), nullable=False)
+    # full-precision copy for reranking, kept only when `embedding` is compact
+    embedding_full: Mapped[Optional[object]] = mapped_column(
+        OracleVector("*", "FLOAT32"), nullable=True
+    )
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.systimestamp(), nullable=False
     )
 
-    chunk: Mapped["DocumentChunk"] = relationship(back_populates="embedding")
+    chunk: Mapped["DocumentChunk"] = relationship(back_populates="embeddings")
     tenant: Mapped["Tenant"] = relationship()
 
 
+class EmbeddingModel(Base):
+    """Registry entry; model_key is stored as embedding_model_id."""
+
+    __tablename__ = "embedding_models"
+    __table_args__ = (
+        CheckConstraint(
+            "storage_format IN ('float32','int8','binary')",
+            name="ck_embmodel_format",
+        ),
+        CheckConstraint(
+            "status IN ('available','retired')", name="ck_embmodel_status"
+        ),
+    )
+
+    model_key: Mapped[str] = mapped_column(String(200), primary_key=True)
+    provider_model: Mapped[str] = mapped_column(String(200), nullable=False)
+    dim: Mapped[int] = mapped_column(Integer, nullable=False)
+    search_dim: Mapped[int] = mapped_column(Integer, nullable=False)
+    storage_format: Mapped[str] = mapped_column(
+        String(10), nullable=False, server_default="float32"
+    )
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, server_default="available"
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.systimestamp(), nullable=False
+    )
+
+
+class TenantEmbeddingModel(Base):
+    """Active embedding model of a tenant and its re-embedding migration."""
+
+    __tablename__ = "tenant_embedding_models"
+    __table_args__ = (
+        CheckConstraint(
+            "migration_status IN ('backfilling','ready','paused')",
+            name="ck_tenant_emb_status",
+        ),
+    )
+
+    tenant_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tenants.tenant_id"), primary_key=True
+    )
+    active_model: Mapped[str] = mapped_column(String(200), nullable=False)
+    target_model: Mapped[Optional[str]] = mapped_column(
+        String(200), ForeignKey("embedding_models.model_key")
+    )
+    migration_status: Mapped[Optional[str]] = mapped_column(String(20))
+    backfill_after_chunk_id: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0
+    )
+    backfilled_chunks: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    backfill_lease_until: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    shadow_reads: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    previous_model: Mapped[Optional[str]] = mapped_column(String(200))
+    cutover_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+
+class DocumentEmbedding(Base):
+    """Centroid of a document's chunk embeddings (hierarchical retrieval)."""
+
+    __tablename__ = "document_embeddings"
+
+    doc_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("documents.doc_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    embedding_model_id: Mapped[str] = mapped_column(String(200), primary_key=True)
+    version_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("document_versions.version_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    tenant_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tenants.tenant_id"), nullable=False, index=True
+    )
+
+    embedding_dim: Mapped[int] = mapped_column(Integer, nullable=False)
+    chunk_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # float32 at embedding_dim (the search dim, see vector_codec.search_dim)
+    embedding: Mapped[object] = mapped_column(
+        OracleVector("*", "FLOAT32"), nullable=False
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.systimestamp(), nullable=False
+    )
+
+
 class DocumentPermission(Base):
     __tablename__ = "document_permissions"
     __table_args__ = (
@@ -358,6 +484,15 @@ class DocumentJob(Base):
     locked_by: Mapped[Optional[str]] = mapped_column(String(200))
 
     last_error: Mapped[Optional[str]] = mapped_column(Text)
+    # resume marker written by IngestPipeline alongside each batch commit
+    checkpoint_json: Mapped[Optional[str]] = mapped_column(Text)  # JSON as CLOB
+
+    # progress, updated at the pipeline's batch commits
+    stage: Mapped[Optional[str]] = mapped_column(String(30))
+    chunks_total: Mapped[Optional[int]] = mapped_column(Integer)
+    chunks_embedded: Mapped[Optional[int]] = mapped_column(Integer)
+    bytes_processed: Mapped[Optional[int]] = mapped_column(Integer)
+    throughput: Mapped[Optional[float]] = mapped_column(Float)  # chunks/sec
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.systimestamp(), nullable=False
     )
@@ -381,6 +516,15 @@ class Conversation(Base):
     chat_model_id: Mapped[str] = mapped_column(String(200), nullable=False)
     title: Mapped[Optional[str]] = mapped_column(String(500))
 
+    # rolling summary of messages up to summary_message_id (see
+    # services/conversation_summarizer.py)
+    summary_text: Mapped[Optional[str]] = mapped_column(Text)
+    summary_message_id: Mapped[Optional[int]] = mapped_column(Integer)
+    summary_tokens: Mapped[Optional[int]] = mapped_column(Integer)
+    # tokens of the raw messages the summary replaces
+    summary_source_tokens: Mapped[Optional[int]] = mapped_column(Integer)
+    summary_updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.systimestamp(), nullable=False
     )
@@ -483,3 +627,54 @@ class RetrievalEvent(Base):
     )
 
     message: Mapped["Message"] = relationship(back_populates="retrieval_events")
+
+
+class AnswerCacheEntry(Base):
+    __tablename__ = "answer_cache"
+
+    cache_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tenant_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tenants.tenant_id"), nullable=False
+    )
+    chat_model_id: Mapped[str] = mapped_column(String(200), nullable=False)
+    # sha256 of the sorted (chunk_id, version_id) set retrieval returned
+    chunk_key: Mapped[str] = mapped_column(String(64), nullable=False)
+    # sha256 of the summary + history turns in the prompt
+    context_key: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    query_text: Mapped[str] = mapped_column(Text, nullable=False)  # CLOB
+    embedding_model_id: Mapped[str] = mapped_column(String(200), nullable=False)
+    query_embedding: Mapped[object] = mapped_column(
+        OracleVector("*", "FLOAT32"), nullable=False
+    )
+    answer: Mapped[str] = mapped_column(Text, nullable=False)  # CLOB
+    citations_json: Mapped[Optional[str]] = mapped_column(Text)  # JSON as CLOB
+    gen_seconds: Mapped[Optional[float]] = mapped_column(Float)
+
+    hit_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_hit_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.systimestamp(), nullable=False
+    )
+
+    docs: Mapped[List["AnswerCacheDoc"]] = relationship(
+        back_populates="entry", cascade="all, delete-orphan"
+    )
+
+
+class AnswerCacheDoc(Base):
+    __tablename__ = "answer_cache_docs"
+
+    cache_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("answer_cache.cache_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    doc_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("documents.doc_id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+
+    entry: Mapped["AnswerCacheEntry"] = relationship(back_populates="docs")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Literal
 from datetime import datetime
 
 
@@ -33,3 +33,20 @@ class ProcessResponse(BaseModel):
     embedded: int
     notes: Dict[str, Any] = {}
     error: Optional[str] = None
+
+
+class DocumentPermissionIn(BaseModel):
+    principal_type: Literal["user", "group"]
+    principal_id: int
+    role: Literal["owner", "reader", "writer", "admin"] = "reader"
+
+
+class DocumentPermissionOut(BaseModel):
+    doc_id: int
+    principal_type: str
+    principal_id: int
+    role: str
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
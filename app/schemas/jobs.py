@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class JobStatusOut(BaseModel):
+    job_id: int
+    doc_id: int
+    version_id: Optional[int] = None
+    status: str
+    stage: Optional[str] = None
+
+    chunks_total: Optional[int] = None
+    chunks_embedded: Optional[int] = None
+    bytes_processed: Optional[int] = None
+    throughput: Optional[float] = None  # chunks/sec during embedding
+
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 
 
 class RetrieveRequest(BaseModel):
@@ -11,6 +11,10 @@ class RetrieveRequest(BaseModel):
     k_text: int = 10
     use_text: bool = True
     alpha: float = 0.70  # weight vector similarity more than text
+    token_budget: Optional[int] = Field(default=None, ge=1)  # cap on summed chunk tokens
+    # None -> settings.RETRIEVAL_MODE / RETRIEVAL_TOP_DOCS
+    mode: Optional[Literal["flat", "hierarchical"]] = None
+    top_docs: Optional[int] = Field(default=None, ge=1)
 
     # future: filters
     # mime_types: Optional[List[str]] = None
@@ -22,6 +26,7 @@ class RetrievedChunk(BaseModel):
     page_start: Optional[int] = None
     page_end: Optional[int] = None
     section_path: Optional[str] = None
+    token_count: Optional[int] = None
     chunk_text: str
 
     source: str
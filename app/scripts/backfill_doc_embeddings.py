@@ -0,0 +1,33 @@
+"""
+Computes document_embeddings (chunk-embedding centroids) for ready
+documents ingested before hierarchical retrieval existed.
+
+    cd app
+    python -m scripts.backfill_doc_embeddings [--batch-size 100] [--tenant-id 1]
+"""
+from __future__ import annotations
+
+import argparse
+
+from core.db import SessionLocal
+from services.ingest_pipeline import IngestPipeline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--tenant-id", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        n = IngestPipeline().backfill_document_embeddings(
+            db, batch_size=args.batch_size, tenant_id=args.tenant_id
+        )
+    finally:
+        db.close()
+    print(f"done: {n} documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Backfills document_chunks.token_count for chunks ingested before token
+counts were stored.
+
+    cd app
+    python -m scripts.backfill_token_counts [--batch-size 500] [--tenant-id 1]
+"""
+from __future__ import annotations
+
+import argparse
+
+from core.db import SessionLocal
+from services.ingest_pipeline import IngestPipeline
+from services.tokenizer import tokenizer_name
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--tenant-id", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"tokenizer={tokenizer_name()}")
+    db = SessionLocal()
+    try:
+        n = IngestPipeline().backfill_token_counts(
+            db, batch_size=args.batch_size, tenant_id=args.tenant_id
+        )
+    finally:
+        db.close()
+    print(f"done: {n} chunks updated")
+
+
+if __name__ == "__main__":
+    main()
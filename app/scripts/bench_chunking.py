@@ -0,0 +1,99 @@
+"""
+Chunker benchmark: legacy char packing (iter_chunks) vs the token-bounded
+chunker (iter_token_chunks) on synthetic or real documents.
+
+    cd app
+    python -m scripts.bench_chunking                  # synthetic, 250/1000/4000 pages
+    python -m scripts.bench_chunking path/to/file.pdf
+
+Reports wall time, throughput, chunk count and token-size spread; the
+synthetic run scales the document 4x per step, so roughly 4x time per step
+means linear behaviour.
+"""
+from __future__ import annotations
+
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Iterable, List
+
+from core.config import settings
+from services.chunking_service import ChunkSpec, iter_chunks, iter_token_chunks
+from services.extraction_service import PageText, extract_file
+from services.tokenizer import count_tokens_batch, tokenizer_name
+
+_WORDS = (
+    "the system retrieval document vector index query tenant model embedding "
+    "latency throughput budget section page table figure result method data "
+    "analysis configuration cluster storage network request response"
+).split()
+
+
+def synthetic_pages(num_pages: int, seed: int = 7) -> List[PageText]:
+    rnd = random.Random(seed)
+    pages: List[PageText] = []
+    section = 0
+    for page_no in range(1, num_pages + 1):
+        paras: List[str] = []
+        if page_no % 5 == 1:
+            section += 1
+            paras.append(f"{section} {rnd.choice(_WORDS).title()} {rnd.choice(_WORDS).title()}")
+        if page_no % 5 == 3:
+            paras.append(f"{section}.1 {rnd.choice(_WORDS).title()} Details")
+        for _ in range(rnd.randint(3, 7)):
+            sentences = []
+            for _ in range(rnd.randint(2, 9)):
+                words = [rnd.choice(_WORDS) for _ in range(rnd.randint(6, 28))]
+                sentences.append(" ".join(words).capitalize() + ".")
+            paras.append(" ".join(sentences))
+        text = "\n\n".join(paras)
+        pages.append(PageText(page=page_no, text=text, char_len=len(text), has_text=True))
+    return pages
+
+
+def run(name: str, fn: Callable[[Iterable[PageText]], Iterable[ChunkSpec]], pages: List[PageText]) -> None:
+    chars = sum(p.char_len for p in pages)
+    t0 = time.perf_counter()
+    chunks = list(fn(pages))
+    elapsed = time.perf_counter() - t0
+
+    tokens = count_tokens_batch([c.chunk_text for c in chunks]) if chunks else [0]
+    print(
+        f"  {name:<8} {elapsed * 1000:9.1f} ms  {chars / max(elapsed, 1e-9) / 1e6:7.2f} MB/s"
+        f"  chunks={len(chunks):6d}  tokens mean={statistics.mean(tokens):7.1f}"
+        f" max={max(tokens):6d}"
+        f"  with_section={sum(1 for c in chunks if c.section_path)}"
+    )
+
+
+def bench(pages: List[PageText]) -> None:
+    print(f"pages={len(pages)} chars={sum(p.char_len for p in pages)}")
+    run("chars", lambda ps: iter_chunks(ps, max_chars=5000), pages)
+    run(
+        "token",
+        lambda ps: iter_token_chunks(
+            ps,
+            max_tokens=settings.CHUNK_MAX_TOKENS,
+            overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+        ),
+        pages,
+    )
+
+
+def main(argv: List[str]) -> None:
+    print(
+        f"tokenizer={tokenizer_name()} max_tokens={settings.CHUNK_MAX_TOKENS}"
+        f" overlap={settings.CHUNK_OVERLAP_TOKENS}"
+    )
+    if argv:
+        for path in argv:
+            print(path)
+            bench(extract_file(path, None).pages)
+        return
+    for n in (250, 1000, 4000):
+        bench(synthetic_pages(n))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
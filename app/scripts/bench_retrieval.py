@@ -0,0 +1,193 @@
+"""
+Retrieval benchmark: flat chunk vector search at each precision (compact
+search representation, compact + full-precision rerank) and hierarchical
+search (top-M documents by centroid, then chunks of those documents).
+
+    cd app
+    python -m scripts.bench_retrieval --tenant-id 1
+    python -m scripts.bench_retrieval --tenant-id 1 --top-docs 5,10,20,50 --k 10
+    python -m scripts.bench_retrieval --tenant-id 1 --queries queries.txt
+
+Exact full-precision flat search is the ground truth: recall@k is the
+share of its top-k each run returns. Vector bytes per chunk_embeddings row
+(search vector plus any embedding_full copy) are printed for the tenant's
+active embedding model (format / search dim from the registry).
+Without --queries the queries are stored chunk embeddings sampled from the
+tenant; those sit close to their own document's centroid, so expect real
+questions (--queries, one per line, embedded via Ollama) to recall less.
+Run scripts.backfill_doc_embeddings first for documents ingested earlier.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from sqlalchemy import text
+
+from core.config import settings
+from core.db import SessionLocal
+from services.embedding_models import EmbeddingModelSpec, embedding_registry
+from services.embedding_service import EmbeddingService
+from services.ollama_client import OllamaClient
+from services import vector_codec
+from services.retrieval_service import RetrievalService
+
+
+def sample_query_vectors(
+    db, tenant_id: int, spec: EmbeddingModelSpec, n: int
+) -> List[List[float]]:
+    rows = db.execute(
+        text(
+            """
+            SELECT * FROM (
+              SELECT e.embedding, e.embedding_full, e.embedding_format, e.embedding_dim
+              FROM chunk_embeddings e
+              WHERE e.tenant_id = :tenant_id
+                AND e.embedding_model_id = :embedding_model_id
+              ORDER BY DBMS_RANDOM.VALUE
+            )
+            WHERE ROWNUM <= :n
+            """
+        ),
+        {"tenant_id": tenant_id, "embedding_model_id": spec.model_key, "n": n},
+    ).all()
+    return [
+        list(
+            r.embedding_full
+            if r.embedding_full is not None
+            else vector_codec.decode(r.embedding, r.embedding_format, int(r.embedding_dim))
+        )
+        for r in rows
+    ]
+
+
+def embed_queries(path: str, spec: EmbeddingModelSpec) -> List[List[float]]:
+    with open(path, encoding="utf-8") as fh:
+        queries = [line.strip() for line in fh if line.strip()]
+    emb = EmbeddingService(OllamaClient(settings.OLLAMA_BASE_URL))
+    return asyncio.run(emb.embed_texts(queries, spec))
+
+
+def pct(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def report(name: str, latencies: List[float], recalls: List[float]) -> None:
+    ms = [t * 1000 for t in latencies]
+    print(
+        f"  {name:<14} p50={pct(ms, 0.5):8.1f} ms  p95={pct(ms, 0.95):8.1f} ms"
+        f"  recall@k={statistics.mean(recalls):.3f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant-id", type=int, required=True)
+    parser.add_argument("--queries", default=None, help="text file, one query per line")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--top-docs", default="5,10,20,50")
+    args = parser.parse_args()
+
+    svc = RetrievalService()
+    db = SessionLocal()
+    try:
+        spec = embedding_registry.for_tenant(db, args.tenant_id).active
+        if args.queries:
+            vectors = embed_queries(args.queries, spec)
+        else:
+            vectors = sample_query_vectors(db, args.tenant_id, spec, args.samples)
+        if not vectors:
+            print("no queries (tenant has no chunk embeddings?)")
+            return
+        n_docs = db.execute(
+            text(
+                "SELECT COUNT(*) FROM document_embeddings"
+                " WHERE tenant_id = :t AND embedding_model_id = :m"
+            ),
+            {"t": args.tenant_id, "m": spec.model_key},
+        ).scalar()
+        print(
+            f"model={spec.model_key} queries={len(vectors)} k={args.k}"
+            f" documents_with_centroid={n_docs}"
+        )
+
+        fmt = spec.storage_format
+        dim = spec.search_dim
+        full_bytes = vector_codec.bytes_per_vector("float32", spec.dim)
+        compact_bytes = vector_codec.bytes_per_vector(fmt, dim)
+        rows, with_full = db.execute(
+            text(
+                "SELECT COUNT(*), COUNT(embedding_full) FROM chunk_embeddings"
+                " WHERE tenant_id = :t AND embedding_model_id = :m"
+            ),
+            {"t": args.tenant_id, "m": spec.model_key},
+        ).one()
+        # what a row really stores: the search vector plus embedding_full
+        # where a full-precision copy was kept
+        row_bytes = compact_bytes + (full_bytes * with_full / rows if rows else 0)
+        print(
+            f"search representation {fmt}/{dim}: {compact_bytes} B/vector;"
+            f" {with_full}/{rows} rows keep embedding_full ({full_bytes} B)"
+        )
+        print(
+            f"vector bytes per row: {row_bytes:.0f} B vs {full_bytes} B float32/{spec.dim}"
+            f" ({full_bytes / row_bytes:.2f}x)"
+        )
+        if spec.is_compact and not with_full:
+            print("no full-precision copies: full and rerank rank on the compact column")
+
+        truth = []
+        lat = []
+        for vec in vectors:
+            t0 = time.perf_counter()
+            hits = svc.vector_search(
+                db, args.tenant_id, vec, None, args.k, spec=spec, precision="full"
+            )
+            lat.append(time.perf_counter() - t0)
+            truth.append({int(h["chunk_id"]) for h in hits})
+        report("flat full", lat, [1.0] * len(vectors))
+
+        def run(name: str, search) -> None:
+            lat = []
+            recalls = []
+            for vec, expected in zip(vectors, truth):
+                t0 = time.perf_counter()
+                hits = search(vec)
+                lat.append(time.perf_counter() - t0)
+                got = {int(h["chunk_id"]) for h in hits}
+                recalls.append(len(got & expected) / len(expected) if expected else 1.0)
+            report(name, lat, recalls)
+
+        if spec.is_compact:
+            for precision in ("compact", "rerank"):
+                run(
+                    f"flat {precision}",
+                    lambda vec, p=precision: svc.vector_search(
+                        db, args.tenant_id, vec, None, args.k, spec=spec, precision=p
+                    ),
+                )
+
+        def hierarchical(vec, m: int):
+            docs = svc.document_search(db, args.tenant_id, vec, None, m, spec=spec)
+            return svc.vector_search(
+                db,
+                args.tenant_id,
+                vec,
+                [int(d["doc_id"]) for d in docs],
+                args.k,
+                spec=spec,
+            )
+
+        for m in (int(x) for x in args.top_docs.split(",") if x.strip()):
+            run(f"hier top={m}", lambda vec, m=m: hierarchical(vec, m))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Embedding model registry and per-tenant re-embedding migrations.
+
+    cd app
+    python -m scripts.embedding_models register qwen3-embedding-1024 \\
+        --provider-model qwen3-embedding --dim 4096 --search-dim 1024 --format int8
+    python -m scripts.embedding_models migrate --tenant-id 1 qwen3-embedding-1024
+    python -m scripts.embedding_models status [--tenant-id 1]
+    python -m scripts.embedding_models backfill --tenant-id 1   # foreground, until ready
+    python -m scripts.embedding_models cutover --tenant-id 1
+    python -m scripts.embedding_models gc --tenant-id 1 [--force]
+    python -m scripts.embedding_models pause|resume|abort --tenant-id 1
+
+The API process backfills in the background (RUN_EMBEDDING_BACKFILL=1);
+`backfill` is for running it without the API. Compare the
+embedding_shadow_overlap metric before cutover.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+
+from core.db import SessionLocal
+from models.Models import EmbeddingModel, TenantEmbeddingModel
+from services import embedding_migration
+from services.embedding_migration import EmbeddingBackfiller, missing_count
+
+
+def show_status(db, tenant_id) -> None:
+    for m in db.query(EmbeddingModel).order_by(EmbeddingModel.model_key).all():
+        print(
+            f"model {m.model_key}: {m.provider_model} dim={m.dim}"
+            f" search={m.storage_format}/{m.search_dim} {m.status}"
+        )
+    q = db.query(TenantEmbeddingModel)
+    if tenant_id is not None:
+        q = q.filter(TenantEmbeddingModel.tenant_id == tenant_id)
+    for t in q.order_by(TenantEmbeddingModel.tenant_id).all():
+        line = f"tenant {t.tenant_id}: active={t.active_model}"
+        if t.target_model:
+            missing = missing_count(db, t.tenant_id, t.target_model)
+            line += (
+                f" target={t.target_model} ({t.migration_status},"
+                f" {t.backfilled_chunks} backfilled, {missing} missing)"
+            )
+        if t.previous_model:
+            line += f" previous={t.previous_model} (cutover {t.cutover_at})"
+        print(line)
+
+
+async def backfill(tenant_id: int) -> None:
+    backfiller = EmbeddingBackfiller()
+    while True:
+        db = SessionLocal()
+        try:
+            state = db.get(TenantEmbeddingModel, tenant_id)
+            status = state.migration_status if state else None
+        finally:
+            db.close()
+        if status != "backfilling":
+            print(f"tenant {tenant_id}: {status or 'no migration'}")
+            return
+        # other tenants may be picked too; they just get ahead
+        n = await backfiller.run_batch()
+        if n is None:
+            # leased by another backfiller (e.g. the API process)
+            await asyncio.sleep(1.0)
+        elif n:
+            print(f"backfilled {n} chunks")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("register")
+    p.add_argument("model_key")
+    p.add_argument("--provider-model", required=True, help="Ollama model name")
+    p.add_argument("--dim", type=int, required=True)
+    p.add_argument("--search-dim", type=int, default=0)
+    p.add_argument("--format", default="float32", choices=("float32", "int8", "binary"))
+
+    p = sub.add_parser("migrate")
+    p.add_argument("--tenant-id", type=int, required=True)
+    p.add_argument("model_key")
+    p.add_argument("--no-shadow", action="store_true")
+
+    p = sub.add_parser("status")
+    p.add_argument("--tenant-id", type=int, default=None)
+
+    for name in ("backfill", "cutover", "pause", "resume", "abort"):
+        p = sub.add_parser(name)
+        p.add_argument("--tenant-id", type=int, required=True)
+
+    p = sub.add_parser("gc")
+    p.add_argument("--tenant-id", type=int, required=True)
+    p.add_argument("--force", action="store_true", help="ignore the grace period")
+
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        asyncio.run(backfill(args.tenant_id))
+        return
+
+    db = SessionLocal()
+    try:
+        if args.command == "register":
+            m = embedding_migration.register_model(
+                db,
+                args.model_key,
+                args.provider_model,
+                args.dim,
+                search_dim=args.search_dim,
+                storage_format=args.format,
+            )
+            print(f"registered {m.model_key} ({m.storage_format}/{m.search_dim})")
+        elif args.command == "migrate":
+            embedding_migration.start_migration(
+                db, args.tenant_id, args.model_key, shadow=not args.no_shadow
+            )
+            print(f"tenant {args.tenant_id}: backfilling {args.model_key}")
+        elif args.command == "status":
+            show_status(db, args.tenant_id)
+        elif args.command == "cutover":
+            state = embedding_migration.cutover(db, args.tenant_id)
+            print(
+                f"tenant {args.tenant_id}: active={state.active_model}"
+                f" (previous {state.previous_model} kept until gc)"
+            )
+        elif args.command in ("pause", "resume"):
+            embedding_migration.set_paused(
+                db, args.tenant_id, args.command == "pause"
+            )
+            print(f"tenant {args.tenant_id}: {args.command}d")
+        elif args.command == "abort":
+            embedding_migration.abort_migration(db, args.tenant_id)
+            print(f"tenant {args.tenant_id}: migration aborted (run gc to drop vectors)")
+        elif args.command == "gc":
+            n = embedding_migration.gc(db, args.tenant_id, force=args.force)
+            print(f"tenant {args.tenant_id}: deleted {n} embeddings")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import array
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, text
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.db import bind_num_list
+from core.metrics import registry
+from models.Models import AppUser, DocumentPermission
+
+# Document visibility:
+# - a document with no document_permissions rows is visible tenant-wide
+# - otherwise only to its owner and the principals listed (user, or a group
+#   the user belongs to)
+# - principals with the "admin" role see every document of their tenant
+# Cached visibility sets are tagged with tenants.acl_version, which every
+# permission change and new document bumps in the database, so all API
+# processes drop stale sets on their next lookup.
+
+acl_lookups = registry.counter(
+    "acl_visibility_lookups_total", "Visibility set lookups by outcome (hit/miss)"
+)
+acl_build_seconds = registry.histogram(
+    "acl_visibility_build_seconds",
+    "Time to compute one principal's visibility set",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+acl_set_size = registry.histogram(
+    "acl_visibility_set_ids",
+    "doc_ids stored per visibility set (allow or deny list)",
+    buckets=(0, 10, 100, 1000, 10_000, 100_000),
+)
+
+VISIBILITY_SQL = text(
+    """
+    SELECT d.doc_id,
+           CASE
+             WHEN d.owner_user_id = :user_id THEN 1
+             WHEN NOT EXISTS (
+               SELECT 1 FROM document_permissions p WHERE p.doc_id = d.doc_id
+             ) THEN 1
+             WHEN EXISTS (
+               SELECT 1 FROM document_permissions p
+               WHERE p.doc_id = d.doc_id
+                 AND (
+                   (p.principal_type = 'user' AND p.principal_id = :user_id)
+                   OR (p.principal_type = 'group' AND p.principal_id IN (
+                         SELECT g.COLUMN_VALUE FROM TABLE(:group_ids) g))
+                 )
+             ) THEN 1
+             ELSE 0
+           END AS visible
+    FROM documents d
+    WHERE d.tenant_id = :tenant_id
+    """
+)
+
+ACL_VERSION_SQL = text("SELECT acl_version FROM tenants WHERE tenant_id = :tenant_id")
+
+BUMP_ACL_VERSION_SQL = text(
+    "UPDATE tenants SET acl_version = acl_version + 1 WHERE tenant_id = :tenant_id"
+)
+
+# a group principal must be carried by at least one user of the tenant
+# (groups ride along in app_users.preferences, see core.deps)
+GROUP_IN_TENANT_SQL = text(
+    """
+    SELECT 1 FROM app_users u
+    WHERE u.tenant_id = :tenant_id
+      AND JSON_EXISTS(u.preferences, '$.groups[*]?(@ == $g)' PASSING :group_id AS "g")
+    FETCH FIRST 1 ROWS ONLY
+    """
+)
+
+
+@dataclass(frozen=True)
+class Visibility:
+    """
+    What one principal may retrieve, stored as whichever list is shorter:
+    mode "all" (no restriction), "allow" (only doc_ids) or "deny" (all but
+    doc_ids). doc_ids is a sorted int64 array.
+    """
+
+    mode: str
+    doc_ids: array.array
+
+    def can_see(self, doc_id: int) -> bool:
+        if self.mode == "all":
+            return True
+        i = bisect.bisect_left(self.doc_ids, doc_id)
+        listed = i < len(self.doc_ids) and self.doc_ids[i] == doc_id
+        return listed if self.mode == "allow" else not listed
+
+    def filter(self, doc_ids: Iterable[int]) -> List[int]:
+        return [int(d) for d in doc_ids if self.can_see(int(d))]
+
+    def filter_sql(self, db: Session, column: str = "c.doc_id") -> Tuple[str, dict]:
+        """Prefilter on `column` (c.doc_id in the retrieval queries)."""
+        if self.mode == "all":
+            return "1=1", {}
+        if self.mode == "allow" and not self.doc_ids:
+            return "1=0", {}
+        if self.mode == "deny" and not self.doc_ids:
+            return "1=1", {}
+        op = "IN" if self.mode == "allow" else "NOT IN"
+        return (
+            f"{column} {op} (SELECT acl.COLUMN_VALUE FROM TABLE(:acl_ids) acl)",
+            {"acl_ids": bind_num_list(db, self.doc_ids)},
+        )
+
+
+UNRESTRICTED = Visibility(mode="all", doc_ids=array.array("q"))
+
+
+class VisibilityCache:
+    """
+    Process-local LRU of visibility sets keyed by (tenant, user, groups).
+    Each entry remembers the tenant's acl_version it was built at; a lookup
+    reads the current version (one primary-key read) and rebuilds when it
+    moved, so a permission change made through any process is seen by all
+    of them. The TTL only bounds memory held by idle entries.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, Visibility]]" = (
+            OrderedDict()
+        )
+
+    def get(
+        self,
+        db: Session,
+        tenant_id: int,
+        user_id: int,
+        group_ids: Tuple[int, ...] = (),
+        roles: Tuple[str, ...] = (),
+    ) -> Visibility:
+        if not settings.RETRIEVAL_ACL or "admin" in roles:
+            return UNRESTRICTED
+
+        key = (tenant_id, user_id, tuple(sorted(group_ids)))
+        # read before building: a change committed meanwhile bumps past it
+        version = int(
+            db.execute(ACL_VERSION_SQL, {"tenant_id": tenant_id}).scalar() or 0
+        )
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now and entry[1] == version:
+                self._entries.move_to_end(key)
+                acl_lookups.inc(outcome="hit")
+                return entry[2]
+        acl_lookups.inc(outcome="miss")
+
+        vis = self._build(db, tenant_id, user_id, key[2])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= version:
+                self._entries[key] = (now + self.ttl_seconds, version, vis)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return vis
+
+    def invalidate_tenant(self, db: Session, tenant_id: int) -> None:
+        """Bumps the tenant's acl_version and commits (e.g. after an upload)."""
+        bump_acl_version(db, tenant_id)
+        db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _build(
+        self, db: Session, tenant_id: int, user_id: int, group_ids: Tuple[int, ...]
+    ) -> Visibility:
+        t0 = time.perf_counter()
+        rows = db.execute(
+            VISIBILITY_SQL,
+            {
+                "tenant_id": tenant_id,
+                "user_id": user_id,
+                "group_ids": bind_num_list(db, group_ids),
+            },
+        ).all()
+        allow = sorted(int(r.doc_id) for r in rows if r.visible)
+        deny = sorted(int(r.doc_id) for r in rows if not r.visible)
+
+        if not deny:
+            vis = UNRESTRICTED
+        elif len(allow) <= len(deny):
+            vis = Visibility(mode="allow", doc_ids=array.array("q", allow))
+        else:
+            vis = Visibility(mode="deny", doc_ids=array.array("q", deny))
+        acl_build_seconds.observe(time.perf_counter() - t0)
+        acl_set_size.observe(len(vis.doc_ids))
+        return vis
+
+
+visibility_cache = VisibilityCache(
+    ttl_seconds=settings.ACL_CACHE_TTL_SECONDS,
+    max_entries=settings.ACL_CACHE_MAX_ENTRIES,
+)
+
+
+def visibility_for(db: Session, me) -> Visibility:
+    return visibility_cache.get(
+        db, me.tenant_id, me.user_id, me.group_ids, me.roles
+    )
+
+
+def bump_acl_version(db: Session, tenant_id: int) -> None:
+    """Retires every cached visibility set of the tenant once committed."""
+    db.execute(BUMP_ACL_VERSION_SQL, {"tenant_id": tenant_id})
+
+
+def principal_in_tenant(
+    db: Session, tenant_id: int, principal_type: str, principal_id: int
+) -> bool:
+    if principal_type == "user":
+        user = db.get(AppUser, principal_id)
+        return user is not None and user.tenant_id == tenant_id
+    if principal_type == "group":
+        row = db.execute(
+            GROUP_IN_TENANT_SQL, {"tenant_id": tenant_id, "group_id": principal_id}
+        ).first()
+        return row is not None
+    return False
+
+
+def grant(
+    db: Session,
+    tenant_id: int,
+    doc_id: int,
+    principal_type: str,
+    principal_id: int,
+    role: str = "reader",
+) -> DocumentPermission:
+    if not principal_in_tenant(db, tenant_id, principal_type, principal_id):
+        raise ValueError(f"Unknown {principal_type} {principal_id} in this tenant")
+    perm = db.get(DocumentPermission, (doc_id, principal_id, principal_type))
+    if perm is None:
+        perm = DocumentPermission(
+            doc_id=doc_id,
+            principal_type=principal_type,
+            principal_id=principal_id,
+            role=role,
+        )
+        db.add(perm)
+    else:
+        perm.role = role
+    bump_acl_version(db, tenant_id)
+    db.commit()
+    return perm
+
+
+def revoke(
+    db: Session,
+    tenant_id: int,
+    doc_id: int,
+    principal_type: str,
+    principal_id: int,
+) -> bool:
+    res = db.execute(
+        delete(DocumentPermission).where(
+            DocumentPermission.doc_id == doc_id,
+            DocumentPermission.principal_type == principal_type,
+            DocumentPermission.principal_id == principal_id,
+        )
+    )
+    if res.rowcount:
+        bump_acl_version(db, tenant_id)
+    db.commit()
+    return bool(res.rowcount)
+
+
+def list_permissions(db: Session, doc_id: int) -> List[DocumentPermission]:
+    return (
+        db.query(DocumentPermission)
+        .filter(DocumentPermission.doc_id == doc_id)
+        .order_by(DocumentPermission.principal_type, DocumentPermission.principal_id)
+        .all()
+    )
+
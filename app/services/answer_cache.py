@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import array
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import registry
+from models.Models import AnswerCacheDoc, AnswerCacheEntry
+
+answer_cache_lookups = registry.counter(
+    "answer_cache_lookups_total", "Answer cache lookups by outcome (hit/miss)"
+)
+answer_cache_hit_ratio = registry.gauge(
+    "answer_cache_hit_ratio", "Answer cache hits / lookups since process start"
+)
+answer_cache_gpu_seconds_saved = registry.counter(
+    "answer_cache_gpu_seconds_saved_total",
+    "Generation seconds not spent thanks to cache hits (original generation time)",
+)
+answer_cache_invalidations = registry.counter(
+    "answer_cache_invalidations_total", "Cache entries dropped because a cited document changed"
+)
+
+LOOKUP_SQL = text(
+    """
+SELECT * FROM (
+  SELECT
+    cache_id,
+    answer,
+    citations_json,
+    gen_seconds,
+    VECTOR_DISTANCE(query_embedding, :query_vec, COSINE) AS distance
+  FROM answer_cache
+  WHERE tenant_id = :tenant_id
+    AND chunk_key = :chunk_key
+    AND context_key = :context_key
+    AND chat_model_id = :chat_model_id
+    AND embedding_model_id = :embedding_model_id
+    AND created_at > SYSTIMESTAMP - NUMTODSINTERVAL(:ttl_seconds, 'SECOND')
+  ORDER BY distance ASC
+)
+WHERE ROWNUM <= 1
+"""
+)
+
+INVALIDATE_SQL = text(
+    """
+DELETE FROM answer_cache
+WHERE cache_id IN (SELECT cache_id FROM answer_cache_docs WHERE doc_id = :doc_id)
+"""
+)
+
+
+@dataclass
+class CachedAnswer:
+    cache_id: int
+    answer: str
+    citations: List[Dict[str, Any]]
+    gen_seconds: float
+    distance: float
+
+
+def chunk_key(hits: Sequence[Dict[str, Any]]) -> str:
+    """Order-independent key over the retrieved (chunk_id, version_id) set."""
+    pairs = sorted(
+        (int(h["chunk_id"]), int(h.get("version_id") or 0)) for h in hits
+    )
+    raw = ",".join(f"{c}:{v}" for c, v in pairs)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def context_key(history: Sequence[Any], summary: Optional[str]) -> str:
+    """
+    Key over the conversation state the prompt carries (rolling summary and
+    history turns): an answer shaped by one conversation's earlier turns is
+    only reused for the same turns.
+    """
+    h = hashlib.sha256()
+    h.update((summary or "").encode("utf-8"))
+    for m in history:
+        h.update(b"\x00")
+        h.update(f"{m.role}:{m.content or ''}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class AnswerCache:
+    """
+    Semantic answer cache. An entry is reused when, in the same tenant and
+    for the same chat and embedding model, retrieval returned exactly the
+    same chunk set (chunk ids + versions), the conversation context
+    (context_key) is the same and the query embedding is within
+    ANSWER_CACHE_MAX_DISTANCE (cosine). Entries are dropped when any cited
+    document is reprocessed (IngestPipeline.process_document).
+    """
+
+    def __init__(self):
+        self._lookups = 0
+        self._hits = 0
+
+    def lookup(
+        self,
+        db: Session,
+        tenant_id: int,
+        chat_model_id: str,
+        embedding_model_id: str,
+        query_vec: List[float],
+        hits: Sequence[Dict[str, Any]],
+        context: str,
+    ) -> Optional[CachedAnswer]:
+        if not hits:
+            return None
+        row = (
+            db.execute(
+                LOOKUP_SQL,
+                {
+                    "tenant_id": tenant_id,
+                    "chunk_key": chunk_key(hits),
+                    "context_key": context,
+                    "chat_model_id": chat_model_id,
+                    "embedding_model_id": embedding_model_id,
+                    "query_vec": array.array("f", query_vec),
+                    "ttl_seconds": int(settings.ANSWER_CACHE_TTL_SECONDS),
+                },
+            )
+            .mappings()
+            .first()
+        )
+        hit = row is not None and float(row["distance"]) <= settings.ANSWER_CACHE_MAX_DISTANCE
+        self._record(hit)
+        if not hit:
+            return None
+
+        gen_seconds = float(row["gen_seconds"] or 0.0)
+        answer_cache_gpu_seconds_saved.inc(gen_seconds, tenant_id=tenant_id)
+        db.execute(
+            text(
+                "UPDATE answer_cache SET hit_count = hit_count + 1, "
+                "last_hit_at = SYSTIMESTAMP WHERE cache_id = :cache_id"
+            ),
+            {"cache_id": int(row["cache_id"])},
+        )
+        return CachedAnswer(
+            cache_id=int(row["cache_id"]),
+            answer=row["answer"],
+            citations=json.loads(row["citations_json"] or "[]"),
+            gen_seconds=gen_seconds,
+            distance=float(row["distance"]),
+        )
+
+    def store(
+        self,
+        db: Session,
+        tenant_id: int,
+        chat_model_id: str,
+        embedding_model_id: str,
+        query_text: str,
+        query_vec: List[float],
+        hits: Sequence[Dict[str, Any]],
+        answer: str,
+        citations: List[Dict[str, Any]],
+        gen_seconds: float,
+        context: str,
+    ) -> None:
+        """Adds an entry to the session; committed with the chat turn."""
+        if not hits or not answer:
+            return
+        entry = AnswerCacheEntry(
+            tenant_id=tenant_id,
+            chat_model_id=chat_model_id,
+            embedding_model_id=embedding_model_id,
+            chunk_key=chunk_key(hits),
+            context_key=context,
+            query_text=query_text,
+            query_embedding=array.array("f", query_vec),
+            answer=answer,
+            citations_json=json.dumps(citations),
+            gen_seconds=gen_seconds,
+            hit_count=0,
+        )
+        # every retrieved document, not only cited ones: the chunk set is the key
+        entry.docs = [
+            AnswerCacheDoc(doc_id=d) for d in sorted({int(h["doc_id"]) for h in hits})
+        ]
+        db.add(entry)
+
+    def invalidate_document(self, db: Session, doc_id: int) -> int:
+        n = db.execute(INVALIDATE_SQL, {"doc_id": doc_id}).rowcount or 0
+        if n:
+            answer_cache_invalidations.inc(n)
+        return n
+
+    def _record(self, hit: bool) -> None:
+        answer_cache_lookups.inc(outcome="hit" if hit else "miss")
+        self._lookups += 1
+        self._hits += int(hit)
+        answer_cache_hit_ratio.set(self._hits / self._lookups)
+
+
+answer_cache = AnswerCache()
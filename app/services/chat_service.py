@@ -1,56 +1,63 @@
 from __future__ import annotations
 
-# load citations from DB (authoritative)
 import json
+import random
+import time
+from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from core.config import settings
-from models.Models import Conversation, Message, RetrievalEvent, MessageCitation
+from core.metrics import registry
+from models.Models import Conversation, Message
+from services.acl_service import Visibility
+from services.answer_cache import (
+    AnswerCache,
+    answer_cache as default_answer_cache,
+    context_key,
+)
+from services.embedding_migration import shadow_reader
+from services.embedding_models import EmbeddingModelSpec, embedding_registry
+from services.conversation_summarizer import (
+    ConversationSummarizer,
+    summarizer as default_summarizer,
+    summary_age_seconds,
+    summary_lag_messages,
+    summary_tokens_saved,
+)
 from services.ollama_client import OllamaClient
+from services.prompt_builder import PromptBuilder
 from services.retrieval_service import RetrievalService
+from services.write_behind import WriteBehindQueue, write_behind as default_write_behind
+
+
+chat_prompt_tokens = registry.histogram(
+    "chat_prompt_tokens",
+    "Estimated prompt tokens sent per chat turn (compare with chat_prefill_tokens)",
+    buckets=(0, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768),
+)
 
 
 class ChatService:
-    def __init__(self, ollama: OllamaClient, retrieval: RetrievalService):
+    def __init__(
+        self,
+        ollama: OllamaClient,
+        retrieval: RetrievalService,
+        prompt_builder: Optional[PromptBuilder] = None,
+        summarizer: Optional[ConversationSummarizer] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        write_behind: Optional[WriteBehindQueue] = None,
+    ):
         self.ollama = ollama
         self.retrieval = retrieval
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.summarizer = summarizer or default_summarizer
+        self.answer_cache = answer_cache or default_answer_cache
+        self.write_behind = write_behind or default_write_behind
 
-    async def _embed_query(self, text: str) -> List[float]:
-        model = settings.EMBEDDING_MODEL
-        return await self.ollama.embed(model=model, text=text)
-
-    def _format_context(
-        self, hits: List[Dict[str, Any]], max_chars_per_chunk: int = 1200
-    ) -> str:
-        blocks: List[str] = []
-        for h in hits:
-            doc_id = h.get("doc_id")
-            chunk_id = h.get("chunk_id")
-            page_start = h.get("page_start")
-            page_end = h.get("page_end")
-            section_path = h.get("section_path") or ""
-
-            cite = f"[{doc_id}:{chunk_id}]"
-            meta = []
-            if page_start is not None:
-                meta.append(
-                    f"p{page_start}"
-                    + (f"-{page_end}" if page_end and page_end != page_start else "")
-                )
-            if section_path:
-                meta.append(section_path)
-            meta_str = " | ".join(meta)
-            header = f"{cite} ({meta_str})" if meta_str else cite
-
-            text = (h.get("chunk_text") or "").strip()
-            if len(text) > max_chars_per_chunk:
-                text = text[:max_chars_per_chunk].rstrip() + "…"
-
-            blocks.append(f"{header}\n{text}")
-
-        return "\n\n---\n\n".join(blocks)
+    async def _embed_query(self, text: str, spec: EmbeddingModelSpec) -> List[float]:
+        return await self.ollama.embed(model=spec.provider_model, text=text)
 
     def _pick_score_for_event(self, h: Dict[str, Any]) -> Dict[str, Any]:
         # store whatever exists
@@ -61,6 +68,24 @@ class ChatService:
             "source": h.get("source"),
         }
 
+    def _citation_from_hit(self, h: Dict[str, Any]) -> Dict[str, Any]:
+        if h.get("hybrid_score") is not None:
+            score = float(h["hybrid_score"])
+        elif h.get("text_score") is not None:
+            score = float(h["text_score"])
+        elif h.get("vector_distance") is not None:
+            score = 1.0 / (1.0 + float(h["vector_distance"]))
+        else:
+            score = 0.0
+        return {
+            "doc_id": int(h["doc_id"]),
+            "chunk_id": int(h["chunk_id"]),
+            "page_start": h.get("page_start"),
+            "page_end": h.get("page_end"),
+            "section_path": h.get("section_path"),
+            "score": score,
+        }
+
     async def chat(
         self,
         db: Session,
@@ -72,7 +97,13 @@ class ChatService:
         k_vec: int,
         k_text: int,
         use_text: bool,
-    ) -> Tuple[Message, str, List[MessageCitation]]:
+        visibility: Optional[Visibility] = None,
+    ) -> Tuple[Message, str, List[Dict[str, Any]]]:
+        """
+        Returns (assistant message, answer, citations). Citations are built
+        from the hits in memory (score desc); they and the retrieval event
+        reach the DB through the write-behind queue.
+        """
 
         convo = (
             db.query(Conversation)
@@ -91,22 +122,42 @@ class ChatService:
         if not q:
             raise ValueError("Message content cannot be empty")
 
+        use_summary = settings.CHAT_HISTORY_MODE == "summary"
+        summary = convo.summary_text if use_summary else None
+
+        history_q = db.query(Message).filter(Message.conversation_id == conversation_id)
+        if summary and convo.summary_message_id:
+            # only what the summary doesn't cover yet
+            history_q = history_q.filter(
+                Message.message_id > convo.summary_message_id
+            )
         history = (
-            db.query(Message)
-            .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.desc())
-            .limit(10)
+            history_q.order_by(Message.created_at.desc())
+            .limit(settings.CHAT_HISTORY_MAX_MESSAGES)
             .all()
         )
         history.reverse()
 
+        if summary:
+            summary_lag_messages.observe(
+                max(0, len(history) - settings.CHAT_SUMMARY_RECENT_MESSAGES)
+            )
+            if convo.summary_updated_at:
+                summary_age_seconds.observe(
+                    (datetime.utcnow() - convo.summary_updated_at).total_seconds()
+                )
+            saved = (convo.summary_source_tokens or 0) - (convo.summary_tokens or 0)
+            if saved > 0:
+                summary_tokens_saved.inc(saved)
+
         # 1) Store user message
         user_msg = Message(conversation_id=conversation_id, role="user", content=q)
         db.add(user_msg)
         db.flush()
 
-        # 2) Embed + retrieve
-        query_vec = await self._embed_query(q)
+        # 2) Embed + retrieve, with the tenant's active embedding model
+        models = embedding_registry.for_tenant(db, tenant_id)
+        query_vec = await self._embed_query(q, models.active)
 
         hits = self.retrieval.hybrid_search(
             db=db,
@@ -118,10 +169,22 @@ class ChatService:
             k_text=k_text,
             use_text=use_text,
             alpha=0.70,
+            visibility=visibility,
+            spec=models.active,
         )
 
-        # 3) Persist retrieval event
-        ev = RetrievalEvent(
+        # during a migration, compare a sample against the target model
+        if (
+            models.target is not None
+            and models.shadow_reads
+            and random.random() < settings.EMBEDDING_SHADOW_SAMPLE
+        ):
+            shadow_reader.schedule(
+                tenant_id, q, doc_ids, k_vec, visibility, models.target, hits
+            )
+
+        # 3) Retrieval event (written behind, after the user message commits)
+        event = dict(
             message_id=user_msg.message_id,
             query_text=q,
             filters_json=json.dumps(
@@ -146,88 +209,94 @@ class ChatService:
                 ]
             ),
         )
-        db.add(ev)
 
         # bump conversation updated time
         convo.updated_at = None
 
         db.commit()
-        db.refresh(user_msg)
-
-        # 4) Build messages for Ollama /api/chat
-        system_msg = {
-            "role": "system",
-            "content": (
-                "You are a private enterprise RAG assistant.\n"
-                "Use ONLY the provided CONTEXT to answer.\n"
-                "If the answer is not in the context, say you don't know.\n"
-                "Cite sources like [doc_id:chunk_id] after the sentence(s) they support."
-            ),
-        }
-
-        context = self._format_context(hits)
-
-        messages: List[Dict[str, str]] = [system_msg]
-
-        if context:
-            messages.append({"role": "system", "content": f"CONTEXT:\n{context}"})
-
-        # Add prior history
-        for m in history:
-            if m.role in ("user", "assistant", "system"):
-                messages.append({"role": m.role, "content": m.content})
-
-        # Add new user query as last user message
-        messages.append({"role": "user", "content": q})
+        await self.write_behind.submit("retrieval_event", [event])
+
+        model = convo.chat_model_id or settings.DEFAULT_CHAT_MODEL
+
+        # 4) Same question over the same chunks, in the same conversation
+        # context, already answered?
+        cached = None
+        cache_context = context_key(history, summary)
+        if settings.ANSWER_CACHE:
+            cached = self.answer_cache.lookup(
+                db,
+                tenant_id,
+                model,
+                models.active.model_key,
+                query_vec,
+                hits,
+                cache_context,
+            )
 
-        # 5) Generate answer
-        try:
-            answer = await self.ollama.chat(
-                model=convo.chat_model_id, messages=messages
+        if cached:
+            print(
+                f"answer cache hit {cached.cache_id} (distance {cached.distance:.4f}, "
+                f"saved {cached.gen_seconds:.1f}s)"
+            )
+            answer = cached.answer
+            cited = cached.citations
+        else:
+            # 5) Build messages for Ollama /api/chat within the token budget
+            plan = self.prompt_builder.build(q, hits, history, summary=summary)
+            chat_prompt_tokens.observe(plan.prompt_tokens, model=model)
+            print(
+                f"prompt: {plan.prompt_tokens} tokens (context {plan.context_tokens}, "
+                f"history {plan.history_tokens}), num_ctx={plan.num_ctx}, "
+                f"hits used {len(plan.used_hits)}/{len(hits)} "
+                f"(deduped {plan.deduped_hits}), turns dropped {plan.dropped_turns}"
             )
-        except Exception as e:
-            raise RuntimeError(f"Model generation failed: {e}")
 
-        # 6) Store assistant message
+            # 6) Generate answer
+            gen_started = time.perf_counter()
+            try:
+                answer = await self.ollama.chat(
+                    model=model,
+                    messages=plan.messages,
+                    num_ctx=plan.num_ctx,
+                )
+            except Exception as e:
+                raise RuntimeError(f"Model generation failed: {e}")
+            gen_seconds = time.perf_counter() - gen_started
+
+            # cite the hits that made it into the prompt
+            cited = [self._citation_from_hit(h) for h in plan.used_hits]
+            if settings.ANSWER_CACHE:
+                self.answer_cache.store(
+                    db,
+                    tenant_id,
+                    model,
+                    models.active.model_key,
+                    q,
+                    query_vec,
+                    hits,
+                    answer,
+                    cited,
+                    gen_seconds,
+                    cache_context,
+                )
+
+        # 7) Store assistant message
         asst_msg = Message(
             conversation_id=conversation_id, role="assistant", content=answer
         )
         db.add(asst_msg)
-        db.flush()  # assigns asst_msg.message_id
-
-        # 7) Store citations for assistant message (using retrieval hits)
-
-        def citation_score_from_hit(h: dict) -> float:
-            if h.get("hybrid_score") is not None:
-                return float(h["hybrid_score"])
-            if h.get("text_score") is not None:
-                return float(h["text_score"])
-            if h.get("vector_distance") is not None:
-                return 1.0 / (1.0 + float(h["vector_distance"]))
-            return 0.0
-
-        for h in hits:
-            db.add(
-                MessageCitation(
-                    message_id=asst_msg.message_id,
-                    doc_id=int(h["doc_id"]),
-                    chunk_id=int(h["chunk_id"]),
-                    page_start=h.get("page_start"),
-                    page_end=h.get("page_end"),
-                    section_path=h.get("section_path"),
-                    score=citation_score_from_hit(h),
-                )
-            )
-
         db.commit()
         db.refresh(asst_msg)
 
-        # If you want them returned sorted:
-        cits = (
-            db.query(MessageCitation)
-            .filter(MessageCitation.message_id == asst_msg.message_id)
-            .order_by(MessageCitation.score.desc().nullslast())
-            .all()
+        # 8) Citations for the assistant message, written behind
+        cited = sorted(cited, key=lambda c: c["score"] or 0.0, reverse=True)
+        await self.write_behind.submit(
+            "message_citation",
+            [{"message_id": asst_msg.message_id, **c} for c in cited],
         )
 
-        return asst_msg, answer, cits
+        if use_summary:
+            # fold older turns into the rolling summary off the request path
+            self.summarizer.schedule(conversation_id)
+
+        return asst_msg, answer, cited
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 
+from core.config import settings
 from services.extraction_service import ExtractResult, PageText
+from services.tokenizer import count_tokens, count_tokens_batch
 
 
 @dataclass
@@ -27,37 +30,31 @@ def chunk_extracted(
     - For docx/text: treat as single page.
     - Stores page_start/page_end for citations.
     """
-    pages: List[PageText] = extracted.pages
+    return list(iter_chunks(extracted.pages, max_chars=max_chars, min_chars=min_chars))
 
-    # Build (page_num, paragraph_text) stream
-    stream: List[Tuple[int, str]] = []
-    for p in pages:
-        # split into paragraphs
-        paras = [x.strip() for x in p.text.split("\n\n") if x.strip()]
-        if not paras:
-            continue
-        for para in paras:
-            stream.append((p.page, para))
-
-    chunks: List[ChunkSpec] = []
-    if not stream:
-        return chunks
 
+def iter_chunks(
+    pages: Iterable[PageText],
+    max_chars: int = 5000,
+    min_chars: int = 800,
+) -> Iterator[ChunkSpec]:
+    """
+    Streaming form of chunk_extracted: consumes pages as they arrive (e.g.
+    from extraction_service.iter_pages) and yields each ChunkSpec as soon as
+    it is full, so only the chunk being packed is held in memory.
+    """
     buf: List[str] = []
     buf_len = 0
     start_page: Optional[int] = None
     end_page: Optional[int] = None
     idx = 0
 
-    def flush():
+    def flush() -> Optional[ChunkSpec]:
         nonlocal idx, buf, buf_len, start_page, end_page
-        if not buf:
-            return
         text = "\n\n".join(buf).strip()
-        if not text:
-            return
-        chunks.append(
-            ChunkSpec(
+        spec = None
+        if text:
+            spec = ChunkSpec(
                 chunk_index=idx,
                 page_start=start_page,
                 page_end=end_page,
@@ -65,27 +62,262 @@ def chunk_extracted(
                 token_count=None,  # optional; can compute later using tokenizer
                 chunk_text=text,
             )
-        )
-        idx += 1
+            idx += 1
         buf = []
         buf_len = 0
         start_page = None
         end_page = None
+        return spec
 
-    for page_num, para in stream:
-        if start_page is None:
-            start_page = page_num
-        end_page = page_num
-
-        # If adding this paragraph would exceed max_chars, flush first (as long as we have enough content)
-        projected = buf_len + len(para) + (2 if buf else 0)
-        if buf and projected > max_chars and buf_len >= min_chars:
-            flush()
-            start_page = page_num
+    for p in pages:
+        # split into paragraphs
+        for para in (x.strip() for x in p.text.split("\n\n")):
+            if not para:
+                continue
+            page_num = p.page
+            if start_page is None:
+                start_page = page_num
             end_page = page_num
 
-        buf.append(para)
-        buf_len += len(para) + (2 if buf_len else 0)
+            # If adding this paragraph would exceed max_chars, flush first (as long as we have enough content)
+            projected = buf_len + len(para) + (2 if buf else 0)
+            if buf and projected > max_chars and buf_len >= min_chars:
+                spec = flush()
+                if spec:
+                    yield spec
+                start_page = page_num
+                end_page = page_num
+
+            buf.append(para)
+            buf_len += len(para) + (2 if buf_len else 0)
+
+    if buf:
+        spec = flush()
+        if spec:
+            yield spec
+
+
+# ---------------------------------------------------------------------------
+# Token-bounded, structure-aware chunking
+# ---------------------------------------------------------------------------
+
+_MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(\S.{0,150})$")
+_NUM_HEADING_RE = re.compile(r"^(\d{1,3}(?:\.\d{1,3}){0,3})\.?\s+([A-Z][^\n]{0,120})$")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+_SECTION_PATH_MAX_BYTES = 2000  # document_chunks.section_path VARCHAR2(2000)
+
+
+@dataclass
+class _Unit:
+    text: str
+    tokens: int
+    page: int
+    para_start: bool  # joined with "\n\n" instead of " "
+    heading: bool = False
+    level: int = 0  # heading level
+
+
+def _detect_heading(line: str) -> Optional[Tuple[int, str]]:
+    """Returns (level, title) when `line` looks like a section heading."""
+    line = line.strip()
+    if not line or len(line) > 150 or line[-1] in ".,;":
+        return None
+    m = _MD_HEADING_RE.match(line)
+    if m:
+        return len(m.group(1)), m.group(2).strip().rstrip("#").strip()
+    m = _NUM_HEADING_RE.match(line)
+    if m and len(m.group(2).split()) <= 12:
+        return m.group(1).count(".") + 1, line
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 4 and len(line.split()) <= 10 and all(c.isupper() for c in letters):
+        return 1, line
+    return None
+
+
+def _section_path(stack: List[Tuple[int, str]]) -> Optional[str]:
+    if not stack:
+        return None
+    path = " > ".join(title for _, title in stack)
+    raw = path.encode("utf-8")
+    if len(raw) > _SECTION_PATH_MAX_BYTES:
+        path = raw[:_SECTION_PATH_MAX_BYTES].decode("utf-8", errors="ignore")
+    return path
+
+
+def _sentence_units(text: str, page: int) -> Iterator[_Unit]:
+    """Sentences of one paragraph; run-on sentences are split by the packer."""
+    sentences = [x for x in _SENTENCE_END_RE.split(text) if x.strip()]
+    first = True
+    for sent, n in zip(sentences, count_tokens_batch(sentences)):
+        yield _Unit(sent, n, page, first)
+        first = False
+
+
+def _iter_units(
+    pages: Iterable[PageText],
+) -> Iterator[Tuple[_Unit, Optional[Tuple[int, str]]]]:
+    """Yields (unit, heading) in reading order; heading is set for heading lines."""
+    for p in pages:
+        for para in (x.strip() for x in p.text.split("\n\n")):
+            if not para:
+                continue
+            # PDF text often runs a heading straight into its first paragraph
+            first_line, _, rest = para.partition("\n")
+            heading = _detect_heading(first_line)
+            if heading:
+                title = first_line.strip()
+                unit = _Unit(title, count_tokens(title), p.page, True, True, heading[0])
+                yield unit, heading
+                para = rest.strip()
+                if not para:
+                    continue
+            for u in _sentence_units(para, p.page):
+                yield u, None
+
+
+def iter_token_chunks(
+    pages: Iterable[PageText],
+    max_tokens: int = 512,
+    overlap_tokens: int = 64,
+) -> Iterator[ChunkSpec]:
+    """
+    Token-bounded chunking, streaming like iter_chunks:
+    - sentences are packed up to `max_tokens` (local tokenizer), keeping
+      paragraph breaks; a run-on sentence over budget is split on words, its
+      first piece filling what is left of the current chunk and each later
+      piece repeating up to `overlap_tokens` of words from the one before
+    - each chunk repeats up to `overlap_tokens` of trailing sentences from
+      the previous one, never across a section boundary
+    - detected headings start a new chunk and fill section_path
+      ("1 Intro > 1.2 Scope")
+    Every unit is tokenized once and overlap is bounded, so this is linear
+    in the size of the text.
+    """
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    stack: List[Tuple[int, str]] = []
+    buf: List[_Unit] = []
+    buf_tokens = 0
+    fresh = 0  # units in buf not already emitted as overlap / headings
+    idx = 0
+
+    def emit() -> ChunkSpec:
+        nonlocal idx
+        parts: List[str] = []
+        for u in buf:
+            if parts:
+                parts.append("\n\n" if u.para_start else " ")
+            parts.append(u.text)
+        spec = ChunkSpec(
+            chunk_index=idx,
+            page_start=min(u.page for u in buf),
+            page_end=max(u.page for u in buf),
+            section_path=_section_path(stack),
+            token_count=buf_tokens,
+            chunk_text="".join(parts),
+        )
+        idx += 1
+        return spec
+
+    for unit, heading in _iter_units(pages):
+        if heading is not None:
+            if fresh:
+                yield emit()
+                buf, buf_tokens = [], 0
+            fresh = 0
+            level = heading[0]
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append(heading)
+            # consecutive headings stay together, minus the ones this heading
+            # closes; overlap from the previous section does not carry over
+            buf = [u for u in buf if u.heading and u.level < level]
+            buf_tokens = sum(u.tokens for u in buf)
+            buf.append(unit)
+            buf_tokens += unit.tokens
+            continue
+
+        if unit.tokens > max_tokens:
+            # run-on sentence: its first words fill the current chunk, the
+            # rest continue in chunks that overlap on words
+            words = unit.text.split()
+            counts = count_tokens_batch(words)
+            if buf_tokens + counts[0] > max_tokens:
+                if fresh:
+                    yield emit()
+                buf = [] if fresh else [u for u in buf if u.heading]
+                buf_tokens = sum(u.tokens for u in buf)
+                if buf_tokens + counts[0] > max_tokens:
+                    buf, buf_tokens = [], 0
+                fresh = 0
+            i = 0
+            while True:
+                start, piece_tokens = i, 0
+                while i < len(words) and (
+                    i == start or buf_tokens + piece_tokens + counts[i] <= max_tokens
+                ):
+                    piece_tokens += counts[i]
+                    i += 1
+                buf.append(
+                    _Unit(
+                        " ".join(words[start:i]),
+                        piece_tokens,
+                        unit.page,
+                        unit.para_start and start == 0,
+                    )
+                )
+                buf_tokens += piece_tokens
+                fresh += 1
+                if i == len(words):
+                    break
+                yield emit()
+                j, tail_tokens = i, 0
+                while j > start + 1 and tail_tokens + counts[j - 1] <= overlap_tokens:
+                    j -= 1
+                    tail_tokens += counts[j]
+                buf = [_Unit(" ".join(words[j:i]), tail_tokens, unit.page, False)]
+                buf = buf if tail_tokens else []
+                buf_tokens = tail_tokens
+                fresh = 0
+            continue
+
+        if fresh and buf_tokens + unit.tokens > max_tokens:
+            yield emit()
+            tail: List[_Unit] = []
+            tail_tokens = 0
+            for u in reversed(buf):
+                if u.heading or tail_tokens + u.tokens > overlap_tokens:
+                    break
+                tail.append(u)
+                tail_tokens += u.tokens
+            if tail_tokens + unit.tokens > max_tokens:
+                tail, tail_tokens = [], 0
+            buf = tail[::-1]
+            buf_tokens = tail_tokens
+            fresh = 0
+        elif not fresh and buf_tokens + unit.tokens > max_tokens:
+            # only headings / overlap so far and this unit doesn't fit with them
+            buf = [u for u in buf if u.heading]
+            buf_tokens = sum(u.tokens for u in buf)
+            if buf_tokens + unit.tokens > max_tokens:
+                buf, buf_tokens = [], 0
+
+        buf.append(unit)
+        buf_tokens += unit.tokens
+        fresh += 1
+
+    # trailing headings (or a document that is only headings) still count
+    if fresh or any(u.heading for u in buf):
+        yield emit()
+
 
-    flush()
-    return chunks
+def iter_configured_chunks(
+    pages: Iterable[PageText], max_chars: int = 5000
+) -> Iterator[ChunkSpec]:
+    """Chunker selected by settings.CHUNKER ("token" or legacy "chars")."""
+    if settings.CHUNKER == "chars":
+        return iter_chunks(pages, max_chars=max_chars)
+    return iter_token_chunks(
+        pages,
+        max_tokens=settings.CHUNK_MAX_TOKENS,
+        overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+    )
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from core.config import settings
+from core.db import SessionLocal
+from core.metrics import registry
+from models.Models import Conversation, Message
+from services.ollama_client import OllamaClient
+from services.prompt_builder import _truncate_to_tokens, pick_num_ctx
+from services.tokenizer import count_tokens
+
+summaries_total = registry.counter(
+    "conversation_summaries_total", "Rolling summary updates by outcome"
+)
+summary_seconds = registry.histogram(
+    "conversation_summary_seconds", "Time to fold new messages into a summary"
+)
+summary_lag_messages = registry.histogram(
+    "conversation_summary_lag_messages",
+    "Messages older than the recent window not yet in the summary, per chat turn",
+    buckets=(0, 1, 2, 4, 8, 16, 32),
+)
+summary_age_seconds = registry.histogram(
+    "conversation_summary_age_seconds",
+    "Age of the summary used in a chat turn",
+)
+summary_tokens_saved = registry.counter(
+    "conversation_summary_tokens_saved_total",
+    "Prompt tokens saved by sending the summary instead of the messages it covers",
+)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an "
+    "assistant that answers from company documents.\n"
+    "Merge the NEW MESSAGES into the CURRENT SUMMARY. Keep facts, decisions, "
+    "open questions, names, numbers and which documents were discussed. "
+    "Drop pleasantries and citation markers. Write plain prose, at most "
+    "{max_tokens} tokens. Reply with the summary only."
+)
+
+
+class _Msg(NamedTuple):
+    message_id: int
+    role: str
+    content: str
+
+
+class ConversationSummarizer:
+    """
+    Keeps conversations.summary_text rolling in the background. After each
+    assistant message ChatService calls schedule(); a single loop folds every
+    message older than the last CHAT_SUMMARY_RECENT_MESSAGES into the
+    summary, so the prompt can send summary + recent turns instead of the
+    raw history. Schedules for the same conversation coalesce.
+    """
+
+    def __init__(self, ollama: Optional[OllamaClient] = None):
+        self.ollama = ollama or OllamaClient(settings.OLLAMA_BASE_URL)
+        self._queue: asyncio.Queue[int] | None = None
+        self._pending: Set[int] = set()
+        self._task: asyncio.Task | None = None
+
+    def _ensure_started(self) -> asyncio.Queue:
+        # started lazily so the queue binds to the running event loop
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._pending.clear()
+            self._task = asyncio.create_task(self._run())
+        assert self._queue is not None
+        return self._queue
+
+    def schedule(self, conversation_id: int) -> None:
+        queue = self._ensure_started()
+        if conversation_id in self._pending:
+            return
+        self._pending.add(conversation_id)
+        queue.put_nowait(conversation_id)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            conversation_id = await queue.get()
+            self._pending.discard(conversation_id)
+            t0 = time.perf_counter()
+            try:
+                updated = await self.summarize(conversation_id)
+                summaries_total.inc(outcome="updated" if updated else "skipped")
+            except Exception as e:
+                summaries_total.inc(outcome="failed")
+                print(f"summary failed for conversation {conversation_id}: {e}")
+            summary_seconds.observe(time.perf_counter() - t0)
+
+    async def summarize(self, conversation_id: int) -> bool:
+        # read what's needed and give the connection back before any LLM call;
+        # a fold can take minutes
+        db = SessionLocal()
+        try:
+            convo = db.get(Conversation, conversation_id)
+            if not convo:
+                return False
+            current = convo.summary_text
+
+            q = db.query(Message.message_id, Message.role, Message.content).filter(
+                Message.conversation_id == conversation_id
+            )
+            if convo.summary_message_id:
+                q = q.filter(Message.message_id > convo.summary_message_id)
+            unsummarized = [
+                _Msg(m.message_id, m.role, m.content or "")
+                for m in q.order_by(Message.message_id.asc()).all()
+            ]
+        finally:
+            db.close()
+
+        keep = max(0, settings.CHAT_SUMMARY_RECENT_MESSAGES)
+        to_fold: List[_Msg] = (
+            unsummarized[: len(unsummarized) - keep] if keep else unsummarized
+        )
+        if not to_fold:
+            return False
+
+        # a long conversation's first summary is folded in slices that
+        # each fit CHAT_MAX_CTX, oldest first
+        updated = False
+        while to_fold:
+            lines, source_tokens, last_id, to_fold = self._next_slice(
+                to_fold, current
+            )
+            current = await self._fold(
+                conversation_id, current, lines, source_tokens, last_id
+            )
+            if current is None:
+                break
+            updated = True
+        return updated
+
+    def _next_slice(
+        self, to_fold: List[_Msg], current: Optional[str]
+    ) -> Tuple[List[str], int, int, List[_Msg]]:
+        """
+        Transcript lines for the oldest messages that fit the prompt budget
+        (at least one, truncated if it alone is too long), their source
+        token count, the last message id covered and the remaining messages.
+        """
+        overhead = count_tokens(SUMMARY_PROMPT) + count_tokens(current or "") + 64
+        budget = max(
+            256, settings.CHAT_MAX_CTX - settings.SUMMARY_MAX_TOKENS * 2 - overhead
+        )
+        lines: List[str] = []
+        source_tokens = 0
+        used = 0
+        taken = 0
+        for m in to_fold:
+            line = f"{m.role.upper()}: {m.content}"
+            n = count_tokens(line)
+            if used + n > budget:
+                if not lines:
+                    line = _truncate_to_tokens(line, budget, n)
+                    lines.append(line)
+                    source_tokens += n
+                    taken += 1
+                break
+            lines.append(line)
+            source_tokens += n
+            used += n
+            taken += 1
+        return lines, source_tokens, to_fold[taken - 1].message_id, to_fold[taken:]
+
+    async def _fold(
+        self,
+        conversation_id: int,
+        current: Optional[str],
+        lines: List[str],
+        source_tokens: int,
+        last_id: int,
+    ) -> Optional[str]:
+        """
+        Merges `lines` into `current` and stores the result; returns the new
+        summary, or None if the model gave nothing or the stored summary has
+        already moved past `last_id`.
+        """
+        messages = [
+            {
+                "role": "system",
+                "content": SUMMARY_PROMPT.format(max_tokens=settings.SUMMARY_MAX_TOKENS),
+            },
+            {
+                "role": "user",
+                "content": (
+                    f"CURRENT SUMMARY:\n{current or '(none)'}\n\n"
+                    "NEW MESSAGES:\n" + "\n\n".join(lines)
+                ),
+            },
+        ]
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+        summary = await self.ollama.chat(
+            model=settings.SUMMARY_MODEL,
+            messages=messages,
+            # snapped like chat turns, so a shared model isn't reloaded at an
+            # arbitrary size
+            num_ctx=pick_num_ctx(
+                prompt_tokens + settings.SUMMARY_MAX_TOKENS * 2, settings.CHAT_MAX_CTX
+            ),
+            options={"think": False, "thinking": False, "temperature": 0.1},
+        )
+        summary = (summary or "").strip()
+        if not summary:
+            return None
+
+        db = SessionLocal()
+        try:
+            # the chat turn may have moved on meanwhile; only ever move forward
+            convo = db.get(Conversation, conversation_id)
+            if not convo:
+                return None
+            if convo.summary_message_id and convo.summary_message_id >= last_id:
+                return None
+
+            convo.summary_text = summary
+            convo.summary_message_id = last_id
+            convo.summary_tokens = count_tokens(summary)
+            convo.summary_source_tokens = (
+                convo.summary_source_tokens or 0
+            ) + source_tokens
+            convo.summary_updated_at = datetime.utcnow()
+            db.commit()
+        finally:
+            db.close()
+        return summary
+
+summarizer = ConversationSummarizer()
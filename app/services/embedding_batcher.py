@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.metrics import registry
+from services.embedding_service import EmbeddingService
+
+if TYPE_CHECKING:
+    from services.embedding_models import EmbeddingModelSpec
+
+embed_batch_size = registry.histogram(
+    "embed_batch_size",
+    "Texts per embedding request sent by the shared batcher",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+
+class EmbeddingBatcher:
+    """
+    Shared embedding front for the worker. Concurrent jobs submit texts; a
+    single dispatcher loop packs them into batches of up to max_batch_size,
+    waiting at most max_wait_ms for a batch to fill, and routes each vector
+    back to the caller that submitted it.
+
+    Exposes the same embed_text / embed_texts surface as EmbeddingService,
+    so IngestPipeline can take either. Texts for different models share the
+    wait window but go out as one request per model.
+    """
+
+    def __init__(
+        self,
+        embedding: EmbeddingService,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ):
+        self.embedding = embedding
+        self.max_batch_size = max(1, max_batch_size or settings.EMBED_BATCH_MAX_SIZE)
+        self.max_wait = (
+            max_wait_ms if max_wait_ms is not None else settings.EMBED_BATCH_MAX_WAIT_MS
+        ) / 1000.0
+        self._queue: asyncio.Queue[
+            Tuple[Optional["EmbeddingModelSpec"], str, asyncio.Future]
+        ] | None = None
+        self._task: asyncio.Task | None = None
+
+    def _ensure_started(self) -> asyncio.Queue:
+        # started lazily so the queue binds to the running event loop
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        assert self._queue is not None
+        return self._queue
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._queue:
+            while not self._queue.empty():
+                _, _, fut = self._queue.get_nowait()
+                if not fut.done():
+                    fut.set_exception(RuntimeError("Embedding batcher stopped"))
+
+    async def embed_text(
+        self, text: str, spec: Optional["EmbeddingModelSpec"] = None
+    ) -> List[float]:
+        return (await self.embed_texts([text], spec))[0]
+
+    async def embed_texts(
+        self, texts: List[str], spec: Optional["EmbeddingModelSpec"] = None
+    ) -> List[List[float]]:
+        if not texts:
+            return []
+        queue = self._ensure_started()
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        for t, fut in zip(texts, futures):
+            queue.put_nowait((spec, t, fut))
+        return list(await asyncio.gather(*futures))
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # callers that gave up (e.g. job cancelled) don't need a vector
+            groups: Dict[Optional[str], list] = {}
+            for spec, t, fut in batch:
+                if not fut.done():
+                    groups.setdefault(spec.model_key if spec else None, []).append(
+                        (spec, t, fut)
+                    )
+            if not groups:
+                continue
+
+            for live in groups.values():
+                embed_batch_size.observe(len(live))
+                try:
+                    vecs = await self.embedding.embed_texts(
+                        [t for _, t, _ in live], live[0][0]
+                    )
+                except Exception as e:
+                    for _, _, fut in live:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+
+                for (_, _, fut), vec in zip(live, vecs):
+                    if not fut.done():
+                        fut.set_result(vec)
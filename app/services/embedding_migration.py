@@ -0,0 +1,604 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, select, text, update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.db import SessionLocal, bind_num_list
+from core.metrics import registry
+from models.Models import (
+    ChunkEmbedding,
+    DocumentChunk,
+    EmbeddingModel,
+    TenantEmbeddingModel,
+)
+from services import vector_codec
+from services.acl_service import Visibility
+from services.embedding_models import EmbeddingModelSpec, embedding_registry
+from services.embedding_service import EmbeddingService
+from services.ingest_pipeline import IngestPipeline
+from services.ollama_client import OllamaClient
+from services.retrieval_service import RetrievalService
+
+# Re-embedding a tenant with a new model, without downtime:
+# 1. register_model + start_migration: the tenant keeps reading with its
+#    active model; ingestion writes both models (TenantModels.write_specs)
+# 2. EmbeddingBackfiller embeds existing chunks with the target model in
+#    the background, throttled; ShadowReader compares a sample of chat
+#    queries between the two models
+# 3. cutover: one row update switches the active model once every chunk has
+#    a target embedding
+# 4. gc: after EMBEDDING_GC_GRACE_SECONDS, drops the previous model's vectors
+
+backfill_chunks = registry.counter(
+    "embedding_backfill_chunks_total", "Chunks re-embedded by the backfill, per model"
+)
+backfill_progress = registry.gauge(
+    "embedding_backfill_chunks", "Chunks backfilled in the current migration, per tenant"
+)
+backfill_batch_seconds = registry.histogram(
+    "embedding_backfill_batch_seconds", "Time to embed and store one backfill batch"
+)
+shadow_total = registry.counter(
+    "embedding_shadow_total", "Shadow reads by outcome (compared/dropped/failed)"
+)
+shadow_overlap = registry.histogram(
+    "embedding_shadow_overlap",
+    "Share of the active model's vector hits the target model also returns",
+    buckets=(0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+shadow_seconds = registry.histogram(
+    "embedding_shadow_seconds", "Target model embed + search time per shadow read"
+)
+
+MISSING_SQL = text(
+    """
+SELECT COUNT(*)
+FROM document_chunks c
+WHERE c.tenant_id = :tenant_id
+  AND NOT EXISTS (
+    SELECT 1 FROM chunk_embeddings e
+    WHERE e.chunk_id = c.chunk_id AND e.embedding_model_id = :embedding_model_id
+  )
+"""
+)
+
+# candidates oldest-updated first, so tenants take turns batch by batch
+BACKFILL_CANDIDATES_SQL = text(
+    """
+SELECT tenant_id
+FROM tenant_embedding_models
+WHERE migration_status = 'backfilling'
+  AND (backfill_lease_until IS NULL OR backfill_lease_until < SYSTIMESTAMP)
+ORDER BY updated_at NULLS FIRST
+"""
+)
+
+CLAIM_BACKFILL_SQL = text(
+    """
+UPDATE tenant_embedding_models
+SET backfill_lease_until = SYSTIMESTAMP + NUMTODSINTERVAL(:lease_seconds, 'SECOND')
+WHERE tenant_id = :tenant_id
+  AND migration_status = 'backfilling'
+  AND (backfill_lease_until IS NULL OR backfill_lease_until < SYSTIMESTAMP)
+"""
+)
+
+# chunks of a claimed batch that still exist and still lack the target
+# embedding when the vectors are written (ingestion may have added them)
+STILL_MISSING_SQL = text(
+    """
+SELECT c.chunk_id
+FROM document_chunks c
+WHERE c.chunk_id IN (SELECT ids.COLUMN_VALUE FROM TABLE(:chunk_ids) ids)
+  AND NOT EXISTS (
+    SELECT 1 FROM chunk_embeddings e
+    WHERE e.chunk_id = c.chunk_id AND e.embedding_model_id = :embedding_model_id
+  )
+"""
+)
+
+
+def register_model(
+    db: Session,
+    model_key: str,
+    provider_model: str,
+    dim: int,
+    search_dim: int = 0,
+    storage_format: str = "float32",
+) -> EmbeddingModel:
+    """Adds or updates a registry entry (search_dim 0 = dim)."""
+    search_dim = min(search_dim or dim, dim)
+    storage_format = vector_codec.check_format(storage_format)
+    if storage_format == "binary" and search_dim % 8:
+        raise ValueError("binary vectors need a search dim divisible by 8")
+
+    row = db.get(EmbeddingModel, model_key)
+    if row is None:
+        row = EmbeddingModel(model_key=model_key)
+        db.add(row)
+    row.provider_model = provider_model
+    row.dim = dim
+    row.search_dim = search_dim
+    row.storage_format = storage_format
+    row.status = "available"
+    db.commit()
+    embedding_registry.invalidate()
+    return row
+
+
+def missing_count(db: Session, tenant_id: int, model_key: str) -> int:
+    """Chunks of the tenant without an embedding from `model_key`."""
+    return int(
+        db.execute(
+            MISSING_SQL, {"tenant_id": tenant_id, "embedding_model_id": model_key}
+        ).scalar()
+        or 0
+    )
+
+
+def _locked_state(db: Session, tenant_id: int) -> Optional[TenantEmbeddingModel]:
+    return db.execute(
+        select(TenantEmbeddingModel)
+        .where(TenantEmbeddingModel.tenant_id == tenant_id)
+        .with_for_update()
+    ).scalar_one_or_none()
+
+
+def start_migration(
+    db: Session, tenant_id: int, target_key: str, shadow: bool = True
+) -> TenantEmbeddingModel:
+    model = db.get(EmbeddingModel, target_key)
+    if model is None or model.status != "available":
+        raise ValueError(f"Embedding model {target_key!r} is not registered")
+
+    state = _locked_state(db, tenant_id)
+    if state is None:
+        state = TenantEmbeddingModel(
+            tenant_id=tenant_id, active_model=settings.EMBEDDING_MODEL
+        )
+        db.add(state)
+    if state.active_model == target_key:
+        db.rollback()
+        raise ValueError(f"{target_key!r} is already the active model")
+    if state.target_model and state.target_model != target_key:
+        db.rollback()
+        raise ValueError(
+            f"Migration to {state.target_model!r} in progress; abort it first"
+        )
+
+    state.target_model = target_key
+    state.migration_status = "backfilling"
+    state.backfill_after_chunk_id = 0
+    state.backfilled_chunks = 0
+    state.shadow_reads = shadow
+    state.updated_at = datetime.utcnow()
+    db.commit()
+    embedding_registry.invalidate(tenant_id)
+    return state
+
+
+def set_paused(db: Session, tenant_id: int, paused: bool) -> TenantEmbeddingModel:
+    """A paused migration stops backfilling, dual writes and shadow reads."""
+    state = _locked_state(db, tenant_id)
+    if state is None or not state.target_model:
+        db.rollback()
+        raise ValueError("No migration in progress")
+    if paused:
+        state.migration_status = "paused"
+    else:
+        # resume from the cursor; chunks added meanwhile are caught by the
+        # pass that rechecks what is missing
+        state.migration_status = "backfilling"
+    state.updated_at = datetime.utcnow()
+    db.commit()
+    embedding_registry.invalidate(tenant_id)
+    return state
+
+
+def abort_migration(db: Session, tenant_id: int) -> TenantEmbeddingModel:
+    """Drops the target; its vectors are removed by the next gc."""
+    state = _locked_state(db, tenant_id)
+    if state is None or not state.target_model:
+        db.rollback()
+        raise ValueError("No migration in progress")
+    state.target_model = None
+    state.migration_status = None
+    state.updated_at = datetime.utcnow()
+    db.commit()
+    embedding_registry.invalidate(tenant_id)
+    return state
+
+
+def cutover(db: Session, tenant_id: int) -> TenantEmbeddingModel:
+    """
+    Makes the target the tenant's active model. Refused while any chunk
+    lacks a target embedding; a backfill batch still embedding finds the
+    migration gone when it re-locks the row and drops its vectors. The
+    previous model's vectors stay until gc, so processes still serving the
+    cached old model (up to EMBEDDING_REGISTRY_TTL_SECONDS) keep working.
+    """
+    state = db.get(TenantEmbeddingModel, tenant_id)
+    if state is None or not state.target_model:
+        raise ValueError("No migration in progress")
+    target = embedding_registry.get(db, state.target_model)
+    # centroids first (commits per document), so hierarchical retrieval
+    # has them from the first query on the new model
+    IngestPipeline().backfill_document_embeddings(db, tenant_id=tenant_id, spec=target)
+
+    state = _locked_state(db, tenant_id)
+    if state is None or state.target_model != target.model_key:
+        db.rollback()
+        raise ValueError("Migration changed concurrently; retry")
+    missing = missing_count(db, tenant_id, target.model_key)
+    if missing:
+        db.rollback()
+        raise ValueError(f"{missing} chunks still lack {target.model_key!r} embeddings")
+
+    state.previous_model = state.active_model
+    state.active_model = target.model_key
+    state.target_model = None
+    state.migration_status = None
+    state.cutover_at = datetime.utcnow()
+    state.updated_at = state.cutover_at
+    db.commit()
+    embedding_registry.invalidate(tenant_id)
+    return state
+
+
+def gc(db: Session, tenant_id: int, force: bool = False) -> int:
+    """
+    Deletes the tenant's chunk and document embeddings from models other
+    than the active and target ones, in committed batches of
+    EMBEDDING_GC_BATCH. Returns rows deleted.
+    """
+    state = db.get(TenantEmbeddingModel, tenant_id)
+    if state is None:
+        return 0
+    grace = timedelta(seconds=settings.EMBEDDING_GC_GRACE_SECONDS)
+    if not force and state.cutover_at and datetime.utcnow() - state.cutover_at < grace:
+        raise ValueError("Previous model still within EMBEDDING_GC_GRACE_SECONDS")
+
+    params = {
+        "tenant_id": tenant_id,
+        "active": state.active_model,
+        # NOT IN with a NULL would match nothing
+        "target": state.target_model or state.active_model,
+        "n": max(1, settings.EMBEDDING_GC_BATCH),
+    }
+    deleted = 0
+    for table in ("chunk_embeddings", "document_embeddings"):
+        sql = text(
+            f"""
+            DELETE FROM {table}
+            WHERE tenant_id = :tenant_id
+              AND embedding_model_id NOT IN (:active, :target)
+              AND ROWNUM <= :n
+            """
+        )
+        while True:
+            n = db.execute(sql, params).rowcount or 0
+            db.commit()
+            deleted += n
+            if n < params["n"]:
+                break
+
+    state = db.get(TenantEmbeddingModel, tenant_id)
+    state.previous_model = None
+    db.commit()
+    return deleted
+
+
+class EmbeddingBackfiller:
+    """
+    Background re-embedding. Each batch claims one backfilling tenant with a
+    short transaction that sets backfill_lease_until (so backfillers in
+    several processes split the tenants), reads the next
+    EMBEDDING_BACKFILL_BATCH chunks after the row's cursor that lack a
+    target embedding and commits. Embedding runs with no transaction or
+    connection held; a second short transaction re-locks the row, checks
+    the migration is still backfilling the same target, writes the vectors
+    and the advanced cursor and releases the lease. Pause, abort and cutover
+    therefore never wait on Ollama. Throughput is capped at
+    EMBEDDING_BACKFILL_CHUNKS_PER_SECOND per process so backfills don't
+    starve ingestion and chat of the embedding model.
+    """
+
+    def __init__(self, poll_seconds: Optional[float] = None):
+        self.poll_seconds = poll_seconds or settings.EMBEDDING_BACKFILL_POLL_SECONDS
+        self._stop = asyncio.Event()
+        self.pipeline = IngestPipeline()
+        self.embedding = EmbeddingService(OllamaClient(settings.OLLAMA_BASE_URL))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def run_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                n = await self.run_batch()
+            except Exception as e:
+                print("EMBEDDING BACKFILL FAILED:", repr(e))
+                n = None
+            if n is None:
+                delay = self.poll_seconds
+            else:
+                rate = max(settings.EMBEDDING_BACKFILL_CHUNKS_PER_SECOND, 1e-3)
+                delay = n / rate
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self, db: Session) -> Optional[TenantEmbeddingModel]:
+        """Leases the first backfilling tenant no one else holds, committed."""
+        for (tenant_id,) in db.execute(BACKFILL_CANDIDATES_SQL).all():
+            res = db.execute(
+                CLAIM_BACKFILL_SQL,
+                {
+                    "tenant_id": tenant_id,
+                    "lease_seconds": max(1, settings.EMBEDDING_BACKFILL_LEASE_SECONDS),
+                },
+            )
+            db.commit()
+            if res.rowcount:
+                return db.get(TenantEmbeddingModel, int(tenant_id))
+        return None
+
+    def _release(self, db: Session, tenant_id: int) -> None:
+        db.execute(
+            update(TenantEmbeddingModel)
+            .where(TenantEmbeddingModel.tenant_id == tenant_id)
+            .values(backfill_lease_until=None)
+        )
+        db.commit()
+
+    async def run_batch(self) -> Optional[int]:
+        """Chunks embedded, or None when no tenant is backfilling."""
+        db: Session = SessionLocal()
+        try:
+            state = self._claim(db)
+            if state is None:
+                return None
+            tenant_id = int(state.tenant_id)
+            try:
+                target = embedding_registry.get(db, state.target_model)
+                chunks = [
+                    (int(chunk_id), chunk_text)
+                    for chunk_id, chunk_text in db.query(
+                        DocumentChunk.chunk_id, DocumentChunk.chunk_text
+                    )
+                    .outerjoin(
+                        ChunkEmbedding,
+                        and_(
+                            ChunkEmbedding.chunk_id == DocumentChunk.chunk_id,
+                            ChunkEmbedding.embedding_model_id == target.model_key,
+                        ),
+                    )
+                    .filter(
+                        DocumentChunk.tenant_id == tenant_id,
+                        DocumentChunk.chunk_id > state.backfill_after_chunk_id,
+                        ChunkEmbedding.chunk_id.is_(None),
+                    )
+                    .order_by(DocumentChunk.chunk_id.asc())
+                    .limit(max(1, settings.EMBEDDING_BACKFILL_BATCH))
+                    .all()
+                ]
+                db.commit()
+
+                if chunks:
+                    return await self._backfill_chunks(db, tenant_id, target, chunks)
+                return await self._finish_pass(db, tenant_id, target)
+            finally:
+                db.rollback()
+                self._release(db, tenant_id)
+        finally:
+            db.close()
+
+    async def _backfill_chunks(
+        self,
+        db: Session,
+        tenant_id: int,
+        target: EmbeddingModelSpec,
+        chunks: List[Tuple[int, str]],
+    ) -> int:
+        t0 = time.perf_counter()
+        # give the connection back to the pool while Ollama works
+        db.close()
+        vecs: List[List[float]] = []
+        step = max(1, settings.INGEST_COMMIT_BATCH)
+        for i in range(0, len(chunks), step):
+            vecs.extend(
+                await self.embedding.embed_texts(
+                    [chunk_text for _, chunk_text in chunks[i : i + step]], target
+                )
+            )
+
+        state = _locked_state(db, tenant_id)
+        if (
+            state is None
+            or state.migration_status != "backfilling"
+            or state.target_model != target.model_key
+        ):
+            # paused, aborted or cut over meanwhile; drop the vectors
+            db.rollback()
+            return 0
+        missing = {
+            int(r.chunk_id)
+            for r in db.execute(
+                STILL_MISSING_SQL,
+                {
+                    "chunk_ids": bind_num_list(db, [c for c, _ in chunks]),
+                    "embedding_model_id": target.model_key,
+                },
+            )
+        }
+        keep = [(c, v) for (c, _), v in zip(chunks, vecs) if c in missing]
+        n = self.pipeline.persist_embeddings(
+            db, tenant_id, [c for c, _ in keep], [v for _, v in keep], target
+        )
+        state.backfill_after_chunk_id = max(
+            int(state.backfill_after_chunk_id or 0), chunks[-1][0]
+        )
+        state.backfilled_chunks = int(state.backfilled_chunks or 0) + n
+        state.updated_at = datetime.utcnow()
+        db.commit()
+        backfill_chunks.inc(n, model=target.model_key)
+        backfill_progress.set(state.backfilled_chunks, tenant_id=tenant_id)
+        backfill_batch_seconds.observe(time.perf_counter() - t0)
+        return n
+
+    async def _finish_pass(
+        self, db: Session, tenant_id: int, target: EmbeddingModelSpec
+    ) -> int:
+        # end of a pass: chunks can land behind the cursor while it runs
+        # (documents that started embedding before the migration)
+        if missing_count(db, tenant_id, target.model_key):
+            db.execute(
+                update(TenantEmbeddingModel)
+                .where(TenantEmbeddingModel.tenant_id == tenant_id)
+                .values(backfill_after_chunk_id=0, updated_at=func.systimestamp())
+            )
+            db.commit()
+            return 0
+        db.commit()
+
+        await asyncio.to_thread(
+            self.pipeline.backfill_document_embeddings,
+            db,
+            tenant_id=tenant_id,
+            spec=target,
+        )
+        db.execute(
+            update(TenantEmbeddingModel)
+            .where(
+                TenantEmbeddingModel.tenant_id == tenant_id,
+                TenantEmbeddingModel.target_model == target.model_key,
+                TenantEmbeddingModel.migration_status == "backfilling",
+            )
+            .values(migration_status="ready", updated_at=func.systimestamp())
+        )
+        db.commit()
+        embedding_registry.invalidate(tenant_id)
+        print(f"embedding backfill of tenant {tenant_id} to {target.model_key} ready")
+        return 0
+
+
+@dataclass
+class _ShadowRead:
+    tenant_id: int
+    query: str
+    doc_ids: Optional[List[int]]
+    k: int
+    visibility: Optional[Visibility]
+    spec: EmbeddingModelSpec
+    active_chunk_ids: Tuple[int, ...]
+
+
+class ShadowReader:
+    """
+    Replays sampled chat queries against a migration's target model off the
+    request path and records how many of the active model's vector hits it
+    also finds (embedding_shadow_overlap). At most
+    EMBEDDING_SHADOW_MAX_INFLIGHT reads wait; more are dropped.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue[_ShadowRead] | None = None
+        self._task: asyncio.Task | None = None
+        self.retrieval = RetrievalService()
+        self.embedding = EmbeddingService(OllamaClient(settings.OLLAMA_BASE_URL))
+
+    def _ensure_started(self) -> asyncio.Queue:
+        # started lazily so the queue binds to the running event loop
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(
+                maxsize=max(1, settings.EMBEDDING_SHADOW_MAX_INFLIGHT)
+            )
+            self._task = asyncio.create_task(self._run())
+        assert self._queue is not None
+        return self._queue
+
+    def schedule(
+        self,
+        tenant_id: int,
+        query: str,
+        doc_ids: Optional[List[int]],
+        k: int,
+        visibility: Optional[Visibility],
+        spec: EmbeddingModelSpec,
+        active_hits: Sequence[dict],
+    ) -> None:
+        queue = self._ensure_started()
+        item = _ShadowRead(
+            tenant_id=tenant_id,
+            query=query,
+            doc_ids=doc_ids,
+            k=k,
+            visibility=visibility,
+            spec=spec,
+            active_chunk_ids=tuple(
+                int(h["chunk_id"]) for h in active_hits if h.get("vector_distance") is not None
+            ),
+        )
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            shadow_total.inc(outcome="dropped")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            t0 = time.perf_counter()
+            try:
+                overlap = await self.compare(item)
+                shadow_overlap.observe(overlap, model=item.spec.model_key)
+                shadow_total.inc(outcome="compared")
+            except Exception as e:
+                shadow_total.inc(outcome="failed")
+                print(f"shadow read for tenant {item.tenant_id} failed: {e}")
+            shadow_seconds.observe(time.perf_counter() - t0)
+
+    async def compare(self, item: _ShadowRead) -> float:
+        vec = await self.embedding.embed_text(item.query, item.spec)
+        hits = await asyncio.to_thread(self._search, item, vec)
+        expected = set(item.active_chunk_ids)
+        if not expected:
+            return 1.0
+        got = {int(h["chunk_id"]) for h in hits}
+        return len(got & expected) / len(expected)
+
+    def _search(self, item: _ShadowRead, vec: List[float]) -> List[dict]:
+        db: Session = SessionLocal()
+        try:
+            return self.retrieval.vector_search(
+                db,
+                item.tenant_id,
+                vec,
+                item.doc_ids,
+                item.k,
+                spec=item.spec,
+                visibility=item.visibility,
+            )
+        finally:
+            db.close()
+
+
+shadow_reader = ShadowReader()
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.Models import EmbeddingModel, TenantEmbeddingModel
+from services import vector_codec
+
+# Embedding model registry. Every stored vector is keyed by its model
+# (chunk_embeddings / document_embeddings.embedding_model_id = model_key);
+# each tenant reads with its active model while a target model may be
+# backfilling next to it (services/embedding_migration.py).
+
+
+@dataclass(frozen=True)
+class EmbeddingModelSpec:
+    model_key: str
+    provider_model: str  # Ollama model name
+    dim: int  # full output dims
+    search_dim: int  # Matryoshka truncation used for search
+    storage_format: str  # vector_codec.FORMATS
+
+    @property
+    def is_compact(self) -> bool:
+        return vector_codec.is_compact(self.storage_format, self.search_dim, self.dim)
+
+
+@dataclass(frozen=True)
+class TenantModels:
+    active: EmbeddingModelSpec
+    target: Optional[EmbeddingModelSpec] = None
+    migration_status: Optional[str] = None
+    shadow_reads: bool = False
+
+    @property
+    def write_specs(self) -> Tuple[EmbeddingModelSpec, ...]:
+        """Models new chunks are embedded with (dual write during migration)."""
+        if self.target is not None and self.target.model_key != self.active.model_key:
+            return (self.active, self.target)
+        return (self.active,)
+
+
+def default_spec() -> EmbeddingModelSpec:
+    """The Settings model: used when the registry has no entry for it."""
+    dim = settings.EMBEDDING_DIM
+    return EmbeddingModelSpec(
+        model_key=settings.EMBEDDING_MODEL,
+        provider_model=settings.EMBEDDING_MODEL,
+        dim=dim,
+        search_dim=min(settings.EMBEDDING_SEARCH_DIM or dim, dim),
+        storage_format=vector_codec.check_format(settings.EMBEDDING_STORAGE_FORMAT),
+    )
+
+
+def _spec_from_row(row: EmbeddingModel) -> EmbeddingModelSpec:
+    return EmbeddingModelSpec(
+        model_key=row.model_key,
+        provider_model=row.provider_model,
+        dim=int(row.dim),
+        search_dim=min(int(row.search_dim), int(row.dim)),
+        storage_format=vector_codec.check_format(row.storage_format),
+    )
+
+
+class EmbeddingModelRegistry:
+    """
+    Resolves model specs and per-tenant model state, cached per process for
+    EMBEDDING_REGISTRY_TTL_SECONDS. A cutover is one committed row update;
+    other processes follow within the TTL and the previous model's vectors
+    stay until GC, so reads never hit a missing model.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._specs: Dict[str, Tuple[float, EmbeddingModelSpec]] = {}
+        self._tenants: Dict[int, Tuple[float, TenantModels]] = {}
+
+    def get(self, db: Session, model_key: str) -> EmbeddingModelSpec:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._specs.get(model_key)
+            if hit and hit[0] > now:
+                return hit[1]
+
+        row = db.get(EmbeddingModel, model_key)
+        if row is not None:
+            spec = _spec_from_row(row)
+        elif model_key == settings.EMBEDDING_MODEL:
+            spec = default_spec()
+        else:
+            raise ValueError(f"Unknown embedding model {model_key!r}")
+
+        with self._lock:
+            self._specs[model_key] = (now + self.ttl_seconds, spec)
+        return spec
+
+    def for_tenant(self, db: Session, tenant_id: int) -> TenantModels:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._tenants.get(tenant_id)
+            if hit and hit[0] > now:
+                return hit[1]
+
+        state = db.get(TenantEmbeddingModel, tenant_id)
+        if state is None:
+            models = TenantModels(active=self.get(db, settings.EMBEDDING_MODEL))
+        else:
+            target = (
+                self.get(db, state.target_model)
+                if state.target_model and state.migration_status != "paused"
+                else None
+            )
+            models = TenantModels(
+                active=self.get(db, state.active_model),
+                target=target,
+                migration_status=state.migration_status,
+                shadow_reads=bool(state.shadow_reads),
+            )
+
+        with self._lock:
+            self._tenants[tenant_id] = (now + self.ttl_seconds, models)
+        return models
+
+    def invalidate(self, tenant_id: Optional[int] = None) -> None:
+        with self._lock:
+            if tenant_id is None:
+                self._specs.clear()
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant_id, None)
+
+
+embedding_registry = EmbeddingModelRegistry(
+    ttl_seconds=settings.EMBEDDING_REGISTRY_TTL_SECONDS
+)
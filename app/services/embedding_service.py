@@ -1,18 +1,49 @@
 from __future__ import annotations
 
-from typing import List
+from typing import TYPE_CHECKING, List, Optional
 from core.config import settings
 from services.ollama_client import OllamaClient
 
+if TYPE_CHECKING:
+    from services.embedding_models import EmbeddingModelSpec
+
 
 class EmbeddingService:
+    """
+    Embeds with the given registry model (services/embedding_models.py),
+    or the Settings model when no spec is passed.
+    """
+
     def __init__(self, ollama: OllamaClient):
         self.ollama = ollama
 
-    async def embed_text(self, text: str) -> List[float]:
-        vec = await self.ollama.embed(settings.EMBEDDING_MODEL, text)
-        if len(vec) != settings.EMBEDDING_DIM:
-            raise ValueError(
-                f"Embedding dim mismatch: got {len(vec)} expected {settings.EMBEDDING_DIM}"
-            )
+    @staticmethod
+    def _model(spec: Optional["EmbeddingModelSpec"]) -> tuple[str, int]:
+        if spec is None:
+            return settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM
+        return spec.provider_model, spec.dim
+
+    async def embed_text(
+        self, text: str, spec: Optional["EmbeddingModelSpec"] = None
+    ) -> List[float]:
+        model, dim = self._model(spec)
+        vec = await self.ollama.embed(model, text)
+        if len(vec) != dim:
+            raise ValueError(f"Embedding dim mismatch: got {len(vec)} expected {dim}")
         return vec
+
+    async def embed_texts(
+        self, texts: List[str], spec: Optional["EmbeddingModelSpec"] = None
+    ) -> List[List[float]]:
+        model, dim = self._model(spec)
+        out: List[List[float]] = []
+        step = max(1, settings.EMBED_BATCH_MAX_SIZE)
+        for i in range(0, len(texts), step):
+            vecs = await self.ollama.embed_batch(model, texts[i : i + step])
+            for vec in vecs:
+                if len(vec) != dim:
+                    raise ValueError(
+                        f"Embedding dim mismatch: got {len(vec)} expected {dim}"
+                    )
+            out.extend(vecs)
+        return out
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import math
+import mmap
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core.config import settings
+
+# Supervised PDF extraction: pypdf runs in spawned child processes with a
+# CPU rlimit, a memory rlimit and a per-page timeout, so a malformed or
+# adversarial PDF costs its own pages, not the worker.
+
+PageResult = Tuple[int, str, Optional[str]]  # (page_index, text, error)
+
+_EXIT_MEMORY = 3
+# spawn + imports + opening the file before the first message
+_STARTUP_GRACE_SECONDS = 10.0
+_DONE = object()
+
+
+class PdfOpenError(Exception):
+    """The PDF could not be opened inside the sandbox at all."""
+
+
+def _apply_limits(mem_bytes: int, cpu_seconds: int) -> None:
+    try:
+        import resource
+    except ImportError:  # non-POSIX dev boxes: run unconfined
+        return
+    # RLIMIT_DATA ignores the read-only mmap of the file itself
+    mem_limit = getattr(resource, "RLIMIT_DATA", resource.RLIMIT_AS)
+    resource.setrlimit(mem_limit, (mem_bytes, mem_bytes))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+
+
+def _sandbox_child(
+    path: str, start: int, mem_bytes: int, cpu_seconds: int, conn: Any
+) -> None:
+    """
+    Child entry point: reports ("num_pages", n), then ("page", i, text, err)
+    for i = start.. until the supervisor kills it or the file ends.
+    """
+    _apply_limits(mem_bytes, cpu_seconds)
+    try:
+        from pypdf import PdfReader  # type: ignore
+        from services.extraction_service import _normalize_text
+
+        with open(path, "rb") as fh, mmap.mmap(
+            fh.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            reader = PdfReader(mm)
+            num_pages = len(reader.pages)
+            conn.send(("num_pages", num_pages))
+            for i in range(start, num_pages):
+                try:
+                    txt = reader.pages[i].extract_text() or ""
+                    err = None
+                except MemoryError:
+                    raise
+                except Exception as e:
+                    txt = ""
+                    err = f"page {i+1}: {e}"
+                conn.send(("page", i, _normalize_text(txt), err))
+        conn.send(("done",))
+    except MemoryError:
+        os._exit(_EXIT_MEMORY)
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+def _exit_reason(code: Optional[int]) -> str:
+    if code == -signal.SIGXCPU:
+        return "CPU time limit exceeded"
+    if code == _EXIT_MEMORY or code == -signal.SIGKILL:
+        return "memory limit exceeded"
+    if code is not None and code < 0:
+        return f"killed by signal {-code}"
+    return f"exited with code {code}"
+
+
+class _RangeSupervisor:
+    """
+    Owns pages [start, end) and the child extracting them. Restarts the
+    child past any page that times out or kills it; results are queued in
+    page order for the consumer.
+    """
+
+    def __init__(self, path: str, start: int, end: Optional[int], deadline: float):
+        self.path = path
+        self.start_page = start
+        self.end = end  # unknown for the first range until the child reports it
+        self.deadline = deadline
+        self.num_pages: Optional[int] = None
+        self.open_error: Optional[str] = None
+        self.known = threading.Event()
+        # the first range learns num_pages from its child; it must not accept
+        # pages until the caller has decided where the range ends
+        self._end_ready = threading.Event()
+        if end is not None:
+            self._end_ready.set()
+        self.results: "queue.Queue[Any]" = queue.Queue()
+        self._cancelled = False
+        self._proc: Any = None
+        self._ctx = multiprocessing.get_context("spawn")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def set_end(self, end: int) -> None:
+        self.end = end
+        self._end_ready.set()
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        self._end_ready.set()
+        self._kill()
+
+    def iter_results(self) -> Iterator[PageResult]:
+        while True:
+            item = self.results.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def _kill(self) -> None:
+        proc = self._proc
+        if proc is not None and proc.is_alive():
+            proc.kill()
+            proc.join(1)
+
+    def _skip_rest(self, cur: int, reason: str) -> None:
+        if self.end is None:
+            self.open_error = reason
+            return
+        if cur >= self.end:
+            return
+        self.results.put((cur, "", f"pages {cur+1}-{self.end}: skipped, {reason}"))
+        for i in range(cur + 1, self.end):
+            self.results.put((i, "", None))
+
+    def _run(self) -> None:
+        cur = self.start_page
+        restarts = 0
+        try:
+            while not self._cancelled:
+                if self.end is not None and cur >= self.end:
+                    return
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    self._skip_rest(cur, "extraction time budget exhausted")
+                    return
+                if restarts > settings.EXTRACT_MAX_RESTARTS:
+                    self._skip_rest(cur, "too many extraction failures")
+                    return
+
+                cur, failure = self._run_child(cur, int(math.ceil(remaining)))
+                if failure is None:
+                    return
+                if self.end is None:
+                    # never got past opening the file
+                    self.open_error = failure
+                    return
+                if cur < self.end:
+                    self.results.put((cur, "", f"page {cur+1}: {failure}"))
+                    cur += 1
+                restarts += 1
+        finally:
+            self._kill()
+            self.known.set()
+            self.results.put(_DONE)
+
+    def _run_child(self, cur: int, cpu_seconds: int) -> Tuple[int, Optional[str]]:
+        """
+        Runs one child from page `cur`. Returns (next_page, failure) where
+        failure is None when the range completed.
+        """
+        parent_conn, child_conn = self._ctx.Pipe(duplex=False)
+        self._proc = self._ctx.Process(
+            target=_sandbox_child,
+            args=(
+                self.path,
+                cur,
+                settings.EXTRACT_MEMORY_MB * 1024 * 1024,
+                max(1, cpu_seconds),
+                child_conn,
+            ),
+            daemon=True,
+        )
+        self._proc.start()
+        child_conn.close()
+
+        first_message = True
+        try:
+            while not self._cancelled:
+                page_timeout = settings.EXTRACT_PAGE_TIMEOUT_SECONDS
+                if first_message:
+                    page_timeout += _STARTUP_GRACE_SECONDS
+                    first_message = False
+                timeout = min(page_timeout, self.deadline - time.monotonic())
+                if timeout <= 0:
+                    return cur, "timed out (extraction time budget exhausted)"
+                if not parent_conn.poll(timeout):
+                    return cur, f"timed out after {page_timeout}s"
+                try:
+                    msg = parent_conn.recv()
+                except EOFError:
+                    self._proc.join(1)
+                    return cur, _exit_reason(self._proc.exitcode)
+
+                kind = msg[0]
+                if kind == "num_pages":
+                    if self.num_pages is None:
+                        self.num_pages = int(msg[1])
+                        self.known.set()
+                        self._end_ready.wait()
+                elif kind == "page":
+                    _, i, txt, err = msg
+                    if i == cur and cur < (self.end or 0):
+                        self.results.put((i, txt, err))
+                        cur += 1
+                    if cur >= (self.end or 0):
+                        return cur, None
+                elif kind == "done":
+                    return cur, None
+                elif kind == "error":
+                    return cur, str(msg[1])
+            return cur, None
+        finally:
+            self._kill()
+            parent_conn.close()
+
+
+def iter_pdf_pages_sandboxed(
+    path: str, structure: Dict[str, Any]
+) -> Iterator[PageResult]:
+    """
+    Yields (page_index, normalized_text, error) in page order. Pages that
+    time out or crash their child come back empty with an error; once the
+    per-document budget (EXTRACT_DOC_TIMEOUT_SECONDS) is spent the rest are
+    skipped, so callers always get a partial result. Raises PdfOpenError
+    before yielding anything if the file can't be opened.
+    """
+    deadline = time.monotonic() + settings.EXTRACT_DOC_TIMEOUT_SECONDS
+    first = _RangeSupervisor(path, 0, None, deadline)
+    supervisors: List[_RangeSupervisor] = [first]
+    first.start()
+    try:
+        first.known.wait()
+        num_pages = first.num_pages
+        if num_pages is None:
+            raise PdfOpenError(first.open_error or "could not open PDF")
+
+        workers = max(1, settings.PDF_EXTRACT_WORKERS)
+        if num_pages >= settings.PDF_PARALLEL_PAGE_THRESHOLD and workers > 1:
+            # the first child keeps going from page 0 and is stopped at its
+            # range end; the others start at their own offsets
+            span = math.ceil(num_pages / workers)
+            first.set_end(span)
+            for s in range(span, num_pages, span):
+                sup = _RangeSupervisor(path, s, min(s + span, num_pages), deadline)
+                sup.start()
+                supervisors.append(sup)
+            structure["extraction"]["parallel"] = True
+        else:
+            first.set_end(num_pages)
+
+        for sup in supervisors:
+            yield from sup.iter_results()
+    finally:
+        for sup in supervisors:
+            sup.cancel()
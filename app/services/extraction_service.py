@@ -1,9 +1,19 @@
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-import io
+import math
+import mmap
+import multiprocessing
+import os
+import tempfile
+
+from core.config import settings
+from services.extraction_sandbox import PdfOpenError, iter_pdf_pages_sandboxed
+
+_PDF_POOL: Optional[ProcessPoolExecutor] = None
 
 
 @dataclass
@@ -35,156 +45,274 @@ def _is_docx(file_bytes: bytes, mime_type: Optional[str]) -> bool:
     return file_bytes[:2] == b"PK"
 
 
-def extract_text(file_bytes: bytes, mime_type: Optional[str]) -> ExtractResult:
-    if _is_pdf(file_bytes, mime_type):
-        return _extract_pdf_text(file_bytes)
-    if _is_docx(file_bytes, mime_type):
-        # best-effort DOCX; if python-docx not installed or parsing fails, fall back to text
-        try:
-            return _extract_docx_text(file_bytes)
-        except Exception as e:
-            return _extract_plain_text(
-                file_bytes, note_error=f"DOCX extraction failed: {e}"
-            )
-    return _extract_plain_text(file_bytes)
-
-
-def _extract_pdf_text(file_bytes: bytes) -> ExtractResult:
-    structure: Dict[str, Any] = {
+def new_structure(method: str, tool: Optional[str]) -> Dict[str, Any]:
+    return {
         "extraction": {
-            "method": "pdf_text",
-            "tool": None,
+            "method": method,
+            "tool": tool,
             "errors": [],
             "ocr_needed": False,
             "ocr_reason": None,
         },
         "pages": [],
-        "stats": {},
+        "stats": {"num_pages": 0, "total_chars": 0, "empty_pages": 0},
     }
 
-    pages: List[PageText] = []
 
-    # Prefer pypdf (lightweight)
+def _reset_structure(structure: Dict[str, Any], method: str, tool: Optional[str]) -> None:
+    # switch method in place (fallbacks) but keep errors recorded so far
+    errors = structure.get("extraction", {}).get("errors", [])
+    structure.clear()
+    structure.update(new_structure(method, tool))
+    structure["extraction"]["errors"].extend(errors)
+
+
+def _page(structure: Dict[str, Any], page_no: int, text: str) -> PageText:
+    """Builds a PageText and records its stats in `structure`."""
+    clen = len(text)
+    has_text = clen > 20  # heuristic
+    stats = structure["stats"]
+    stats["num_pages"] += 1
+    stats["total_chars"] += clen
+    if not has_text:
+        stats["empty_pages"] += 1
+    structure["pages"].append({"page": page_no, "char_len": clen, "has_text": has_text})
+    return PageText(page=page_no, text=text, char_len=clen, has_text=has_text)
+
+
+def _finalize_structure(structure: Dict[str, Any]) -> None:
+    stats = structure["stats"]
+    num_pages = stats["num_pages"]
+    empty_pages = stats["empty_pages"]
+    # OCR heuristic: if most pages empty, mark OCR-needed (we don’t OCR yet)
+    if (
+        structure["extraction"]["method"] == "pdf_text"
+        and num_pages > 0
+        and (empty_pages / num_pages) >= 0.6
+    ):
+        structure["extraction"]["ocr_needed"] = True
+        structure["extraction"][
+            "ocr_reason"
+        ] = f"{empty_pages}/{num_pages} pages had little/no text"
+
+
+def iter_pages(
+    path: str, mime_type: Optional[str], structure: Dict[str, Any]
+) -> Iterator[PageText]:
+    """
+    Streaming extraction: yields one PageText at a time from the file at
+    `path` so callers never hold every page at once. `structure` is filled
+    in as pages are produced and is complete once the iterator is exhausted.
+    """
+    with open(path, "rb") as fh:
+        head = fh.read(8)
+
+    if _is_pdf(head, mime_type):
+        yield from _iter_pdf_pages(path, structure)
+    elif _is_docx(head, mime_type):
+        # best-effort DOCX; if python-docx not installed or parsing fails, fall back to text
+        try:
+            page = _extract_docx_page(path, structure)
+        except Exception as e:
+            _reset_structure(structure, "text", "utf-8/latin-1 decode")
+            structure["extraction"]["errors"].append(f"DOCX extraction failed: {e}")
+            page = _extract_plain_page(path, structure)
+        yield page
+    else:
+        _reset_structure(structure, "text", "utf-8/latin-1 decode")
+        yield _extract_plain_page(path, structure)
+
+    _finalize_structure(structure)
+
+
+def extract_text(file_bytes: bytes, mime_type: Optional[str]) -> ExtractResult:
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        tmp.write(file_bytes)
+        path = tmp.name
     try:
-        from pypdf import PdfReader  # type: ignore
+        return extract_file(path, mime_type)
+    finally:
+        os.unlink(path)
 
-        structure["extraction"]["tool"] = "pypdf"
-        reader = PdfReader(io.BytesIO(file_bytes))
-        num_pages = len(reader.pages)
 
-        total_chars = 0
-        empty_pages = 0
+def extract_file(path: str, mime_type: Optional[str]) -> ExtractResult:
+    """Materialized form of iter_pages for callers that want every page."""
+    structure = new_structure("pdf_text", None)
+    pages = list(iter_pages(path, mime_type, structure))
+    full_text = "\n\n".join(p.text for p in pages).strip()
+    return ExtractResult(
+        method=structure["extraction"]["method"],
+        pages=pages,
+        full_text=full_text,
+        structure=structure,
+    )
+
 
-        for i in range(num_pages):
+def _extract_pdf_page_range(
+    path: str, start: int, end: int
+) -> List[Tuple[int, str, Optional[str]]]:
+    """
+    Process-pool task: extracts pages [start, end) from the PDF at `path`.
+    The file is memory-mapped so every worker shares the same page cache
+    instead of receiving a pickled copy of the bytes.
+    Returns (page_index, normalized_text, error) per page.
+    """
+    from pypdf import PdfReader  # type: ignore
+
+    out: List[Tuple[int, str, Optional[str]]] = []
+    with open(path, "rb") as fh, mmap.mmap(
+        fh.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mm:
+        reader = PdfReader(mm)
+        for i in range(start, end):
             try:
                 txt = reader.pages[i].extract_text() or ""
+                err = None
             except Exception as e:
-                structure["extraction"]["errors"].append(f"page {i+1}: {e}")
                 txt = ""
+                err = f"page {i+1}: {e}"
+            out.append((i, _normalize_text(txt), err))
+    return out
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _PDF_POOL
+    if _PDF_POOL is None:
+        # spawn: the worker process runs an event loop and threads, which
+        # don't survive fork cleanly
+        _PDF_POOL = ProcessPoolExecutor(
+            max_workers=max(1, settings.PDF_EXTRACT_WORKERS),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _PDF_POOL
 
-            txt_norm = _normalize_text(txt)
-            clen = len(txt_norm)
-            has_text = clen > 20  # heuristic
-            if not has_text:
-                empty_pages += 1
 
-            total_chars += clen
-            pages.append(
-                PageText(page=i + 1, text=txt_norm, char_len=clen, has_text=has_text)
-            )
-            structure["pages"].append(
-                {"page": i + 1, "char_len": clen, "has_text": has_text}
-            )
+def _iter_pdf_pages_parallel(
+    path: str, num_pages: int
+) -> Iterator[Tuple[int, str, Optional[str]]]:
+    workers = max(1, settings.PDF_EXTRACT_WORKERS)
+    # a few ranges per worker keeps the pool busy when pages vary in cost
+    span = max(1, math.ceil(num_pages / (workers * 4)))
+
+    pool = _get_pdf_pool()
+    futures = [
+        pool.submit(_extract_pdf_page_range, path, start, min(start + span, num_pages))
+        for start in range(0, num_pages, span)
+    ]
+    try:
+        # ranges are submitted in order, so yielding per future keeps page order
+        for fut in futures:
+            yield from fut.result()
+    finally:
+        for fut in futures:
+            fut.cancel()
 
-        # OCR heuristic: if most pages empty, mark OCR-needed (we don’t OCR yet)
-        if num_pages > 0 and (empty_pages / num_pages) >= 0.6:
-            structure["extraction"]["ocr_needed"] = True
-            structure["extraction"][
-                "ocr_reason"
-            ] = f"{empty_pages}/{num_pages} pages had little/no text"
-
-        structure["stats"] = {
-            "num_pages": num_pages,
-            "total_chars": total_chars,
-            "empty_pages": empty_pages,
-        }
-
-        full_text = "\n\n".join(p.text for p in pages).strip()
-
-        return ExtractResult(
-            method="pdf_text",
-            pages=pages,
-            full_text=full_text,
-            structure=structure,
-        )
 
+def _iter_pdf_pages(path: str, structure: Dict[str, Any]) -> Iterator[PageText]:
+    structure["extraction"]["method"] = "pdf_text"
+    structure["extraction"]["parallel"] = False
+
+    if settings.EXTRACT_SANDBOX:
+        yield from _iter_pdf_pages_sandboxed(path, structure)
+        return
+
+    fh = open(path, "rb")
+    mm: Optional[mmap.mmap] = None
+    # Prefer pypdf (lightweight)
+    try:
+        from pypdf import PdfReader  # type: ignore
+
+        structure["extraction"]["tool"] = "pypdf"
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        reader = PdfReader(mm)
+        num_pages = len(reader.pages)
     except Exception as e:
+        if mm is not None:
+            mm.close()
+        fh.close()
+        structure["extraction"]["errors"].append(f"PDF extraction failed: {e}")
+        # fall back to plain decode attempt
+        _reset_structure(structure, "text", "utf-8/latin-1 decode")
+        yield _extract_plain_page(path, structure)
+        return
+
+    try:
+        for i, txt_norm, err in _iter_pdf_page_results(
+            path, reader, num_pages, structure
+        ):
+            if err:
+                structure["extraction"]["errors"].append(err)
+            yield _page(structure, i + 1, txt_norm)
+    finally:
+        del reader
+        mm.close()
+        fh.close()
+
+
+def _iter_pdf_pages_sandboxed(
+    path: str, structure: Dict[str, Any]
+) -> Iterator[PageText]:
+    # the parent never parses the PDF; page count comes from the child
+    structure["extraction"]["tool"] = "pypdf"
+    structure["extraction"]["sandboxed"] = True
+    try:
+        for i, txt_norm, err in iter_pdf_pages_sandboxed(path, structure):
+            if err:
+                structure["extraction"]["errors"].append(err)
+            yield _page(structure, i + 1, txt_norm)
+    except PdfOpenError as e:
         structure["extraction"]["errors"].append(f"PDF extraction failed: {e}")
         # fall back to plain decode attempt
-        return _extract_plain_text(file_bytes, note_error=f"PDF extraction failed: {e}")
+        _reset_structure(structure, "text", "utf-8/latin-1 decode")
+        yield _extract_plain_page(path, structure)
 
 
-def _extract_docx_text(file_bytes: bytes) -> ExtractResult:
-    structure: Dict[str, Any] = {
-        "extraction": {
-            "method": "docx",
-            "tool": "python-docx",
-            "errors": [],
-            "ocr_needed": False,
-            "ocr_reason": None,
-        },
-        "pages": [],
-        "stats": {},
-    }
+def _iter_pdf_page_results(
+    path: str, reader: Any, num_pages: int, structure: Dict[str, Any]
+) -> Iterator[Tuple[int, str, Optional[str]]]:
+    next_index = 0
+    if num_pages >= settings.PDF_PARALLEL_PAGE_THRESHOLD:
+        structure["extraction"]["parallel"] = True
+        try:
+            for r in _iter_pdf_pages_parallel(path, num_pages):
+                next_index = r[0] + 1
+                yield r
+        except Exception as e:
+            # pool broken / unavailable: finish the remaining pages serially
+            structure["extraction"]["errors"].append(
+                f"parallel extraction failed at page {next_index + 1}, continued serially: {e}"
+            )
+
+    for i in range(next_index, num_pages):
+        try:
+            txt = reader.pages[i].extract_text() or ""
+            err = None
+        except Exception as e:
+            txt = ""
+            err = f"page {i+1}: {e}"
+        yield i, _normalize_text(txt), err
+
 
+def _extract_docx_page(path: str, structure: Dict[str, Any]) -> PageText:
     from docx import Document as DocxDocument  # type: ignore
 
-    doc = DocxDocument(io.BytesIO(file_bytes))
+    doc = DocxDocument(path)
     paras = []
     for p in doc.paragraphs:
         t = (p.text or "").strip()
         if t:
             paras.append(t)
 
+    _reset_structure(structure, "docx", "python-docx")
     full_text = _normalize_text("\n\n".join(paras)).strip()
-    pages = [
-        PageText(
-            page=1,
-            text=full_text,
-            char_len=len(full_text),
-            has_text=len(full_text) > 20,
-        )
-    ]
-    structure["pages"] = [
-        {"page": 1, "char_len": len(full_text), "has_text": len(full_text) > 20}
-    ]
-    structure["stats"] = {
-        "num_pages": 1,
-        "total_chars": len(full_text),
-        "empty_pages": 0,
-    }
+    page = _page(structure, 1, full_text)
+    structure["stats"]["empty_pages"] = 0
+    return page
 
-    return ExtractResult(
-        method="docx", pages=pages, full_text=full_text, structure=structure
-    )
 
-
-def _extract_plain_text(
-    file_bytes: bytes, note_error: Optional[str] = None
-) -> ExtractResult:
-    structure: Dict[str, Any] = {
-        "extraction": {
-            "method": "text",
-            "tool": "utf-8/latin-1 decode",
-            "errors": [],
-            "ocr_needed": False,
-            "ocr_reason": None,
-        },
-        "pages": [],
-        "stats": {},
-    }
-    if note_error:
-        structure["extraction"]["errors"].append(note_error)
+def _extract_plain_page(path: str, structure: Dict[str, Any]) -> PageText:
+    with open(path, "rb") as fh:
+        file_bytes = fh.read()
 
     # Best-effort decoding
     try:
@@ -193,26 +321,9 @@ def _extract_plain_text(
         txt = file_bytes.decode("latin-1", errors="ignore")
 
     full_text = _normalize_text(txt).strip()
-    pages = [
-        PageText(
-            page=1,
-            text=full_text,
-            char_len=len(full_text),
-            has_text=len(full_text) > 20,
-        )
-    ]
-    structure["pages"] = [
-        {"page": 1, "char_len": len(full_text), "has_text": len(full_text) > 20}
-    ]
-    structure["stats"] = {
-        "num_pages": 1,
-        "total_chars": len(full_text),
-        "empty_pages": 0,
-    }
-
-    return ExtractResult(
-        method="text", pages=pages, full_text=full_text, structure=structure
-    )
+    page = _page(structure, 1, full_text)
+    structure["stats"]["empty_pages"] = 0
+    return page
 
 
 def _normalize_text(s: str) -> str:
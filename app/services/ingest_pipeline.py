@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import array
-from typing import Any, Dict, List, Optional, Tuple
+import os
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+import oracledb
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import and_, func, text
 
+from core.config import settings
 from models.Models import (
     Document,
     DocumentVersion,
@@ -15,15 +21,69 @@ from models.Models import (
     DocumentChunk,
     ChunkEmbedding,
 )
-from services.extraction_service import extract_text
-from services.chunking_service import chunk_extracted, ChunkSpec
+from services.answer_cache import answer_cache
+from services.extraction_service import PageText, iter_pages, new_structure
+from services.chunking_service import iter_configured_chunks, ChunkSpec
 from services.embedding_service import EmbeddingService
+from services.embedding_batcher import EmbeddingBatcher
+from services.job_service import JobService
+from services import vector_codec
+from services.embedding_models import EmbeddingModelSpec, embedding_registry
+from services.tokenizer import count_tokens_batch
+
+
+def _lob_locator_handler(cursor, metadata):
+    # SQLAlchemy's connection-level handler fetches LOBs as bytes/str; we
+    # want the locator so the content can be read piece by piece.
+    if metadata.type_code in (oracledb.DB_TYPE_BLOB, oracledb.DB_TYPE_CLOB):
+        return cursor.var(metadata.type_code, arraysize=cursor.arraysize)
+    return None
+
+
+def _clob_len(s: str) -> int:
+    # CLOB offsets count UCS-2 code units, so astral chars take two
+    return len(s.encode("utf-16-le")) // 2
+
+
+class _ClobAppender:
+    """Buffers text and appends it to a CLOB locator in large writes."""
+
+    def __init__(self, lob: Any, flush_chars: int):
+        self.lob = lob
+        self.flush_chars = max(1, flush_chars)
+        self.offset = 1  # LOB offsets are 1-based
+        self._buf: List[str] = []
+        self._buf_len = 0
+
+    def write(self, s: str) -> None:
+        if not s:
+            return
+        self._buf.append(s)
+        self._buf_len += len(s)
+        if self._buf_len >= self.flush_chars:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buf:
+            return
+        data = "".join(self._buf)
+        self.lob.write(data, self.offset)
+        self.offset += _clob_len(data)
+        self._buf = []
+        self._buf_len = 0
 
 
 class IngestPipeline:
     """
     Synchronous ingestion pipeline for MVP:
       blob -> extract -> document_text -> chunks -> embeddings -> ready/failed
+
+    Chunks and embeddings are committed in batches so a failure late in a
+    large document doesn't throw away the work already done.
+
+    The blob is spooled to a temp file and pages stream from extraction
+    straight into the chunker and the document_text CLOB, so worker memory
+    stays flat regardless of document size.
     """
 
     def load_latest_version(self, db: Session, doc_id: int) -> DocumentVersion:
@@ -38,11 +98,56 @@ class IngestPipeline:
         return ver
 
     def load_blob_bytes(self, db: Session, version_id: int) -> bytes:
-        blob = db.get(DocumentBlob, version_id)
+        ver = db.get(DocumentVersion, version_id)
+        content_version_id = (ver.content_version_id if ver else None) or version_id
+        blob = db.get(DocumentBlob, content_version_id)
         if not blob or not blob.blob_data:
             raise ValueError("document_blobs missing or empty for version_id")
         return blob.blob_data
 
+    def spool_blob(self, db: Session, version_id: int) -> str:
+        """
+        Reads document_blobs.blob_data in UPLOAD_CHUNK_BYTES pieces into a
+        temp file and returns its path. Caller must delete it.
+        """
+        raw = db.connection().connection.driver_connection
+        cur = raw.cursor()
+        try:
+            cur.outputtypehandler = _lob_locator_handler
+            # deduplicated versions point at another version's bytes
+            cur.execute(
+                """
+                SELECT b.blob_data
+                FROM document_versions v
+                JOIN document_blobs b
+                  ON b.version_id = NVL(v.content_version_id, v.version_id)
+                WHERE v.version_id = :version_id
+                """,
+                version_id=version_id,
+            )
+            row = cur.fetchone()
+            lob = row[0] if row else None
+            size = lob.size() if lob is not None else 0
+            if not size:
+                raise ValueError("document_blobs missing or empty for version_id")
+
+            step = max(1, settings.UPLOAD_CHUNK_BYTES)
+            with tempfile.NamedTemporaryFile(suffix=".blob", delete=False) as tmp:
+                try:
+                    offset = 1
+                    while offset <= size:
+                        data = lob.read(offset, step)
+                        if not data:
+                            break
+                        tmp.write(data)
+                        offset += len(data)
+                except Exception:
+                    os.unlink(tmp.name)
+                    raise
+                return tmp.name
+        finally:
+            cur.close()
+
     def upsert_document_text(
         self,
         db: Session,
@@ -64,6 +169,44 @@ class IngestPipeline:
                 )
             )
 
+    def open_document_text(self, db: Session, version_id: int) -> _ClobAppender:
+        """
+        Replaces the document_text row with an EMPTY_CLOB() and returns an
+        appender over its locator. The locator is only valid until the
+        transaction ends, so write everything before committing.
+        """
+        db.execute(
+            text("DELETE FROM document_text WHERE version_id = :version_id"),
+            {"version_id": version_id},
+        )
+        raw = db.connection().connection.driver_connection
+        cur = raw.cursor()
+        try:
+            lob_var = cur.var(oracledb.DB_TYPE_CLOB)
+            cur.execute(
+                """
+                INSERT INTO document_text (version_id, extracted_text, created_at)
+                VALUES (:version_id, EMPTY_CLOB(), SYSTIMESTAMP)
+                RETURNING extracted_text INTO :lob
+                """,
+                version_id=version_id,
+                lob=lob_var,
+            )
+            lob = lob_var.getvalue()[0]
+        finally:
+            cur.close()
+        return _ClobAppender(lob, flush_chars=settings.UPLOAD_CHUNK_BYTES)
+
+    def set_document_structure(
+        self, db: Session, version_id: int, structure: Dict[str, Any]
+    ) -> None:
+        db.execute(
+            text(
+                "UPDATE document_text SET structure_json = :s WHERE version_id = :version_id"
+            ),
+            {"s": json.dumps(structure), "version_id": version_id},
+        )
+
     def upsert_chunks(
         self,
         db: Session,
@@ -73,20 +216,42 @@ class IngestPipeline:
         chunk_specs: List[ChunkSpec],
     ) -> List[DocumentChunk]:
         """
-        Upsert by (version_id, chunk_index).
-        Returns the persisted DocumentChunk rows (with chunk_id populated).
+        Upsert by (version_id, chunk_index) for one batch of specs.
+        Chunks whose text changed lose their embedding. Use prune_chunks to
+        drop rows past the new tail. Returns the persisted DocumentChunk rows
+        (with chunk_id populated).
         """
+        if not chunk_specs:
+            return []
+
+        # legacy chunker leaves token_count unset; count the batch in one go
+        uncounted = [s for s in chunk_specs if s.token_count is None]
+        if uncounted:
+            for spec, n in zip(
+                uncounted, count_tokens_batch([s.chunk_text for s in uncounted])
+            ):
+                spec.token_count = n
+
+        existing_by_index: Dict[int, DocumentChunk] = {
+            c.chunk_index: c
+            for c in db.query(DocumentChunk)
+            .filter(
+                DocumentChunk.version_id == version_id,
+                DocumentChunk.chunk_index.between(
+                    chunk_specs[0].chunk_index, chunk_specs[-1].chunk_index
+                ),
+            )
+            .all()
+        }
+
         out: List[DocumentChunk] = []
         for spec in chunk_specs:
-            existing = (
-                db.query(DocumentChunk)
-                .filter(
-                    DocumentChunk.version_id == version_id,
-                    DocumentChunk.chunk_index == spec.chunk_index,
-                )
-                .first()
-            )
+            existing = existing_by_index.get(spec.chunk_index)
             if existing:
+                if existing.chunk_text != spec.chunk_text:
+                    db.query(ChunkEmbedding).filter(
+                        ChunkEmbedding.chunk_id == existing.chunk_id
+                    ).delete(synchronize_session=False)
                 existing.doc_id = doc_id
                 existing.tenant_id = tenant_id
                 existing.page_start = spec.page_start
@@ -113,120 +278,571 @@ class IngestPipeline:
         db.flush()  # assign chunk_id for new rows
         return out
 
+    def prune_chunks(self, db: Session, version_id: int, chunk_count: int) -> None:
+        # leftovers from a previous, longer chunking of this version
+        # (embeddings/citations go with them via ON DELETE CASCADE)
+        db.query(DocumentChunk).filter(
+            DocumentChunk.version_id == version_id,
+            DocumentChunk.chunk_index >= chunk_count,
+        ).delete(synchronize_session=False)
+
+    def backfill_token_counts(
+        self,
+        db: Session,
+        batch_size: int = 500,
+        tenant_id: Optional[int] = None,
+    ) -> int:
+        """
+        Fills token_count for chunks stored before it was computed at
+        ingestion. Walks chunk_id in keyset order and commits per batch, so
+        it can be stopped and rerun at any point. Returns rows updated.
+        """
+        select_sql = text(
+            """
+            SELECT chunk_id, chunk_text
+            FROM document_chunks
+            WHERE token_count IS NULL
+              AND chunk_id > :after
+              AND (:tenant_id IS NULL OR tenant_id = :tenant_id)
+            ORDER BY chunk_id
+            FETCH FIRST :n ROWS ONLY
+            """
+        )
+        update_sql = text(
+            "UPDATE document_chunks SET token_count = :n WHERE chunk_id = :chunk_id"
+        )
+
+        after = 0
+        updated = 0
+        while True:
+            rows = db.execute(
+                select_sql,
+                {"after": after, "tenant_id": tenant_id, "n": int(batch_size)},
+            ).all()
+            if not rows:
+                return updated
+            counts = count_tokens_batch([r.chunk_text or "" for r in rows])
+            db.execute(
+                update_sql,
+                [
+                    {"n": n, "chunk_id": int(r.chunk_id)}
+                    for r, n in zip(rows, counts)
+                ],
+            )
+            db.commit()
+            updated += len(rows)
+            after = int(rows[-1].chunk_id)
+            print(f"token_count backfill: {updated} chunks (last chunk_id {after})")
+
+    def count_chunks(self, db: Session, version_id: int) -> int:
+        return (
+            db.query(func.count(DocumentChunk.chunk_id))
+            .filter(DocumentChunk.version_id == version_id)
+            .scalar()
+            or 0
+        )
+
+    def chunks_missing_embeddings(
+        self,
+        db: Session,
+        version_id: int,
+        model_key: str,
+        limit: Optional[int] = None,
+    ) -> List[DocumentChunk]:
+        q = (
+            db.query(DocumentChunk)
+            .outerjoin(
+                ChunkEmbedding,
+                and_(
+                    ChunkEmbedding.chunk_id == DocumentChunk.chunk_id,
+                    ChunkEmbedding.embedding_model_id == model_key,
+                ),
+            )
+            .filter(
+                DocumentChunk.version_id == version_id,
+                ChunkEmbedding.chunk_id.is_(None),
+            )
+            .order_by(DocumentChunk.chunk_index.asc())
+        )
+        if limit:
+            q = q.limit(limit)
+        return q.all()
+
+    def count_missing_embeddings(
+        self, db: Session, version_id: int, model_key: str
+    ) -> int:
+        return (
+            db.query(func.count(DocumentChunk.chunk_id))
+            .outerjoin(
+                ChunkEmbedding,
+                and_(
+                    ChunkEmbedding.chunk_id == DocumentChunk.chunk_id,
+                    ChunkEmbedding.embedding_model_id == model_key,
+                ),
+            )
+            .filter(
+                DocumentChunk.version_id == version_id,
+                ChunkEmbedding.chunk_id.is_(None),
+            )
+            .scalar()
+            or 0
+        )
+
     async def embed_and_persist(
         self,
         db: Session,
         tenant_id: int,
         chunks: List[DocumentChunk],
-        embedding_service: EmbeddingService,
+        embedding_service: Union[EmbeddingService, EmbeddingBatcher],
+        spec: EmbeddingModelSpec,
     ) -> int:
         """
-        Inserts embeddings via raw SQL (VECTOR binding) for any chunk missing an embedding.
+        Inserts `spec` model embeddings via raw SQL (VECTOR binding) for the
+        given chunks. Callers pass only chunks missing that model's embedding
+        (see chunks_missing_embeddings) and own the commit.
         Returns count inserted.
         """
         inserted = 0
+        # one batched embedding call (and one executemany) per slice; with the
+        # worker's EmbeddingBatcher these slices merge with other jobs' chunks
+        step = max(1, settings.INGEST_COMMIT_BATCH)
+        for i in range(0, len(chunks), step):
+            batch = chunks[i : i + step]
+            vecs = await embedding_service.embed_texts(
+                [ch.chunk_text for ch in batch], spec
+            )
+            inserted += self.persist_embeddings(
+                db, tenant_id, [ch.chunk_id for ch in batch], vecs, spec
+            )
+        return inserted
+
+    def persist_embeddings(
+        self,
+        db: Session,
+        tenant_id: int,
+        chunk_ids: List[int],
+        vecs: List[List[float]],
+        spec: EmbeddingModelSpec,
+    ) -> int:
+        """
+        Inserts already computed `spec` embeddings (one executemany) for
+        callers that embed outside a transaction. Caller owns the commit.
+        """
+        if not chunk_ids:
+            return 0
         insert_sql = text(
             """
             INSERT INTO chunk_embeddings
-              (chunk_id, tenant_id, embedding_model_id, embedding_dim, embedding, created_at)
+              (chunk_id, tenant_id, embedding_model_id, embedding_dim, embedding_format,
+               embedding, embedding_full, created_at)
             VALUES
-              (:chunk_id, :tenant_id, :embedding_model_id, :embedding_dim, :embedding, SYSTIMESTAMP)
+              (:chunk_id, :tenant_id, :embedding_model_id, :embedding_dim, :embedding_format,
+               :embedding, :embedding_full, SYSTIMESTAMP)
         """
         )
-
-        # You *can* check via ORM mapping, but use EXISTS query for speed if you want later.
-        for ch in chunks:
-            exists = db.get(ChunkEmbedding, ch.chunk_id)
-            if exists:
-                continue
-
-            vec = await embedding_service.embed_text(ch.chunk_text)
-            vec_arr = array.array("f", vec)
-
-            db.execute(
-                insert_sql,
+        fmt = spec.storage_format
+        dim = spec.search_dim
+        # the full vector is only worth a second copy when `embedding` is lossy
+        keep_full = settings.EMBEDDING_KEEP_FULL and spec.is_compact
+        db.execute(
+            insert_sql,
+            [
                 {
-                    "chunk_id": ch.chunk_id,
+                    "chunk_id": chunk_id,
                     "tenant_id": tenant_id,
-                    "embedding_model_id": "qwen3-embedding",
-                    "embedding_dim": 4096,
-                    "embedding": vec_arr,
-                },
+                    "embedding_model_id": spec.model_key,
+                    "embedding_dim": dim,
+                    "embedding_format": fmt,
+                    "embedding": vector_codec.encode(vec, fmt, dim),
+                    "embedding_full": array.array("f", vec) if keep_full else None,
+                }
+                for chunk_id, vec in zip(chunk_ids, vecs)
+            ],
+        )
+        return len(chunk_ids)
+
+    def upsert_document_embedding(
+        self,
+        db: Session,
+        tenant_id: int,
+        doc_id: int,
+        version_id: int,
+        spec: EmbeddingModelSpec,
+    ) -> int:
+        """
+        Stores the document-level embedding used by hierarchical retrieval:
+        the L2-normalized mean of the version's chunk embeddings (float32 at
+        the search dim, from the full-precision copy when there is one),
+        streamed from the DB in cursor batches. Caller owns the commit.
+        Returns the number of chunk embeddings averaged.
+        """
+        dim = spec.search_dim
+        raw = db.connection().connection.driver_connection
+        cur = raw.cursor()
+        try:
+            cur.arraysize = max(1, settings.INGEST_COMMIT_BATCH)
+            cur.execute(
+                """
+                SELECT e.embedding, e.embedding_full, e.embedding_format, e.embedding_dim
+                FROM chunk_embeddings e
+                JOIN document_chunks c ON c.chunk_id = e.chunk_id
+                WHERE c.version_id = :version_id
+                  AND e.embedding_model_id = :embedding_model_id
+                """,
+                version_id=version_id,
+                embedding_model_id=spec.model_key,
             )
-            inserted += 1
+            acc: Optional[List[float]] = None
+            n = 0
+            while True:
+                rows = cur.fetchmany()
+                if not rows:
+                    break
+                for compact, full, fmt, stored_dim in rows:
+                    if full is None:
+                        full = vector_codec.decode(compact, fmt, int(stored_dim))
+                    vec = vector_codec.truncate(full, dim)
+                    if acc is None:
+                        acc = list(vec)
+                    else:
+                        acc = [a + b for a, b in zip(acc, vec)]
+                    n += 1
+        finally:
+            cur.close()
 
-        return inserted
+        if acc is None:
+            return 0
+        norm = sum(a * a for a in acc) ** 0.5 or 1.0
+        centroid = array.array("f", (a / norm for a in acc))
+
+        db.execute(
+            text(
+                """
+                MERGE INTO document_embeddings d
+                USING (
+                  SELECT :doc_id AS doc_id, :embedding_model_id AS embedding_model_id
+                  FROM dual
+                ) s
+                ON (d.doc_id = s.doc_id AND d.embedding_model_id = s.embedding_model_id)
+                WHEN MATCHED THEN UPDATE SET
+                  d.version_id = :version_id,
+                  d.embedding_dim = :embedding_dim,
+                  d.chunk_count = :chunk_count,
+                  d.embedding = :embedding,
+                  d.created_at = SYSTIMESTAMP
+                WHEN NOT MATCHED THEN INSERT
+                  (doc_id, version_id, tenant_id, embedding_model_id, embedding_dim,
+                   chunk_count, embedding, created_at)
+                VALUES
+                  (:doc_id, :version_id, :tenant_id, :embedding_model_id, :embedding_dim,
+                   :chunk_count, :embedding, SYSTIMESTAMP)
+                """
+            ),
+            {
+                "doc_id": doc_id,
+                "version_id": version_id,
+                "tenant_id": tenant_id,
+                "embedding_model_id": spec.model_key,
+                "embedding_dim": len(centroid),
+                "chunk_count": n,
+                "embedding": centroid,
+            },
+        )
+        return n
+
+    def backfill_document_embeddings(
+        self,
+        db: Session,
+        batch_size: int = 100,
+        tenant_id: Optional[int] = None,
+        spec: Optional[EmbeddingModelSpec] = None,
+    ) -> int:
+        """
+        Computes document embeddings for ready documents that don't have
+        one (ingested before hierarchical retrieval). Commits per document.
+        `spec` defaults to each tenant's active model.
+        """
+        done = 0
+        after = 0
+        tenant_filter = "AND d.tenant_id = :tenant_id" if tenant_id is not None else ""
+        while True:
+            params: Dict[str, Any] = {
+                "after": after,
+                "n": int(batch_size),
+                "embedding_model_id": spec.model_key if spec else None,
+                "default_model": settings.EMBEDDING_MODEL,
+            }
+            if tenant_id is not None:
+                params["tenant_id"] = tenant_id
+            rows = db.execute(
+                text(
+                    f"""
+                    SELECT d.doc_id, d.tenant_id,
+                           (SELECT MAX(v.version_id)
+                                   KEEP (DENSE_RANK LAST ORDER BY v.version_num)
+                              FROM document_versions v
+                             WHERE v.doc_id = d.doc_id) AS version_id
+                    FROM documents d
+                    WHERE d.doc_id > :after
+                      AND d.status = 'ready'
+                      {tenant_filter}
+                      AND NOT EXISTS (
+                        SELECT 1 FROM document_embeddings de
+                        WHERE de.doc_id = d.doc_id
+                          AND de.embedding_model_id = COALESCE(
+                            :embedding_model_id,
+                            (SELECT t.active_model FROM tenant_embedding_models t
+                              WHERE t.tenant_id = d.tenant_id),
+                            :default_model
+                          )
+                      )
+                    ORDER BY d.doc_id
+                    FETCH FIRST :n ROWS ONLY
+                    """
+                ),
+                params,
+            ).all()
+            if not rows:
+                return done
+            for r in rows:
+                if r.version_id is not None:
+                    self.upsert_document_embedding(
+                        db,
+                        int(r.tenant_id),
+                        int(r.doc_id),
+                        int(r.version_id),
+                        spec or embedding_registry.for_tenant(db, int(r.tenant_id)).active,
+                    )
+                    db.commit()
+                    done += 1
+            after = int(rows[-1].doc_id)
+            print(f"document embedding backfill: {done} documents (last doc_id {after})")
+
+    def extract_and_chunk(
+        self,
+        db: Session,
+        tenant_id: int,
+        doc_id: int,
+        version_id: int,
+        mime_type: Optional[str],
+        max_chars: int,
+        job_id: Optional[int] = None,
+    ) -> Tuple[int, Dict[str, Any]]:
+        """
+        Streaming extract -> document_text + chunks for one version.
+        Pages flow from the spooled blob through the chunker one at a time;
+        chunks are flushed to the DB per INGEST_COMMIT_BATCH. Only the
+        "extracting" progress marker is committed here; the rest is left to
+        the caller because the CLOB locator can't span transactions.
+        Returns (chunk_count, structure).
+        """
+        commit_every = max(1, settings.INGEST_COMMIT_BATCH)
+        path = self.spool_blob(db, version_id)
+        try:
+            if job_id:
+                JobService().update_progress(
+                    db,
+                    job_id,
+                    stage="extracting",
+                    bytes_processed=os.path.getsize(path),
+                )
+                db.commit()
+
+            structure = new_structure("pdf_text", None)
+            text_out = self.open_document_text(db, version_id)
+
+            def tee_to_text(pages: Iterable[PageText]) -> Iterator[PageText]:
+                first = True
+                for p in pages:
+                    if p.text:
+                        text_out.write(p.text if first else "\n\n" + p.text)
+                        first = False
+                    yield p
+
+            chunk_count = 0
+            batch: List[ChunkSpec] = []
+            for spec in iter_configured_chunks(
+                tee_to_text(iter_pages(path, mime_type, structure)),
+                max_chars=max_chars,
+            ):
+                batch.append(spec)
+                if len(batch) >= commit_every:
+                    self.upsert_chunks(db, tenant_id, doc_id, version_id, batch)
+                    chunk_count += len(batch)
+                    batch = []
+            if batch:
+                self.upsert_chunks(db, tenant_id, doc_id, version_id, batch)
+                chunk_count += len(batch)
+
+            text_out.flush()
+            self.prune_chunks(db, version_id, chunk_count)
+            self.set_document_structure(db, version_id, structure)
+            return chunk_count, structure
+        finally:
+            os.unlink(path)
 
     async def process_document(
         self,
         db: Session,
         tenant_id: int,
         doc_id: int,
-        embedding_service: EmbeddingService,
+        embedding_service: Union[EmbeddingService, EmbeddingBatcher],
         max_chars: int = 5000,
+        job_id: Optional[int] = None,
     ) -> Dict[str, Any]:
         """
         Runs full ingestion for latest version of a doc.
+
+        Work is committed in batches of settings.INGEST_COMMIT_BATCH. With a
+        job_id, progress is checkpointed on the job so a retry skips
+        extraction/chunking and only embeds the chunks still missing.
         """
         doc = db.get(Document, doc_id)
         if not doc or doc.tenant_id != tenant_id:
             raise ValueError("Document not found")
 
+        jobs = JobService()
+        commit_every = max(1, settings.INGEST_COMMIT_BATCH)
+
         # Set processing state
         doc.status = "processing"
+        # cached answers over this document's chunks go stale with them; the
+        # delete commits together with the first chunk changes
+        answer_cache.invalidate_document(db, doc_id)
 
         try:
             version = self.load_latest_version(db, doc_id)
-            file_bytes = self.load_blob_bytes(db, version.version_id)
+            checkpoint = jobs.load_checkpoint(db, job_id) if job_id else {}
+            resumed = (
+                checkpoint.get("version_id") == version.version_id
+                and checkpoint.get("stage") in ("chunked", "embedding")
+            )
 
-            extracted = extract_text(file_bytes=file_bytes, mime_type=doc.mime_type)
+            if resumed:
+                chunks_total = self.count_chunks(db, version.version_id)
+                notes = checkpoint.get("notes") or {}
+            else:
+                # CPU-bound; keep it off the event loop so other jobs progress
+                chunks_total, structure = await asyncio.to_thread(
+                    self.extract_and_chunk,
+                    db,
+                    tenant_id,
+                    doc_id,
+                    version.version_id,
+                    doc.mime_type,
+                    max_chars,
+                    job_id,
+                )
+                notes = {
+                    "method": structure.get("extraction", {}).get("method"),
+                    "ocr_needed": structure.get("extraction", {}).get(
+                        "ocr_needed", False
+                    ),
+                    "stats": structure.get("stats", {}),
+                }
+                if job_id:
+                    jobs.save_checkpoint(
+                        db,
+                        job_id,
+                        {
+                            "version_id": version.version_id,
+                            "stage": "chunked",
+                            "chunks_total": chunks_total,
+                            "notes": notes,
+                        },
+                    )
+                db.commit()
 
-            # Persist canonical extracted text
-            self.upsert_document_text(
-                db=db,
-                version_id=version.version_id,
-                extracted_text=extracted.full_text,
-                structure=extracted.structure,
+            # Embeddings (only what's missing; earlier batches survived),
+            # one batch in memory at a time. While the tenant migrates to a
+            # new model, new chunks are written with both models so the
+            # backfill never chases fresh uploads.
+            specs = embedding_registry.for_tenant(db, tenant_id).write_specs
+            missing = sum(
+                self.count_missing_embeddings(db, version.version_id, s.model_key)
+                for s in specs
             )
+            already_embedded = chunks_total * len(specs) - missing
+            embed_started = time.monotonic()
+            embedded_count = 0
+            for spec in specs:
+                while True:
+                    pending = self.chunks_missing_embeddings(
+                        db, version.version_id, spec.model_key, limit=commit_every
+                    )
+                    if not pending:
+                        break
+                    embedded_count += await self.embed_and_persist(
+                        db=db,
+                        tenant_id=tenant_id,
+                        chunks=pending,
+                        embedding_service=embedding_service,
+                        spec=spec,
+                    )
+                    if job_id:
+                        elapsed = max(time.monotonic() - embed_started, 1e-6)
+                        jobs.save_checkpoint(
+                            db,
+                            job_id,
+                            {
+                                "version_id": version.version_id,
+                                "stage": "embedding",
+                                "chunks_total": chunks_total,
+                                "chunks_embedded": (already_embedded + embedded_count)
+                                // len(specs),
+                                "throughput": round(embedded_count / elapsed, 3),
+                                "notes": notes,
+                            },
+                        )
+                    db.commit()
 
-            # Chunk
-            chunk_specs = chunk_extracted(extracted, max_chars=max_chars)
-            chunk_rows = self.upsert_chunks(
-                db=db,
-                tenant_id=tenant_id,
-                doc_id=doc_id,
-                version_id=version.version_id,
-                chunk_specs=chunk_specs,
-            )
+            # Finalize only once every chunk has its embedding(s)
+            for spec in specs:
+                if self.count_missing_embeddings(db, version.version_id, spec.model_key):
+                    raise RuntimeError(
+                        f"Some chunks are still missing {spec.model_key} embeddings"
+                    )
 
-            # Embeddings
-            embedded_count = await self.embed_and_persist(
-                db=db,
-                tenant_id=tenant_id,
-                chunks=chunk_rows,
-                embedding_service=embedding_service,
-            )
+                # document-level vector for the first stage of hierarchical retrieval
+                await asyncio.to_thread(
+                    self.upsert_document_embedding,
+                    db,
+                    tenant_id,
+                    doc_id,
+                    version.version_id,
+                    spec,
+                )
 
-            # Finalize
+            if job_id:
+                jobs.save_checkpoint(
+                    db,
+                    job_id,
+                    {
+                        "version_id": version.version_id,
+                        "stage": "done",
+                        "chunks_total": chunks_total,
+                        "chunks_embedded": chunks_total,
+                        "notes": notes,
+                    },
+                )
+            doc = db.get(Document, doc_id)
             doc.status = "ready"
+            # answers cached while the chunks were being rewritten (same
+            # chunk/version ids, so same chunk_key) go with the ready flip
+            answer_cache.invalidate_document(db, doc_id)
             db.commit()
 
             return {
                 "doc_id": doc_id,
                 "version_id": version.version_id,
                 "status": doc.status,
-                "chunks": len(chunk_rows),
+                "chunks": chunks_total,
                 "embedded": embedded_count,
-                "notes": {
-                    "method": extracted.method,
-                    "ocr_needed": extracted.structure.get("extraction", {}).get(
-                        "ocr_needed", False
-                    ),
-                    "stats": extracted.structure.get("stats", {}),
-                },
+                "notes": {**notes, "resumed": resumed},
             }
 
         except Exception as e:
+            # only the uncommitted batch is lost; a retry resumes from checkpoint
             db.rollback()
             # mark failed
             doc = db.get(Document, doc_id)
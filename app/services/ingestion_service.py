@@ -1,6 +1,104 @@
 import hashlib
+import io
+from typing import BinaryIO
+
+import oracledb
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from models.Models import Document, DocumentVersion, DocumentBlob
+
+from core.config import settings
+from core.metrics import registry
+from models.Models import Document, DocumentVersion
+from services.answer_cache import answer_cache
+
+dedup_uploads = registry.counter(
+    "dedup_uploads_total", "Uploads served from an identical ready document"
+)
+dedup_bytes_saved = registry.counter(
+    "dedup_bytes_saved_total", "Blob bytes not stored/extracted thanks to dedup"
+)
+dedup_embeddings_saved = registry.counter(
+    "dedup_embedding_calls_saved_total", "Chunk embeddings copied instead of computed"
+)
+
+COPY_TEXT_SQL = text(
+    """
+INSERT INTO document_text (version_id, extracted_text, structure_json, created_at)
+SELECT :new_version_id, extracted_text, structure_json, SYSTIMESTAMP
+FROM document_text
+WHERE version_id = :src_version_id
+"""
+)
+
+COPY_CHUNKS_SQL = text(
+    """
+INSERT INTO document_chunks
+  (version_id, doc_id, tenant_id, chunk_index, page_start, page_end,
+   section_path, token_count, chunk_text, created_at)
+SELECT :new_version_id, :doc_id, :tenant_id, chunk_index, page_start, page_end,
+       section_path, token_count, chunk_text, SYSTIMESTAMP
+FROM document_chunks
+WHERE version_id = :src_version_id
+"""
+)
+
+# map old -> new chunk by chunk_index; vectors never leave the database
+COPY_EMBEDDINGS_SQL = text(
+    """
+INSERT INTO chunk_embeddings
+  (chunk_id, tenant_id, embedding_model_id, embedding_dim, embedding_format,
+   embedding, embedding_full, created_at)
+SELECT nc.chunk_id, :tenant_id, e.embedding_model_id, e.embedding_dim, e.embedding_format,
+       e.embedding, e.embedding_full, SYSTIMESTAMP
+FROM document_chunks oc
+JOIN chunk_embeddings e ON e.chunk_id = oc.chunk_id
+JOIN document_chunks nc
+  ON nc.version_id = :new_version_id
+ AND nc.chunk_index = oc.chunk_index
+WHERE oc.version_id = :src_version_id
+"""
+)
+
+
+# centroids for hierarchical retrieval, one per embedding model
+COPY_DOC_EMBEDDINGS_SQL = text(
+    """
+INSERT INTO document_embeddings
+  (doc_id, version_id, tenant_id, embedding_model_id, embedding_dim,
+   chunk_count, embedding, created_at)
+SELECT :doc_id, :new_version_id, :tenant_id, embedding_model_id, embedding_dim,
+       chunk_count, embedding, SYSTIMESTAMP
+FROM document_embeddings
+WHERE version_id = :src_version_id
+"""
+)
+
+# blob-owning versions of a document and the copy (in another document)
+# that inherits each blob
+BLOB_HEIRS_SQL = text(
+    """
+SELECT v.version_id AS owner_id,
+       (SELECT MIN(r.version_id) FROM document_versions r
+         WHERE r.content_version_id = v.version_id
+           AND r.doc_id <> :doc_id) AS heir_id
+FROM document_versions v
+WHERE v.doc_id = :doc_id
+  AND v.content_version_id IS NULL
+"""
+)
+
+MOVE_BLOB_SQL = text(
+    "UPDATE document_blobs SET version_id = :heir_id WHERE version_id = :owner_id"
+)
+
+REPOINT_COPIES_SQL = text(
+    """
+UPDATE document_versions
+SET content_version_id = CASE WHEN version_id = :heir_id THEN NULL ELSE :heir_id END
+WHERE content_version_id = :owner_id
+  AND doc_id <> :doc_id
+"""
+)
 
 
 def sha256_bytes(b: bytes) -> str:
@@ -9,7 +107,166 @@ def sha256_bytes(b: bytes) -> str:
     return h.hexdigest()
 
 
+def sha256_fileobj(f: BinaryIO, chunk_size: int | None = None) -> str:
+    """Incremental SHA-256 of a seekable file; leaves it rewound."""
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_BYTES
+    h = hashlib.sha256()
+    f.seek(0)
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            break
+        h.update(data)
+    f.seek(0)
+    return h.hexdigest()
+
+
 class IngestionService:
+    def write_blob_stream(
+        self,
+        db: Session,
+        version_id: int,
+        fileobj: BinaryIO,
+        chunk_size: int | None = None,
+    ) -> int:
+        """
+        Inserts the document_blobs row with an EMPTY_BLOB() and writes the
+        content through the returned LOB locator piece by piece, so the whole
+        file is never bound as one value. Runs on the session's connection,
+        i.e. inside the caller's transaction. Returns bytes written.
+        """
+        raw = db.connection().connection.driver_connection
+        cur = raw.cursor()
+        try:
+            lob_var = cur.var(oracledb.DB_TYPE_BLOB)
+            cur.execute(
+                """
+                INSERT INTO document_blobs (version_id, blob_data)
+                VALUES (:version_id, EMPTY_BLOB())
+                RETURNING blob_data INTO :lob
+                """,
+                version_id=version_id,
+                lob=lob_var,
+            )
+            lob = lob_var.getvalue()[0]
+
+            # write in multiples of the LOB chunk size to avoid partial blocks
+            lob_chunk = lob.getchunksize() or 8192
+            step = max(1, (chunk_size or settings.UPLOAD_CHUNK_BYTES) // lob_chunk)
+            step *= lob_chunk
+
+            offset = 1  # LOB offsets are 1-based
+            while True:
+                data = fileobj.read(step)
+                if not data:
+                    break
+                lob.write(data, offset)
+                offset += len(data)
+            return offset - 1
+        finally:
+            cur.close()
+
+    def find_ready_duplicate(
+        self, db: Session, tenant_id: int, digest: str
+    ) -> DocumentVersion | None:
+        """
+        Earliest version in the tenant with this content hash whose document
+        finished ingesting ('ready' implies every chunk is embedded).
+        """
+        return (
+            db.query(DocumentVersion)
+            .join(Document, Document.doc_id == DocumentVersion.doc_id)
+            .filter(
+                Document.tenant_id == tenant_id,
+                Document.status == "ready",
+                DocumentVersion.sha256 == digest,
+            )
+            .order_by(DocumentVersion.created_at.asc())
+            .first()
+        )
+
+    def create_deduplicated_document(
+        self,
+        db: Session,
+        tenant_id: int,
+        owner_user_id: int,
+        filename: str | None,
+        mime_type: str | None,
+        title: str | None,
+        source: DocumentVersion,
+        size_bytes: int = 0,
+    ) -> tuple[Document, DocumentVersion]:
+        """
+        Creates a ready document whose version references `source`'s blob
+        and gets server-side copies of its document_text, chunks, chunk
+        embeddings and document embeddings. No blob write, extraction or
+        embedding call happens, so no ingest job is needed.
+        """
+        doc = Document(
+            tenant_id=tenant_id,
+            owner_user_id=owner_user_id,
+            title=title or filename,
+            filename=filename,
+            mime_type=mime_type,
+            sha256=source.sha256,
+            status="ready",
+        )
+        db.add(doc)
+        db.flush()  # get doc_id
+
+        version = DocumentVersion(
+            doc_id=doc.doc_id,
+            version_num=1,
+            sha256=source.sha256,
+            content_version_id=source.content_version_id or source.version_id,
+        )
+        db.add(version)
+        db.flush()  # get version_id
+
+        binds = {
+            "new_version_id": version.version_id,
+            "src_version_id": source.version_id,
+            "doc_id": doc.doc_id,
+            "tenant_id": tenant_id,
+        }
+        db.execute(COPY_TEXT_SQL, binds)
+        db.execute(COPY_CHUNKS_SQL, binds)
+        copied = db.execute(COPY_EMBEDDINGS_SQL, binds).rowcount or 0
+        db.execute(COPY_DOC_EMBEDDINGS_SQL, binds)
+
+        db.commit()
+        db.refresh(doc)
+        db.refresh(version)
+
+        dedup_uploads.inc(tenant_id=tenant_id)
+        dedup_bytes_saved.inc(size_bytes, tenant_id=tenant_id)
+        dedup_embeddings_saved.inc(copied, tenant_id=tenant_id)
+        return doc, version
+
+    def delete_document(self, db: Session, tenant_id: int, doc_id: int) -> bool:
+        """
+        Deletes a document and everything cascading from it. Blobs that
+        deduplicated uploads still read are handed to the oldest such copy
+        first (no bytes move: the blob row is re-keyed), so deleting the
+        original never breaks or blocks its copies.
+        """
+        doc = db.get(Document, doc_id)
+        if not doc or doc.tenant_id != tenant_id:
+            return False
+
+        binds = {"doc_id": doc_id}
+        for r in db.execute(BLOB_HEIRS_SQL, binds).mappings().all():
+            if r["heir_id"] is None:
+                continue
+            moved = {**binds, "owner_id": r["owner_id"], "heir_id": r["heir_id"]}
+            db.execute(MOVE_BLOB_SQL, moved)
+            db.execute(REPOINT_COPIES_SQL, moved)
+
+        answer_cache.invalidate_document(db, doc_id)
+        db.execute(text("DELETE FROM documents WHERE doc_id = :doc_id"), binds)
+        db.commit()
+        return True
+
     def create_document_with_version(
         self,
         db: Session,
@@ -18,9 +275,22 @@ class IngestionService:
         filename: str | None,
         mime_type: str | None,
         title: str | None,
-        file_bytes: bytes,
+        file_bytes: bytes | None = None,
+        fileobj: BinaryIO | None = None,
+        digest: str | None = None,
     ) -> tuple[Document, DocumentVersion]:
-        digest = sha256_bytes(file_bytes)
+        """
+        Pass either file_bytes or a seekable fileobj (e.g. the spooled upload).
+        digest may be precomputed by a caller that already hashed while
+        streaming; otherwise it is computed incrementally here.
+        """
+        if fileobj is None:
+            if file_bytes is None:
+                raise ValueError("file_bytes or fileobj is required")
+            fileobj = io.BytesIO(file_bytes)
+        if digest is None:
+            digest = sha256_fileobj(fileobj)
+        fileobj.seek(0)
 
         doc = Document(
             tenant_id=tenant_id,
@@ -42,11 +312,7 @@ class IngestionService:
         db.add(version)
         db.flush()  # get version_id
 
-        blob = DocumentBlob(
-            version_id=version.version_id,
-            blob_data=file_bytes,
-        )
-        db.add(blob)
+        self.write_blob_stream(db, version.version_id, fileobj)
 
         db.commit()
         db.refresh(doc)
@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+import json
+from typing import Any, Dict
+
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from datetime import datetime
+from sqlalchemy import func, select
 from models.Models import DocumentJob, DocumentVersion
 
+PROGRESS_FIELDS = (
+    "stage",
+    "chunks_total",
+    "chunks_embedded",
+    "bytes_processed",
+    "throughput",
+)
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+
 
 class JobService:
     def enqueue_ingest(self, db: Session, tenant_id: int, doc_id: int) -> DocumentJob:
@@ -39,3 +50,40 @@ class JobService:
             .filter(DocumentJob.job_id == job_id, DocumentJob.tenant_id == tenant_id)
             .first()
         )
+
+    def load_checkpoint(self, db: Session, job_id: int) -> Dict[str, Any]:
+        job = db.get(DocumentJob, job_id)
+        if not job or not job.checkpoint_json:
+            return {}
+        try:
+            return json.loads(job.checkpoint_json)
+        except ValueError:
+            return {}
+
+    def save_checkpoint(
+        self, db: Session, job_id: int, checkpoint: Dict[str, Any]
+    ) -> None:
+        """
+        Stages the checkpoint on the caller's transaction so it commits
+        atomically with the work it describes.
+        """
+        job = db.get(DocumentJob, job_id)
+        if not job:
+            return
+        job.checkpoint_json = json.dumps(checkpoint)
+        self.update_progress(db, job_id, **checkpoint)
+
+    def update_progress(self, db: Session, job_id: int, **progress: Any) -> None:
+        """
+        Sets any of PROGRESS_FIELDS on the job (unknown keys are ignored).
+        Like save_checkpoint, it does not commit.
+        """
+        job = db.get(DocumentJob, job_id)
+        if not job:
+            return
+        for k, v in progress.items():
+            if k in PROGRESS_FIELDS:
+                setattr(job, k, v)
+        # same clock as the worker's SQL (SYSTIMESTAMP), so long-poll
+        # `since` comparisons see every change
+        job.updated_at = func.systimestamp()
@@ -1,44 +1,131 @@
 import httpx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
+
+from core.config import settings
+from core.metrics import registry
+
+_TOKEN_BUCKETS = (0, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+chat_prefill_tokens = registry.histogram(
+    "chat_prefill_tokens",
+    "Prompt tokens the model evaluated per chat call (KV-cached prefix excluded)",
+    buckets=_TOKEN_BUCKETS,
+)
+chat_prefill_seconds = registry.histogram(
+    "chat_prefill_seconds", "Prompt evaluation time per chat call"
+)
+model_load_seconds = registry.histogram(
+    "ollama_model_load_seconds", "Model load time reported by Ollama per call"
+)
+
+
+def _keep_alive() -> Union[str, int]:
+    # Ollama takes a duration string ("30m") or seconds (-1 = never unload)
+    v = settings.OLLAMA_KEEP_ALIVE.strip()
+    return int(v) if v.lstrip("-").isdigit() else v
 
 
 class OllamaClient:
+    # num_ctx each chat model was last loaded with (process-wide). A different
+    # num_ctx makes Ollama reload the runner and drop its KV cache, so we only
+    # ever grow it, up to CHAT_MAX_CTX.
+    _loaded_ctx: Dict[str, int] = {}
+
     def __init__(self, base_url: str):
         self.base_url = base_url.rstrip("/")
 
+    def _ratchet_ctx(self, model: str, num_ctx: int) -> int:
+        num_ctx = min(
+            max(int(num_ctx), self._loaded_ctx.get(model, 0)), settings.CHAT_MAX_CTX
+        )
+        self._loaded_ctx[model] = num_ctx
+        return num_ctx
+
     async def embed(self, model: str, text: str) -> List[float]:
         # Ollama embeddings endpoint
         async with httpx.AsyncClient(timeout=120) as client:
             r = await client.post(
                 f"{self.base_url}/api/embeddings",
-                json={"model": model, "prompt": text},
+                json={"model": model, "prompt": text, "keep_alive": _keep_alive()},
             )
             r.raise_for_status()
             data = r.json()
             return data["embedding"]
 
-    async def chat(self, model: str, messages: List[Dict[str, str]]) -> str:
+    async def embed_batch(self, model: str, texts: List[str]) -> List[List[float]]:
+        # /api/embed takes a list of inputs and embeds them in one forward pass
+        async with httpx.AsyncClient(timeout=300) as client:
+            r = await client.post(
+                f"{self.base_url}/api/embed",
+                json={"model": model, "input": texts, "keep_alive": _keep_alive()},
+            )
+            r.raise_for_status()
+            data = r.json()
+            return data["embeddings"]
+
+    async def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        num_ctx: Optional[int] = None,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> str:
         # Non-streaming for MVP
+        opts: Dict[str, Any] = {
+            "think": True,
+            "reasoning": "high",
+            "temperature": 0.3,
+            "thinking": True,
+            **(options or {}),
+        }
+        if num_ctx:
+            num_ctx = self._ratchet_ctx(model, num_ctx)
+            opts["num_ctx"] = num_ctx
         async with httpx.AsyncClient(timeout=300) as client:
-            print("building ollama post...", messages)
+            print("building ollama post...", model, num_ctx, len(messages))
             r = await client.post(
-                # TODO: fix vars
-                "http://localhost:11434/api/chat",
+                f"{self.base_url}/api/chat",
                 json={
-                    "model": "gpt-oss:20b",
+                    "model": model,
                     "messages": messages,
                     "stream": False,
-                    "options": {
-                        "num_ctx": 8192,
-                        "think": True,
-                        "reasoning": "high",
-                        "temperature": 0.3,
-                        "thinking": True,
-                    },
+                    "options": opts,
+                    "keep_alive": _keep_alive(),
                 },
-                # {"model": model, "messages": messages, "stream": False},
             )
             r.raise_for_status()
             data = r.json()
+            self._record_timings(model, data)
             # Ollama returns: {"message": {"role": "...", "content": "..."}, ...}
             return data["message"]["content"]
+
+    async def warmup_chat(self, model: str, num_ctx: Optional[int] = None) -> None:
+        # an empty message list loads the model without generating
+        opts: Dict[str, Any] = {}
+        if num_ctx:
+            num_ctx = self._ratchet_ctx(model, num_ctx)
+            opts["num_ctx"] = num_ctx
+        async with httpx.AsyncClient(timeout=600) as client:
+            r = await client.post(
+                f"{self.base_url}/api/chat",
+                json={
+                    "model": model,
+                    "messages": [],
+                    "options": opts,
+                    "keep_alive": _keep_alive(),
+                },
+            )
+            r.raise_for_status()
+            self._record_timings(model, r.json())
+
+    async def warmup_embedding(self, model: str) -> None:
+        await self.embed_batch(model, ["warmup"])
+
+    def _record_timings(self, model: str, data: Dict[str, Any]) -> None:
+        # Ollama durations are nanoseconds
+        if data.get("prompt_eval_count") is not None:
+            chat_prefill_tokens.observe(int(data["prompt_eval_count"]), model=model)
+        if data.get("prompt_eval_duration"):
+            chat_prefill_seconds.observe(data["prompt_eval_duration"] / 1e9, model=model)
+        if data.get("load_duration"):
+            model_load_seconds.observe(data["load_duration"] / 1e9, model=model)
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from core.config import settings
+from services.tokenizer import count_tokens
+
+# Per-message framing the chat template adds around content (role tags etc.)
+_MESSAGE_OVERHEAD_TOKENS = 4
+# Don't bother keeping a truncated turn shorter than this
+_MIN_COMPRESSED_TURN_TOKENS = 48
+# num_ctx changes make Ollama reload the model, so snap to a few sizes
+_NUM_CTX_STEPS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+SYSTEM_PROMPT = (
+    "You are a private enterprise RAG assistant.\n"
+    "Use ONLY the provided CONTEXT to answer.\n"
+    "If the answer is not in the context, say you don't know.\n"
+    "Cite sources like [doc_id:chunk_id] after the sentence(s) they support."
+)
+
+
+@dataclass
+class PromptPlan:
+    messages: List[Dict[str, str]]
+    num_ctx: int
+    prompt_tokens: int
+    context_tokens: int
+    history_tokens: int
+    used_hits: List[Dict[str, Any]] = field(default_factory=list)
+    dropped_hits: int = 0
+    deduped_hits: int = 0
+    dropped_turns: int = 0
+    compressed_turns: int = 0
+
+
+def _pages(h: Dict[str, Any]) -> Tuple[int, int]:
+    start = h.get("page_start")
+    end = h.get("page_end") if h.get("page_end") is not None else start
+    return int(start or 0), int(end or 0)
+
+
+def _format_block(h: Dict[str, Any], body: str) -> str:
+    cite = f"[{h.get('doc_id')}:{h.get('chunk_id')}]"
+    meta = []
+    page_start, page_end = h.get("page_start"), h.get("page_end")
+    if page_start is not None:
+        meta.append(
+            f"p{page_start}"
+            + (f"-{page_end}" if page_end and page_end != page_start else "")
+        )
+    if h.get("section_path"):
+        meta.append(h["section_path"])
+    meta_str = " | ".join(meta)
+    header = f"{cite} ({meta_str})" if meta_str else cite
+    return f"{header}\n{body}"
+
+
+def _truncate_to_tokens(text: str, tokens: int, n_tokens: int) -> str:
+    # proportional cut; the tokenizer is only consulted once per turn
+    keep = max(1, int(len(text) * tokens / max(1, n_tokens) * 0.95))
+    return text[:keep].rstrip() + "…"
+
+
+def pick_num_ctx(tokens_needed: int, cap: Optional[int] = None) -> int:
+    cap = cap or settings.CHAT_MAX_CTX
+    for step in _NUM_CTX_STEPS:
+        if step >= tokens_needed and step >= settings.CHAT_MIN_CTX:
+            return min(step, cap)
+    return cap
+
+
+class PromptBuilder:
+    """
+    Assembles the /api/chat messages inside a token budget:
+    CHAT_MAX_CTX minus the response reserve is split between retrieved
+    context (CHAT_CONTEXT_SHARE, unused share flows to history) and prior
+    turns. Context hits go in rank order with overlapping text from the same
+    document pages removed; history keeps the newest turns and drops or
+    truncates the oldest. num_ctx is sized to the prompt actually built.
+    Messages are ordered system, history, then summary + context + query in
+    the final user message: the summary is rewritten most turns, so it stays
+    out of the part consecutive requests can share.
+    """
+
+    def __init__(
+        self,
+        max_ctx: Optional[int] = None,
+        response_tokens: Optional[int] = None,
+        context_share: Optional[float] = None,
+    ):
+        self.max_ctx = max_ctx or settings.CHAT_MAX_CTX
+        self.response_tokens = (
+            response_tokens
+            if response_tokens is not None
+            else settings.CHAT_RESPONSE_TOKENS
+        )
+        self.context_share = (
+            context_share if context_share is not None else settings.CHAT_CONTEXT_SHARE
+        )
+
+    def dedupe_hits(
+        self, hits: Sequence[Dict[str, Any]]
+    ) -> Tuple[List[Tuple[Dict[str, Any], str, int]], int]:
+        """
+        Drops sentences already seen in a higher-ranked chunk of the same
+        document whose pages overlap (chunk overlap, re-chunked versions).
+        Returns ([(hit, body, tokens)], deduped_count).
+        """
+        seen: Dict[Tuple[int, int], Set[str]] = {}  # (doc_id, page) -> sentences
+        out: List[Tuple[Dict[str, Any], str, int]] = []
+        deduped = 0
+        for h in hits:
+            body = (h.get("chunk_text") or "").strip()
+            if not body:
+                continue
+            doc_id = int(h.get("doc_id") or 0)
+            p0, p1 = _pages(h)
+            pages = range(p0, p1 + 1)
+
+            known: Set[str] = set()
+            for p in pages:
+                known |= seen.get((doc_id, p), set())
+
+            sentences = [s.strip() for s in _SENTENCE_RE.split(body) if s.strip()]
+            tokens = h.get("token_count")
+            if known:
+                kept = [s for s in sentences if s not in known]
+                if not kept:
+                    deduped += 1
+                    continue
+                if len(kept) != len(sentences):
+                    deduped += 1
+                    body = "… " + " ".join(kept)
+                    tokens = None
+            if tokens is None:
+                tokens = count_tokens(body)
+
+            for p in pages:
+                seen.setdefault((doc_id, p), set()).update(sentences)
+            out.append((h, body, int(tokens)))
+        return out, deduped
+
+    def build(
+        self,
+        query: str,
+        hits: Sequence[Dict[str, Any]],
+        history: Sequence[Any],
+        system_prompt: str = SYSTEM_PROMPT,
+        summary: Optional[str] = None,
+    ) -> PromptPlan:
+        """
+        `history` is oldest-first; items need .role and .content. `summary`
+        is the rolling conversation summary covering turns before `history`.
+        """
+        fixed = (
+            count_tokens(system_prompt)
+            + count_tokens(query)
+            + 2 * _MESSAGE_OVERHEAD_TOKENS
+        )
+        available = max(0, self.max_ctx - self.response_tokens - fixed)
+
+        # 1) context
+        context_budget = int(available * self.context_share)
+        candidates, deduped = self.dedupe_hits(hits)
+        blocks: List[str] = []
+        used_hits: List[Dict[str, Any]] = []
+        context_tokens = 0
+        dropped_hits = 0
+        for h, body, n in candidates:
+            block = _format_block(h, body)
+            # header + separator on top of the chunk body
+            n += count_tokens(block[: len(block) - len(body)]) + 3
+            if context_tokens + n > context_budget:
+                dropped_hits += 1
+                continue
+            blocks.append(block)
+            used_hits.append(h)
+            context_tokens += n
+        if blocks:
+            context_tokens += _MESSAGE_OVERHEAD_TOKENS + 2
+
+        # 2) history, newest first, with whatever the context left over
+        history_budget = available - context_tokens
+        turns: List[Dict[str, str]] = []
+        history_tokens = 0
+        summary_block: Optional[str] = None
+        if summary:
+            content = f"CONVERSATION SUMMARY (earlier turns):\n{summary}"
+            n = count_tokens(content) + 2
+            if n <= history_budget:
+                summary_block = content
+                history_tokens += n
+        dropped_turns = 0
+        compressed_turns = 0
+        older = [m for m in history if m.role in ("user", "assistant", "system")]
+        for i in range(len(older) - 1, -1, -1):
+            m = older[i]
+            content = m.content or ""
+            n = count_tokens(content) + _MESSAGE_OVERHEAD_TOKENS
+            remaining = history_budget - history_tokens
+            if n > remaining:
+                room = remaining - _MESSAGE_OVERHEAD_TOKENS
+                if room >= _MIN_COMPRESSED_TURN_TOKENS:
+                    content = _truncate_to_tokens(content, room, n)
+                    turns.append({"role": m.role, "content": content})
+                    history_tokens += room + _MESSAGE_OVERHEAD_TOKENS
+                    compressed_turns += 1
+                    i -= 1
+                dropped_turns = i + 1
+                break
+            turns.append({"role": m.role, "content": content})
+            history_tokens += n
+        turns.reverse()
+
+        # Most stable parts first so Ollama can reuse the KV cache: the system
+        # prompt and the older turns repeat from the previous request. Turns
+        # are replayed as stored (user turns without the context they were
+        # sent with), so the shared prefix ends at the previous user turn;
+        # the summary changes almost every turn and goes in the last message.
+        messages: List[Dict[str, str]] = [{"role": "system", "content": system_prompt}]
+        messages.extend(turns)
+        parts: List[str] = []
+        if summary_block:
+            parts.append(summary_block)
+        if blocks:
+            parts.append("CONTEXT:\n" + "\n\n---\n\n".join(blocks))
+        if parts:
+            query_content = "\n\n".join(parts) + f"\n\nQUESTION:\n{query}"
+        else:
+            query_content = query
+        messages.append({"role": "user", "content": query_content})
+
+        prompt_tokens = fixed + context_tokens + history_tokens
+        return PromptPlan(
+            messages=messages,
+            num_ctx=pick_num_ctx(prompt_tokens + self.response_tokens, self.max_ctx),
+            prompt_tokens=prompt_tokens,
+            context_tokens=context_tokens,
+            history_tokens=history_tokens,
+            used_hits=used_hits,
+            dropped_hits=dropped_hits,
+            deduped_hits=deduped,
+            dropped_turns=dropped_turns,
+            compressed_turns=compressed_turns,
+        )
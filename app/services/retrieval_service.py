@@ -5,25 +5,58 @@ from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional, Tuple
 import re
 
+from core.config import settings
+from core.db import bind_num_list
+from services import vector_codec
+from services.acl_service import Visibility
+from services.embedding_models import EmbeddingModelSpec, default_spec
+from services.tokenizer import count_tokens_batch
+
 
 _ORA_TEXT_BAD = re.compile(r"""[(){}\[\]"'~|&!?:\\/]""")
 
+_CHUNK_COLUMNS = """
+            c.chunk_id,
+            c.doc_id,
+            c.version_id,
+            c.page_start,
+            c.page_end,
+            c.section_path,
+            c.token_count,
+            c.chunk_text"""
+
 
 class RetrievalService:
-    def _doc_filter_sql(self, doc_ids: Optional[List[int]]) -> Tuple[str, dict]:
+    # Ingestion commits chunks and embeddings in batches, so every search
+    # joins documents and only returns documents that finished ("ready").
+
+    def _doc_filter_sql(
+        self,
+        db: Session,
+        doc_ids: Optional[List[int]],
+        visibility: Optional[Visibility] = None,
+    ) -> Tuple[str, dict]:
+        """
+        One SQL text per case (no filter / empty / any number of ids), so
+        the vector and text queries reuse a single cached cursor and long
+        selections don't run into the 1000-item IN list limit.
+        With `visibility`, explicit doc_ids are narrowed in memory; without
+        them the visibility set itself becomes the prefilter.
+        """
+        if visibility is not None:
+            if doc_ids is None:
+                return visibility.filter_sql(db)
+            doc_ids = visibility.filter(doc_ids)
         if doc_ids is None:
             return "1=1", {}
         if len(doc_ids) == 0:
             # caller explicitly passed empty list -> match nothing
             return "1=0", {}
 
-        binds = {}
-        placeholders = []
-        for i, d in enumerate(doc_ids):
-            key = f"d{i}"
-            placeholders.append(f":{key}")
-            binds[key] = int(d)
-        return f"c.doc_id IN ({', '.join(placeholders)})", binds
+        return (
+            "c.doc_id IN (SELECT ids.COLUMN_VALUE FROM TABLE(:doc_ids) ids)",
+            {"doc_ids": bind_num_list(db, doc_ids)},
+        )
 
     def vector_search(
         self,
@@ -32,52 +65,168 @@ class RetrievalService:
         query_vec: List[float],
         doc_ids: Optional[List[int]],
         k: int,
-        embedding_model_id: str = "qwen3-embedding",
-        embedding_dim: int = 4096,
+        spec: Optional[EmbeddingModelSpec] = None,
+        visibility: Optional[Visibility] = None,
+        precision: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
-        doc_filter_sql, doc_binds = self._doc_filter_sql(doc_ids)
+        """
+        Searches the `spec` model's embeddings (default: the Settings model);
+        query_vec must come from that model.
+        `precision` (default settings.RETRIEVAL_PRECISION) matters only when
+        the stored search representation is compact (int8/binary or
+        truncated, see vector_codec): "compact" ranks on it alone, "rerank"
+        shortlists k * RERANK_SHORTLIST_FACTOR on it and reorders them by
+        full-precision distance, "full" scans embedding_full (exact). Rows
+        stored without embedding_full (EMBEDDING_KEEP_FULL off when they
+        were written) fall back to their compact distance in both.
+        vector_distance is a cosine distance in every case.
+        """
+        doc_filter_sql, doc_binds = self._doc_filter_sql(db, doc_ids, visibility)
 
-        sql = text(
-            f"""
-        SELECT * FROM (
-          SELECT
-            c.chunk_id,
-            c.doc_id,
-            c.page_start,
-            c.page_end,
-            c.section_path,
-            c.chunk_text,
-            VECTOR_DISTANCE(e.embedding, :query_vec, COSINE) AS vector_distance
+        spec = spec or default_spec()
+        fmt = spec.storage_format
+        dim = spec.search_dim
+        precision = precision or settings.RETRIEVAL_PRECISION
+        if not spec.is_compact:
+            precision = "compact"
+        metric = vector_codec.distance_metric(fmt)
+
+        where = f"""
           FROM chunk_embeddings e
           JOIN document_chunks c ON c.chunk_id = e.chunk_id
+          JOIN documents d ON d.doc_id = c.doc_id AND d.status = 'ready'
           WHERE e.tenant_id = :tenant_id
             AND c.tenant_id = :tenant_id
             AND e.embedding_model_id = :embedding_model_id
             AND e.embedding_dim = :embedding_dim
-            AND {doc_filter_sql}
+            AND e.embedding_format = :embedding_format
+            AND {doc_filter_sql}"""
+        params = {
+            "tenant_id": tenant_id,
+            "k": int(k),
+            "embedding_model_id": spec.model_key,
+            "embedding_dim": dim,
+            "embedding_format": fmt,
+            **doc_binds,
+        }
+
+        if precision == "full":
+            compact_sql = vector_codec.cosine_distance_sql(
+                f"VECTOR_DISTANCE(e.embedding, :query_vec, {metric})", fmt, dim
+            )
+            sql = f"""
+        SELECT * FROM (
+          SELECT {_CHUNK_COLUMNS},
+            COALESCE(
+              VECTOR_DISTANCE(e.embedding_full, :query_full, COSINE), {compact_sql}
+            ) AS vector_distance
+          {where}
           ORDER BY vector_distance ASC
         )
         WHERE ROWNUM <= :k
         """
+            params["query_vec"] = vector_codec.encode(query_vec, fmt, dim)
+            params["query_full"] = array.array("f", query_vec)
+        elif precision == "rerank":
+            # one round trip: compact shortlist, then exact distances on it
+            sql = f"""
+        SELECT * FROM (
+          SELECT s.*,
+            COALESCE(
+              VECTOR_DISTANCE(f.embedding_full, :query_full, COSINE),
+              {vector_codec.cosine_distance_sql("s.compact_distance", fmt, dim)}
+            ) AS vector_distance
+          FROM (
+            SELECT * FROM (
+              SELECT {_CHUNK_COLUMNS},
+                VECTOR_DISTANCE(e.embedding, :query_vec, {metric})
+                  AS compact_distance
+              {where}
+              ORDER BY compact_distance ASC
+            )
+            WHERE ROWNUM <= :shortlist
+          ) s
+          JOIN chunk_embeddings f
+            ON f.chunk_id = s.chunk_id AND f.embedding_model_id = :embedding_model_id
+          ORDER BY vector_distance ASC
         )
+        WHERE ROWNUM <= :k
+        """
+            params["query_vec"] = vector_codec.encode(query_vec, fmt, dim)
+            params["query_full"] = array.array("f", query_vec)
+            params["shortlist"] = int(k) * max(1, settings.RERANK_SHORTLIST_FACTOR)
+        else:
+            sql = f"""
+        SELECT * FROM (
+          SELECT {_CHUNK_COLUMNS},
+            VECTOR_DISTANCE(e.embedding, :query_vec, {metric}) AS vector_distance
+          {where}
+          ORDER BY vector_distance ASC
+        )
+        WHERE ROWNUM <= :k
+        """
+            params["query_vec"] = vector_codec.encode(query_vec, fmt, dim)
 
-        vec = array.array("f", query_vec)
-        params = {
-            "tenant_id": tenant_id,
-            "query_vec": vec,
-            "k": int(k),
-            "embedding_model_id": embedding_model_id,
-            "embedding_dim": int(embedding_dim),
-            **doc_binds,
-        }
-        rows = db.execute(sql, params).mappings().all()
+        rows = db.execute(text(sql), params).mappings().all()
         out = []
         for r in rows:
             d = dict(r)
+            if precision == "compact":
+                d["vector_distance"] = vector_codec.to_cosine_distance(
+                    d["vector_distance"], fmt, dim
+                )
             d["source"] = "vector"
             out.append(d)
         return out
 
+    def document_search(
+        self,
+        db: Session,
+        tenant_id: int,
+        query_vec: List[float],
+        doc_ids: Optional[List[int]],
+        m: int,
+        spec: Optional[EmbeddingModelSpec] = None,
+        visibility: Optional[Visibility] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        First stage of hierarchical retrieval: the `m` documents whose
+        centroid embedding is closest to the query.
+        """
+        doc_filter_sql, doc_binds = self._doc_filter_sql(db, doc_ids, visibility)
+
+        # aliased c so the shared doc_id filters apply unchanged
+        sql = text(
+            f"""
+        SELECT * FROM (
+          SELECT
+            c.doc_id,
+            VECTOR_DISTANCE(c.embedding, :query_vec, COSINE) AS doc_distance
+          FROM document_embeddings c
+          JOIN documents d ON d.doc_id = c.doc_id AND d.status = 'ready'
+          WHERE c.tenant_id = :tenant_id
+            AND c.embedding_model_id = :embedding_model_id
+            AND c.embedding_dim = :embedding_dim
+            AND {doc_filter_sql}
+          ORDER BY doc_distance ASC
+        )
+        WHERE ROWNUM <= :m
+        """
+        )
+
+        # centroids are float32 at the search dim
+        spec = spec or default_spec()
+        dim = spec.search_dim
+        params = {
+            "tenant_id": tenant_id,
+            "query_vec": vector_codec.truncate(query_vec, dim),
+            "m": int(m),
+            "embedding_model_id": spec.model_key,
+            "embedding_dim": dim,
+            **doc_binds,
+        }
+        return [dict(r) for r in db.execute(sql, params).mappings().all()]
+
     def text_search(
         self,
         db: Session,
@@ -85,8 +234,9 @@ class RetrievalService:
         query: str,
         doc_ids: Optional[List[int]],
         k: int,
+        visibility: Optional[Visibility] = None,
     ) -> List[Dict[str, Any]]:
-        doc_filter_sql, doc_binds = self._doc_filter_sql(doc_ids)
+        doc_filter_sql, doc_binds = self._doc_filter_sql(db, doc_ids, visibility)
 
         oracle_q = self._oracle_text_query(query)
         if not oracle_q:
@@ -98,12 +248,15 @@ class RetrievalService:
           SELECT
             c.chunk_id,
             c.doc_id,
+            c.version_id,
             c.page_start,
             c.page_end,
             c.section_path,
+            c.token_count,
             c.chunk_text,
             SCORE(1) AS text_score
           FROM document_chunks c
+          JOIN documents d ON d.doc_id = c.doc_id AND d.status = 'ready'
           WHERE c.tenant_id = :tenant_id
             AND {doc_filter_sql}
             AND CONTAINS(c.chunk_text, :q, 1) > 0
@@ -133,10 +286,43 @@ class RetrievalService:
         k_text: int,
         use_text: bool = True,
         alpha: float = 0.70,  # weight vector similarity more by default
+        token_budget: Optional[int] = None,
+        visibility: Optional[Visibility] = None,
+        mode: Optional[str] = None,
+        top_docs: Optional[int] = None,
+        spec: Optional[EmbeddingModelSpec] = None,
     ) -> List[Dict[str, Any]]:
-        vec_results = self.vector_search(db, tenant_id, query_vec, doc_ids, k_vec)
+        """
+        `spec` is the embedding model query_vec came from (the tenant's
+        active model; default: the Settings model).
+        mode "hierarchical" (default: settings.RETRIEVAL_MODE) narrows the
+        chunk vector search to the `top_docs` documents closest to the query
+        (document_search); text search still covers the full scope.
+        """
+        mode = mode or settings.RETRIEVAL_MODE
+        top_docs = top_docs or settings.RETRIEVAL_TOP_DOCS
+        vec_doc_ids = doc_ids
+        if mode == "hierarchical" and (doc_ids is None or len(doc_ids) > top_docs):
+            docs = self.document_search(
+                db,
+                tenant_id,
+                query_vec,
+                doc_ids,
+                top_docs,
+                spec=spec,
+                visibility=visibility,
+            )
+            # no document embeddings yet (not backfilled): stay flat
+            if docs:
+                vec_doc_ids = [int(d["doc_id"]) for d in docs]
+
+        vec_results = self.vector_search(
+            db, tenant_id, query_vec, vec_doc_ids, k_vec, spec=spec, visibility=visibility
+        )
         text_results = (
-            self.text_search(db, tenant_id, query_text, doc_ids, k_text)
+            self.text_search(
+                db, tenant_id, query_text, doc_ids, k_text, visibility=visibility
+            )
             if use_text
             else []
         )
@@ -185,7 +371,35 @@ class RetrievalService:
 
         out = list(merged.values())
         out.sort(key=lambda x: float(x.get("hybrid_score", 0.0)), reverse=True)
-        return out[: max(k_vec, k_text)]
+        out = out[: max(k_vec, k_text)]
+        if token_budget is not None:
+            out = self.apply_token_budget(out, token_budget)
+        return out
+
+    def apply_token_budget(
+        self, hits: List[Dict[str, Any]], token_budget: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Keeps hits (in rank order) while their stored token_count fits in
+        `token_budget`. A hit too large for what is left is skipped so a
+        smaller, lower-ranked one can still use the space. Chunks not yet
+        backfilled are counted here as a fallback.
+        """
+        uncounted = [h for h in hits if h.get("token_count") is None]
+        if uncounted:
+            counts = count_tokens_batch([h.get("chunk_text") or "" for h in uncounted])
+            for h, n in zip(uncounted, counts):
+                h["token_count"] = n
+
+        out = []
+        remaining = int(token_budget)
+        for h in hits:
+            n = int(h["token_count"])
+            if n > remaining:
+                continue
+            out.append(h)
+            remaining -= n
+        return out
 
     def _oracle_text_query(self, user_query: str) -> str:
         """
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import re
+from typing import Any, List, Optional
+
+from core.config import settings
+
+# Local token counting. Uses tiktoken when it is installed and its encoding
+# is available offline; otherwise a regex approximation that tracks BPE
+# counts closely enough for budgeting (words/punctuation, long words split).
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+_encoder: Any = None
+_encoder_loaded = False
+
+
+def _get_encoder() -> Optional[Any]:
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken  # type: ignore
+
+            _encoder = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+        except Exception:
+            _encoder = None
+    return _encoder
+
+
+def tokenizer_name() -> str:
+    return f"tiktoken:{settings.TOKENIZER_ENCODING}" if _get_encoder() else "regex"
+
+
+def _approx_count(text: str) -> int:
+    return sum(1 + len(t) // 8 for t in _WORD_RE.findall(text))
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _get_encoder()
+    if enc is not None:
+        return len(enc.encode_ordinary(text))
+    return _approx_count(text)
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    enc = _get_encoder()
+    if enc is not None:
+        # encodes in parallel threads inside tiktoken
+        return [len(t) for t in enc.encode_ordinary_batch(texts)]
+    return [_approx_count(t) if t else 0 for t in texts]
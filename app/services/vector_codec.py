@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import array
+import math
+from typing import Sequence
+
+# Compact search representation of embeddings (chunk_embeddings.embedding):
+#   float32  4 bytes/dim   COSINE
+#   int8     1 byte/dim    COSINE   (per-vector scale to [-127, 127])
+#   binary   1 bit/dim     HAMMING  (sign bits, packed 8 per byte)
+# optionally Matryoshka-truncated to the first search_dim dims. Format and
+# dims are per embedding model (services/embedding_models.py).
+# Oracle VECTOR has no FLOAT16 format, so int8 is the 4x step.
+
+FORMATS = ("float32", "int8", "binary")
+_BYTES_PER_DIM = {"float32": 4.0, "int8": 1.0, "binary": 0.125}
+
+
+def check_format(fmt: str) -> str:
+    fmt = (fmt or "").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"embedding storage format must be one of {FORMATS}, got {fmt!r}")
+    return fmt
+
+
+def is_compact(fmt: str, search_dim: int, full_dim: int) -> bool:
+    """True when the search representation differs from the full vector."""
+    return fmt != "float32" or search_dim < full_dim
+
+
+def distance_metric(fmt: str) -> str:
+    return "HAMMING" if fmt == "binary" else "COSINE"
+
+
+def bytes_per_vector(fmt: str, dim: int) -> int:
+    return int(math.ceil(dim * _BYTES_PER_DIM[fmt]))
+
+
+def truncate(vec: Sequence[float], dim: int) -> array.array:
+    """First `dim` dims, re-normalized (Matryoshka embeddings)."""
+    head = vec[:dim]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return array.array("f", (x / norm for x in head))
+
+
+def encode(vec: Sequence[float], fmt: str, dim: int) -> array.array:
+    """Bind value for a VECTOR(dim, fmt) column (or query)."""
+    head = truncate(vec, dim)
+    if fmt == "float32":
+        return head
+    if fmt == "int8":
+        scale = max((abs(x) for x in head), default=0.0) or 1.0
+        return array.array("b", (int(round(x / scale * 127)) for x in head))
+    if fmt == "binary":
+        if dim % 8:
+            raise ValueError(f"binary vectors need a dimension divisible by 8, got {dim}")
+        out = array.array("B", bytes(dim // 8))
+        for i, x in enumerate(head):
+            if x > 0:
+                out[i >> 3] |= 0x80 >> (i & 7)
+        return out
+    raise ValueError(f"unknown vector format {fmt!r}")
+
+
+def decode(vec: Sequence, fmt: str, dim: int) -> array.array:
+    """Approximate float32 vector back from a stored compact one."""
+    if fmt == "binary":
+        return array.array(
+            "f",
+            (1.0 if vec[i >> 3] & (0x80 >> (i & 7)) else -1.0 for i in range(dim)),
+        )
+    return array.array("f", (float(x) for x in vec))
+
+
+def to_cosine_distance(raw: float, fmt: str, dim: int) -> float:
+    """
+    Distances on the compact column in cosine-distance units, so scoring
+    (1 / (1 + d)) means the same for every format. Hamming distance over
+    sign bits estimates the angle: theta ~ pi * hamming / dim.
+    """
+    if fmt == "binary":
+        return 1.0 - math.cos(math.pi * float(raw) / dim)
+    return float(raw)
+
+
+def cosine_distance_sql(expr: str, fmt: str, dim: int) -> str:
+    """to_cosine_distance as a SQL expression over a compact distance."""
+    if fmt == "binary":
+        return f"(1 - COS(ACOS(-1) * ({expr}) / {int(dim)}))"
+    return expr
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+
+from core.config import settings
+from core.db import SessionLocal
+from core.metrics import registry
+from models.Models import MessageCitation, RetrievalEvent
+
+write_behind_depth = registry.gauge(
+    "write_behind_queue_depth", "Rows waiting in the write-behind queue"
+)
+write_behind_rows = registry.counter(
+    "write_behind_rows_total", "Rows written by the write-behind queue"
+)
+write_behind_dropped = registry.counter(
+    "write_behind_dropped_total", "Rows dropped by the write-behind queue"
+)
+write_behind_flush_seconds = registry.histogram(
+    "write_behind_flush_seconds",
+    "Time per write-behind flush",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+# kind -> mapped table; rows are plain column dicts
+TABLES = {
+    "retrieval_event": RetrievalEvent,
+    "message_citation": MessageCitation,
+}
+
+Item = Tuple[str, Dict[str, Any]]
+
+_STOP: Item = ("", {})
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue for append-only rows the chat request doesn't
+    need to wait for (retrieval events, citations). A single loop drains it
+    every WRITE_BEHIND_FLUSH_MS or WRITE_BEHIND_BATCH rows and inserts each
+    table's rows with one executemany, in its own session.
+
+    When the queue is full, WRITE_BEHIND_OVERFLOW decides:
+      "block"       - the submitter waits for room (backpressure, default)
+      "drop_newest" - the new row is dropped
+      "drop_oldest" - the oldest queued row is dropped to make room
+    stop() flushes everything still queued; call it on shutdown.
+    """
+
+    def __init__(self):
+        self.max_items = max(1, settings.WRITE_BEHIND_MAX_ITEMS)
+        self.batch_size = max(1, settings.WRITE_BEHIND_BATCH)
+        self.flush_interval = settings.WRITE_BEHIND_FLUSH_MS / 1000.0
+        self.overflow = settings.WRITE_BEHIND_OVERFLOW
+        self._queue: asyncio.Queue[Item] | None = None
+        self._task: asyncio.Task | None = None
+
+    def _ensure_started(self) -> asyncio.Queue:
+        # started lazily so the queue binds to the running event loop
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.max_items)
+            self._task = asyncio.create_task(self._run())
+        assert self._queue is not None
+        return self._queue
+
+    async def submit(self, kind: str, rows: List[Dict[str, Any]]) -> None:
+        if kind not in TABLES:
+            raise ValueError(f"Unknown write-behind kind: {kind}")
+        queue = self._ensure_started()
+        for row in rows:
+            if self.overflow == "block":
+                await queue.put((kind, row))
+            else:
+                try:
+                    queue.put_nowait((kind, row))
+                except asyncio.QueueFull:
+                    if self.overflow == "drop_oldest":
+                        old_kind, _ = queue.get_nowait()
+                        write_behind_dropped.inc(kind=old_kind, reason="overflow")
+                        queue.put_nowait((kind, row))
+                    else:
+                        write_behind_dropped.inc(kind=kind, reason="overflow")
+        write_behind_depth.set(queue.qsize())
+
+    async def stop(self) -> None:
+        # flush-on-shutdown: the loop writes everything queued ahead of the
+        # sentinel, then exits
+        if self._task and not self._task.done():
+            assert self._queue is not None
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            items: List[Item] = []
+            item = await queue.get()
+            deadline = loop.time() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                else:
+                    items.append(item)
+                if len(items) >= self.batch_size:
+                    break
+                if not queue.empty():
+                    item = queue.get_nowait()
+                    continue
+                if stopping:
+                    break
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(items)
+            if stopping and not queue.empty():
+                stopping = False  # more queued behind a full batch; keep going
+                queue.put_nowait(_STOP)
+
+    async def _flush(self, items: List[Item]) -> None:
+        if not items:
+            return
+        by_kind: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for kind, row in items:
+            by_kind[kind].append(row)
+
+        t0 = time.perf_counter()
+        try:
+            failed = await asyncio.to_thread(self._write, by_kind)
+        except Exception as e:
+            print(f"write-behind flush failed ({len(items)} rows): {e}")
+            for kind, rows in by_kind.items():
+                write_behind_dropped.inc(len(rows), kind=kind, reason="error")
+        else:
+            for kind, rows in by_kind.items():
+                bad = failed.get(kind, 0)
+                if bad:
+                    write_behind_dropped.inc(bad, kind=kind, reason="error")
+                if len(rows) > bad:
+                    write_behind_rows.inc(len(rows) - bad, kind=kind)
+        write_behind_flush_seconds.observe(time.perf_counter() - t0)
+        if self._queue is not None:
+            write_behind_depth.set(self._queue.qsize())
+
+    def _write(self, by_kind: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
+        """
+        Insert every kind's rows and return how many rows per kind were
+        dropped. The whole flush is tried as one transaction first; if that
+        fails each kind, then each row of a failing kind, is retried in its
+        own transaction so one bad row (e.g. a uq_message_chunk violation)
+        loses only itself. Connection failures are raised and drop the flush.
+        """
+        db = SessionLocal()
+        try:
+            try:
+                # events before citations; both only reference committed messages
+                for kind in TABLES:
+                    rows = by_kind.get(kind)
+                    if rows:
+                        # list of params -> executemany
+                        db.execute(insert(TABLES[kind]), rows)
+                db.commit()
+                return {}
+            except DBAPIError as e:
+                db.rollback()
+                if e.connection_invalidated:
+                    raise
+
+            failed: Dict[str, int] = {}
+            for kind in TABLES:
+                rows = by_kind.get(kind)
+                if not rows:
+                    continue
+                try:
+                    db.execute(insert(TABLES[kind]), rows)
+                    db.commit()
+                    continue
+                except DBAPIError as e:
+                    db.rollback()
+                    if e.connection_invalidated:
+                        raise
+                for row in rows:
+                    try:
+                        db.execute(insert(TABLES[kind]), [row])
+                        db.commit()
+                    except DBAPIError as e:
+                        db.rollback()
+                        if e.connection_invalidated:
+                            raise
+                        print(f"write-behind dropped {kind} row: {e.orig}")
+                        failed[kind] = failed.get(kind, 0) + 1
+            return failed
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+write_behind = WriteBehindQueue()
@@ -2,31 +2,93 @@ from __future__ import annotations
 
 import asyncio
 import socket
+import time
 from datetime import datetime
+from typing import Tuple
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from core.db import SessionLocal
 from core.config import settings
+from core.metrics import registry
 from services.ollama_client import OllamaClient
 from services.embedding_service import EmbeddingService
+from services.embedding_batcher import EmbeddingBatcher
 from services.ingest_pipeline import IngestPipeline
 
 # Claim one job atomically:
-# - select next queued job
+# - select next queued job, fairly across tenants
 # - lock row SKIP LOCKED so multiple workers can run safely
 # - update status to running + set lock metadata
+#
+# Fairness:
+# - only each tenant's head job is a candidate (tenant_rank = 1)
+# - tenants at JOB_TENANT_MAX_RUNNING running jobs are skipped; jobs whose
+#   lease (locked_at, renewed by the worker) expired don't count
+# - heads are served round-robin: fewest running first, then the tenant
+#   served least recently
+# - within a tenant, priority ages by one point per :aging_seconds waited
+#   so low-priority jobs cannot starve behind a steady high-priority stream
 PICK_SQL = text(
     """
-SELECT job_id, tenant_id, doc_id
-FROM document_jobs
-WHERE status = 'queued'
-  AND attempts < max_attempts
-ORDER BY priority ASC, created_at ASC
+WITH candidates AS (
+  SELECT j.job_id,
+         j.tenant_id,
+         j.doc_id,
+         j.created_at,
+         (CAST(SYSTIMESTAMP AS DATE) - CAST(j.created_at AS DATE)) * 86400 AS wait_seconds,
+         j.priority - FLOOR(
+           (CAST(SYSTIMESTAMP AS DATE) - CAST(j.created_at AS DATE)) * 86400 / :aging_seconds
+         ) AS effective_priority
+  FROM document_jobs j
+  WHERE j.status = 'queued'
+    AND j.attempts < j.max_attempts
+),
+heads AS (
+  SELECT c.*,
+         ROW_NUMBER() OVER (
+           PARTITION BY c.tenant_id
+           ORDER BY c.effective_priority ASC, c.created_at ASC
+         ) AS tenant_rank
+  FROM candidates c
+),
+running AS (
+  SELECT tenant_id, COUNT(*) AS running_cnt
+  FROM document_jobs
+  WHERE status = 'running'
+    AND locked_at > SYSTIMESTAMP - NUMTODSINTERVAL(:lease_seconds, 'SECOND')
+  GROUP BY tenant_id
+),
+served AS (
+  SELECT tenant_id, MAX(updated_at) AS last_served
+  FROM document_jobs
+  WHERE status IN ('running', 'succeeded', 'failed')
+    AND updated_at > SYSTIMESTAMP - INTERVAL '1' HOUR
+  GROUP BY tenant_id
+)
+SELECT h.job_id, h.tenant_id, h.doc_id, h.wait_seconds
+FROM heads h
+LEFT JOIN running r ON r.tenant_id = h.tenant_id
+LEFT JOIN served s ON s.tenant_id = h.tenant_id
+WHERE h.tenant_rank = 1
+  AND NVL(r.running_cnt, 0) < :tenant_max_running
+ORDER BY NVL(r.running_cnt, 0) ASC,
+         s.last_served ASC NULLS FIRST,
+         h.effective_priority ASC,
+         h.created_at ASC
 FETCH FIRST 1 ROWS ONLY
 """
 )
 
+QUEUE_DEPTH_SQL = text(
+    """
+SELECT tenant_id, status, COUNT(*) AS cnt
+FROM document_jobs
+WHERE status IN ('queued', 'running')
+GROUP BY tenant_id, status
+"""
+)
+
 CLAIM_UPDATE_SQL = text(
     """
 UPDATE document_jobs
@@ -67,6 +129,28 @@ WHERE job_id = :job_id
 """
 )
 
+# renew the lease of every job this worker is running
+HEARTBEAT_SQL = text(
+    """
+UPDATE document_jobs
+SET locked_at = SYSTIMESTAMP
+WHERE locked_by = :locked_by
+  AND status = 'running'
+"""
+)
+
+# running jobs orphaned by a crashed or cancelled worker
+EXPIRED_SQL = text(
+    """
+SELECT job_id, doc_id, locked_by, attempts, max_attempts
+FROM document_jobs
+WHERE status = 'running'
+  AND (locked_at IS NULL
+       OR locked_at < SYSTIMESTAMP - NUMTODSINTERVAL(:lease_seconds, 'SECOND'))
+FOR UPDATE SKIP LOCKED
+"""
+)
+
 REQUEUE_SQL = text(
     """
 UPDATE document_jobs
@@ -81,35 +165,158 @@ WHERE job_id = :job_id
 )
 
 
+job_wait_seconds = registry.histogram(
+    "job_wait_seconds", "Time a job spent queued before being claimed"
+)
+job_queue_depth = registry.gauge("job_queue_depth", "Queued jobs per tenant")
+jobs_running = registry.gauge("jobs_running", "Running jobs per tenant")
+
+
 class DocumentWorker:
-    def __init__(self, poll_seconds: float = 2.0):
+    def __init__(self, poll_seconds: float = 2.0, concurrency: int = 1):
         self.poll_seconds = poll_seconds
+        self.concurrency = max(1, int(concurrency))
         self._stop = asyncio.Event()
         self.worker_id = f"{socket.gethostname()}:{id(self)}"
+        self._inflight: set[asyncio.Task] = set()
+        self._last_queue_metrics = 0.0
+        self._last_heartbeat = 0.0
 
         self.pipeline = IngestPipeline()
         self.ollama = OllamaClient(settings.OLLAMA_BASE_URL)
-        self.embedding = EmbeddingService(self.ollama)
+        # shared across in-flight jobs so small documents still fill batches
+        self.embedding = EmbeddingBatcher(EmbeddingService(self.ollama))
 
     def stop(self):
         self._stop.set()
 
     async def run_forever(self):
         print("running worker scan")
-        while not self._stop.is_set():
-            did_work = await self._try_process_one()
-            if not did_work:
-                await asyncio.sleep(self.poll_seconds)
+        try:
+            while not self._stop.is_set():
+                self._refresh_queue_metrics()
+                self._renew_leases()
+
+                if len(self._inflight) >= self.concurrency:
+                    # bounded, so leases keep being renewed during long jobs
+                    await asyncio.wait(
+                        self._inflight,
+                        timeout=self.poll_seconds,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    continue
+
+                claimed = self._claim_one()
+                if claimed is None:
+                    await asyncio.sleep(self.poll_seconds)
+                    continue
+                if claimed is False:
+                    # lost a race with another worker, try again immediately
+                    continue
+
+                job_id, tenant_id, doc_id = claimed
+                task = asyncio.create_task(
+                    self._process_job(job_id, tenant_id, doc_id)
+                )
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+        finally:
+            for task in list(self._inflight):
+                task.cancel()
+            if self._inflight:
+                await asyncio.gather(*self._inflight, return_exceptions=True)
+            await self.embedding.stop()
+
+    def _renew_leases(self) -> None:
+        """Heartbeat for our running jobs, then reclaim expired ones."""
+        now = time.monotonic()
+        if now - self._last_heartbeat < settings.JOB_LEASE_SECONDS / 3:
+            return
+        self._last_heartbeat = now
 
-    async def _try_process_one(self) -> bool:
+        db: Session = SessionLocal()
+        try:
+            if self._inflight:
+                db.execute(HEARTBEAT_SQL, {"locked_by": self.worker_id})
+            rows = (
+                db.execute(
+                    EXPIRED_SQL, {"lease_seconds": settings.JOB_LEASE_SECONDS}
+                )
+                .mappings()
+                .all()
+            )
+            for r in rows:
+                params = {
+                    "job_id": int(r["job_id"]),
+                    "err": f"lease expired (worker {r['locked_by']})",
+                }
+                if int(r["attempts"]) < int(r["max_attempts"]):
+                    db.execute(REQUEUE_SQL, params)
+                else:
+                    db.execute(MARK_FAILED_SQL, params)
+                    db.execute(
+                        text(
+                            "UPDATE documents SET status = 'failed' "
+                            "WHERE doc_id = :doc_id AND status = 'processing'"
+                        ),
+                        {"doc_id": int(r["doc_id"])},
+                    )
+                print("reclaimed expired job:", r["job_id"], "from", r["locked_by"])
+            db.commit()
+        except Exception as e:
+            print("LEASE RENEWAL FAILED:", repr(e))
+            db.rollback()
+        finally:
+            db.close()
+
+    def _refresh_queue_metrics(self) -> None:
+        now = time.monotonic()
+        if now - self._last_queue_metrics < settings.JOB_QUEUE_METRICS_SECONDS:
+            return
+        self._last_queue_metrics = now
+
+        db: Session = SessionLocal()
+        try:
+            rows = db.execute(QUEUE_DEPTH_SQL).mappings().all()
+            db.rollback()
+        except Exception as e:
+            print("QUEUE METRICS FAILED:", repr(e))
+            return
+        finally:
+            db.close()
+
+        job_queue_depth.clear()
+        jobs_running.clear()
+        for r in rows:
+            gauge = job_queue_depth if r["status"] == "queued" else jobs_running
+            gauge.set(int(r["cnt"]), tenant_id=int(r["tenant_id"]))
+
+    def _claim_one(self) -> Tuple[int, int, int] | None | bool:
+        """
+        Returns (job_id, tenant_id, doc_id) when a job was claimed,
+        None when nothing is eligible and False when we lost a claim race.
+        """
         db: Session = SessionLocal()
         try:
 
             # Pick candidate
-            row = db.execute(PICK_SQL).mappings().first()
+            row = (
+                db.execute(
+                    PICK_SQL,
+                    {
+                        "aging_seconds": max(1, settings.JOB_PRIORITY_AGING_SECONDS),
+                        "tenant_max_running": max(
+                            1, settings.JOB_TENANT_MAX_RUNNING
+                        ),
+                        "lease_seconds": settings.JOB_LEASE_SECONDS,
+                    },
+                )
+                .mappings()
+                .first()
+            )
             if not row:
                 db.rollback()
-                return False
+                return None
 
             job_id = int(row["job_id"])
             tenant_id = int(row["tenant_id"])
@@ -118,23 +325,20 @@ class DocumentWorker:
             res = db.execute(
                 CLAIM_UPDATE_SQL, {"job_id": job_id, "locked_by": self.worker_id}
             )
-            print("res:", res)
             rowcount = getattr(res, "rowcount", None)
             print("claim update rowcount:", rowcount)
 
             if rowcount != 1:
                 # Someone else grabbed it between pick and update
                 db.rollback()
-                return True  # did "work" (we raced), loop again immediately
+                return False
 
             db.commit()
-            dbg = db.execute(
-                text(
-                    "SELECT status, attempts, locked_by FROM document_jobs WHERE job_id=:id"
-                ),
-                {"id": job_id},
-            ).first()
-            print("claimed job state:", dbg)
+            job_wait_seconds.observe(
+                float(row["wait_seconds"] or 0.0), tenant_id=tenant_id
+            )
+            print("claimed job:", job_id, "tenant:", tenant_id)
+            return job_id, tenant_id, doc_id
 
         except Exception as e:
             import traceback
@@ -142,10 +346,11 @@ class DocumentWorker:
             print("CLAIM FAILED:", repr(e))
             traceback.print_exc()
             db.rollback()
-            return False
+            return None
         finally:
             db.close()
 
+    async def _process_job(self, job_id: int, tenant_id: int, doc_id: int) -> None:
         # process outside claim transaction...
         db2: Session = SessionLocal()
         try:
@@ -155,6 +360,7 @@ class DocumentWorker:
                 doc_id=doc_id,
                 embedding_service=self.embedding,
                 max_chars=5000,
+                job_id=job_id,
             )
             print("pipeline result:", result)
 
@@ -185,8 +391,6 @@ class DocumentWorker:
                     db2.execute(MARK_FAILED_SQL, {"job_id": job_id, "err": err})
                 db2.commit()
 
-            return True
-
         except Exception as e:
             import traceback
 
@@ -196,6 +400,5 @@ class DocumentWorker:
             # On unexpected crash, mark failed (or requeue—up to you)
             db2.execute(MARK_FAILED_SQL, {"job_id": job_id, "err": str(e)})
             db2.commit()
-            return True
         finally:
             db2.close()
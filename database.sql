@@ -1,6 +1,9 @@
   CREATE TABLE tenants (
   tenant_id   NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
   name        VARCHAR2(200) NOT NULL,
+  -- bumped on every permission change / new document; cached visibility
+  -- sets in every API process compare against it (services/acl_service.py)
+  acl_version NUMBER DEFAULT 0 NOT NULL,
   created_at  TIMESTAMP DEFAULT SYSTIMESTAMP
 );
 
@@ -35,6 +38,19 @@ CREATE TABLE documents (
   updated_at     TIMESTAMP
 );
 
+-- GET /documents keyset pages: (tenant [, filter], created_at, doc_id)
+CREATE INDEX idx_documents_tenant_created
+  ON documents(tenant_id, created_at DESC, doc_id DESC);
+
+CREATE INDEX idx_documents_tenant_status_created
+  ON documents(tenant_id, status, created_at DESC, doc_id DESC);
+
+CREATE INDEX idx_documents_tenant_mime_created
+  ON documents(tenant_id, mime_type, created_at DESC, doc_id DESC);
+
+CREATE INDEX idx_documents_tenant_owner_created
+  ON documents(tenant_id, owner_user_id, created_at DESC, doc_id DESC);
+
 
 CREATE TABLE document_blobs (
   version_id NUMBER
@@ -68,10 +84,22 @@ CREATE TABLE document_versions (
   doc_id         NUMBER NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,
   version_num    NUMBER NOT NULL,
   sha256         VARCHAR2(64) NOT NULL,
+  -- upload dedup: version whose document_blobs row holds these bytes.
+  -- The owning version keeps the blob; IngestionService.delete_document
+  -- hands blob and references to a surviving copy before deleting it, so
+  -- SET NULL only fires for rows deleted behind its back.
+  content_version_id NUMBER REFERENCES document_versions(version_id) ON DELETE SET NULL,
   created_at     TIMESTAMP DEFAULT SYSTIMESTAMP,
   CONSTRAINT uq_doc_version UNIQUE (doc_id, version_num)
 );
 
+CREATE INDEX idx_doc_versions_sha256
+  ON document_versions(sha256);
+
+-- doc_id filters are bound as one collection: TABLE(:doc_ids)
+CREATE OR REPLACE TYPE num_list AS TABLE OF NUMBER;
+/
+
 CREATE TABLE document_chunks (
   chunk_id     NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
   version_id   NUMBER NOT NULL REFERENCES document_versions(version_id) ON DELETE CASCADE,
@@ -89,6 +117,21 @@ CREATE TABLE document_chunks (
   CONSTRAINT uq_chunk UNIQUE (version_id, chunk_index)
 );
 
+-- no rows for a document = visible tenant-wide (services/acl_service.py)
+CREATE TABLE document_permissions (
+  doc_id         NUMBER NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,
+  principal_id   NUMBER NOT NULL,
+  principal_type VARCHAR2(20) NOT NULL
+                 CONSTRAINT ck_docperm_principal_type CHECK (principal_type IN ('user','group')),
+  role           VARCHAR2(20) NOT NULL
+                 CONSTRAINT ck_docperm_role CHECK (role IN ('owner','reader','writer','admin')),
+  created_at     TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL,
+  CONSTRAINT pk_document_permissions PRIMARY KEY (doc_id, principal_id, principal_type)
+);
+
+CREATE INDEX idx_docperm_principal
+  ON document_permissions(principal_type, principal_id);
+
 CREATE TABLE document_jobs (
   job_id        NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
   tenant_id     NUMBER NOT NULL REFERENCES tenants(tenant_id),
@@ -106,6 +149,14 @@ CREATE TABLE document_jobs (
   locked_by     VARCHAR2(200),
 
   last_error    CLOB,
+  checkpoint_json CLOB,
+
+  stage           VARCHAR2(30),
+  chunks_total    NUMBER,
+  chunks_embedded NUMBER,
+  bytes_processed NUMBER,
+  throughput      NUMBER,
+
   created_at    TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL,
   updated_at    TIMESTAMP
 );
@@ -113,6 +164,10 @@ CREATE TABLE document_jobs (
 CREATE INDEX idx_doc_jobs_status_pri
   ON document_jobs(status, priority, created_at);
 
+-- fair pick: per-tenant head of the queue + running counts per tenant
+CREATE INDEX idx_doc_jobs_status_tenant
+  ON document_jobs(status, tenant_id, priority, created_at);
+
 CREATE INDEX idx_doc_jobs_doc
   ON document_jobs(doc_id);
 
@@ -120,15 +175,62 @@ CREATE INDEX idx_doc_jobs_tenant
   ON document_jobs(tenant_id);
 
 
+-- embedding model registry; model_key is what chunk_embeddings and
+-- document_embeddings store as embedding_model_id
+CREATE TABLE embedding_models (
+  model_key      VARCHAR2(200) PRIMARY KEY,
+  provider_model VARCHAR2(200) NOT NULL,  -- Ollama model name
+  dim            NUMBER NOT NULL,         -- full output dims
+  search_dim     NUMBER NOT NULL,         -- Matryoshka truncation for search
+  storage_format VARCHAR2(10) DEFAULT 'float32' NOT NULL
+                 CHECK (storage_format IN ('float32','int8','binary')),
+  status         VARCHAR2(20) DEFAULT 'available' NOT NULL
+                 CHECK (status IN ('available','retired')),
+  created_at     TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+);
+
+-- per-tenant active model and re-embedding migration state; tenants
+-- without a row use the Settings model (EMBEDDING_MODEL)
+CREATE TABLE tenant_embedding_models (
+  tenant_id        NUMBER PRIMARY KEY REFERENCES tenants(tenant_id),
+  active_model     VARCHAR2(200) NOT NULL,
+  target_model     VARCHAR2(200) REFERENCES embedding_models(model_key),
+  migration_status VARCHAR2(20)
+                   CHECK (migration_status IN ('backfilling','ready','paused')),
+  backfill_after_chunk_id NUMBER DEFAULT 0 NOT NULL,
+  backfilled_chunks       NUMBER DEFAULT 0 NOT NULL,
+  -- a backfiller claims the tenant until then (EMBEDDING_BACKFILL_LEASE_SECONDS)
+  backfill_lease_until    TIMESTAMP,
+  shadow_reads     NUMBER(1) DEFAULT 1 NOT NULL,
+  previous_model   VARCHAR2(200),
+  cutover_at       TIMESTAMP,
+  updated_at       TIMESTAMP
+);
+
 CREATE TABLE chunk_embeddings (
-  chunk_id           NUMBER PRIMARY KEY REFERENCES document_chunks(chunk_id) ON DELETE CASCADE,
+  chunk_id           NUMBER NOT NULL REFERENCES document_chunks(chunk_id) ON DELETE CASCADE,
   tenant_id          NUMBER NOT NULL REFERENCES tenants(tenant_id),
   embedding_model_id VARCHAR2(200) NOT NULL,
+  -- search representation: EMBEDDING_STORAGE_FORMAT (float32/int8/binary)
+  -- at EMBEDDING_SEARCH_DIM dims (Matryoshka truncation)
   embedding_dim      NUMBER NOT NULL,
-  embedding          VECTOR(4096, FLOAT32) NOT NULL,
-  created_at         TIMESTAMP DEFAULT SYSTIMESTAMP
+  embedding_format   VARCHAR2(10) DEFAULT 'float32' NOT NULL,
+  embedding          VECTOR(*, *) NOT NULL,
+  -- full-precision copy for the rerank pass; only set when embedding is compact
+  -- and EMBEDDING_KEEP_FULL=1 (it outweighs the compact vector)
+  embedding_full     VECTOR(*, FLOAT32),
+  created_at         TIMESTAMP DEFAULT SYSTIMESTAMP,
+  -- one row per model, so a new model backfills next to the active one
+  CONSTRAINT pk_chunk_embeddings PRIMARY KEY (chunk_id, embedding_model_id)
 );
 
+CREATE INDEX idx_chunk_emb_tenant_model
+  ON chunk_embeddings(tenant_id, embedding_model_id);
+
+-- the index needs one format/dim across the column; build it after
+-- choosing EMBEDDING_STORAGE_FORMAT (int8 ~4x, binary ~32x smaller graph).
+-- A migration to a model with another format/dim needs it dropped while
+-- both models are stored and rebuilt after gc.
 CREATE VECTOR INDEX chunk_emb_hnsw_idx
   ON chunk_embeddings (embedding)
   ORGANIZATION INMEMORY NEIGHBOR GRAPH;
@@ -137,12 +239,39 @@ CREATE INDEX chunk_text_ctx_idx
   ON document_chunks(chunk_text)
   INDEXTYPE IS CTXSYS.CONTEXT;
 
+-- one vector per document: normalized mean of its chunk embeddings, used
+-- to pick the top documents before chunk search (RETRIEVAL_MODE=hierarchical)
+CREATE TABLE document_embeddings (
+  doc_id             NUMBER NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,
+  version_id         NUMBER NOT NULL REFERENCES document_versions(version_id) ON DELETE CASCADE,
+  tenant_id          NUMBER NOT NULL REFERENCES tenants(tenant_id),
+  embedding_model_id VARCHAR2(200) NOT NULL,
+  embedding_dim      NUMBER NOT NULL,
+  chunk_count        NUMBER NOT NULL,
+  embedding          VECTOR(*, FLOAT32) NOT NULL,  -- at the search dim
+  created_at         TIMESTAMP DEFAULT SYSTIMESTAMP,
+  CONSTRAINT pk_document_embeddings PRIMARY KEY (doc_id, embedding_model_id)
+);
+
+CREATE INDEX idx_doc_embeddings_tenant
+  ON document_embeddings(tenant_id);
+
+CREATE VECTOR INDEX doc_emb_hnsw_idx
+  ON document_embeddings (embedding)
+  ORGANIZATION INMEMORY NEIGHBOR GRAPH;
+
 CREATE TABLE conversations (
   conversation_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
   tenant_id       NUMBER NOT NULL REFERENCES tenants(tenant_id),
   user_id         NUMBER NOT NULL REFERENCES app_users(user_id),
   chat_model_id   VARCHAR2(200) NOT NULL,
   title           VARCHAR2(500),
+  -- rolling summary of messages up to summary_message_id
+  summary_text          CLOB,
+  summary_message_id    NUMBER,
+  summary_tokens        NUMBER,
+  summary_source_tokens NUMBER,
+  summary_updated_at    TIMESTAMP,
   created_at      TIMESTAMP DEFAULT SYSTIMESTAMP,
   updated_at      TIMESTAMP
 );
@@ -155,6 +284,10 @@ CREATE TABLE messages (
   created_at      TIMESTAMP DEFAULT SYSTIMESTAMP
 );
 
+-- history pages, newest first
+CREATE INDEX idx_messages_conv_created
+  ON messages(conversation_id, created_at DESC, message_id DESC);
+
 CREATE TABLE message_citations (
   citation_id    NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
 
@@ -177,7 +310,8 @@ CREATE TABLE message_citations (
   CONSTRAINT uq_message_chunk UNIQUE (message_id, chunk_id)
 );
 
-CREATE INDEX ix_msgcit_message ON message_citations(message_id);
+-- citations for a page of messages, best first
+CREATE INDEX ix_msgcit_message ON message_citations(message_id, score DESC);
 CREATE INDEX ix_msgcit_doc ON message_citations(doc_id);
 CREATE INDEX ix_msgcit_chunk ON message_citations(chunk_id);
 
@@ -191,3 +325,35 @@ CREATE TABLE retrieval_events (
   created_at   TIMESTAMP DEFAULT SYSTIMESTAMP
 );
 
+-- semantic answer cache: answer reused when a query embedding is close to a
+-- cached one and retrieval returned the same chunks (chunk_key)
+CREATE TABLE answer_cache (
+  cache_id        NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  tenant_id       NUMBER NOT NULL REFERENCES tenants(tenant_id),
+  chat_model_id   VARCHAR2(200) NOT NULL,
+  chunk_key       VARCHAR2(64) NOT NULL,  -- sha256 of sorted (chunk_id, version_id)
+  -- sha256 of the conversation summary + history the answer was generated with
+  context_key     VARCHAR2(64) NOT NULL,
+  query_text      CLOB NOT NULL,
+  -- query embeddings only compare within one embedding model
+  embedding_model_id VARCHAR2(200) NOT NULL,
+  query_embedding VECTOR(*, FLOAT32) NOT NULL,
+  answer          CLOB NOT NULL,
+  citations_json  CLOB,
+  gen_seconds     NUMBER,
+  hit_count       NUMBER DEFAULT 0 NOT NULL,
+  last_hit_at     TIMESTAMP,
+  created_at      TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+);
+
+CREATE INDEX idx_answer_cache_key
+  ON answer_cache(tenant_id, chunk_key, context_key, chat_model_id, embedding_model_id);
+
+CREATE TABLE answer_cache_docs (
+  cache_id NUMBER NOT NULL REFERENCES answer_cache(cache_id) ON DELETE CASCADE,
+  doc_id   NUMBER NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,
+  CONSTRAINT pk_answer_cache_docs PRIMARY KEY (cache_id, doc_id)
+);
+
+CREATE INDEX idx_answer_cache_docs_doc
+  ON answer_cache_docs(doc_id);
@@ -1,7 +1,9 @@
 'use client';
 
 import { ColumnDef, Table } from '@/components/Table/Table';
-import React, { useEffect, useState } from 'react';
+import Button from '@/components/Button/Button';
+import { useDocumentPages } from '@/hooks/useDocumentPages';
+import React, { useState } from 'react';
 
 import styles from './DocumentsTable.module.css';
 
@@ -19,36 +21,12 @@ type DocumentsTableProps = {
 };
 
 function DocumentsTable({ selected = [], handleSelect }: DocumentsTableProps) {
-  // load all documents user has access to
-  const [documents, setDocuments] = useState([]);
-  const [loading, setLoading] = useState(true);
+  // documents the user has access to, one page at a time
+  const { documents, total, loading, hasMore, loadMore } =
+    useDocumentPages<DocRow>();
 
   const [expand, setExpand] = useState(true);
 
-  const loadDocuments = async () => {
-    try {
-      const API_BASE =
-        process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
-
-      const res = await fetch(`${API_BASE}/documents`, {
-        credentials: 'include',
-      });
-      if (!res.ok) throw new Error('Unauthorized');
-      const data = await res.json();
-      setDocuments(data);
-    } catch (err) {
-      console.warn('No active session');
-      setDocuments([]);
-      // reroute to login
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  useEffect(() => {
-    loadDocuments();
-  }, []);
-
   const columns: ColumnDef<DocRow>[] = [
     {
       title: 'Select',
@@ -104,9 +82,19 @@ function DocumentsTable({ selected = [], handleSelect }: DocumentsTableProps) {
         className={styles.table + ' ' + (expand ? styles.expanded : '')}
         data={documents}
         columns={columns}
-        loading={loading}
+        loading={loading && !documents.length}
         rowKey="doc_id"
       />
+      {expand && hasMore && (
+        <Button
+          text={
+            loading
+              ? 'Loading...'
+              : `Load more (${documents.length} of ${total ?? '?'})`
+          }
+          onClick={loadMore}
+        />
+      )}
       {/* ) : (
         ''
       )} */}
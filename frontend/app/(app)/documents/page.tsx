@@ -1,7 +1,9 @@
 'use client';
 
 import { ColumnDef, Table } from '@/components/Table/Table';
-import React, { useEffect, useState } from 'react';
+import Button from '@/components/Button/Button';
+import { useDocumentPages } from '@/hooks/useDocumentPages';
+import React from 'react';
 
 type DocRow = {
   doc_id: number;
@@ -12,33 +14,9 @@ type DocRow = {
 };
 
 function Documents() {
-  // load all documents user has access to
-  const [documents, setDocuments] = useState([]);
-  const [loading, setLoading] = useState(true);
-
-  const loadDocuments = async () => {
-    try {
-      const API_BASE =
-        process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
-
-      const res = await fetch(`${API_BASE}/documents`, {
-        credentials: 'include',
-      });
-      if (!res.ok) throw new Error('Unauthorized');
-      const data = await res.json();
-      setDocuments(data);
-    } catch (err) {
-      console.warn('No active session');
-      setDocuments([]);
-      // reroute to login
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  useEffect(() => {
-    loadDocuments();
-  }, []);
+  // documents the user has access to, one page at a time
+  const { documents, total, loading, hasMore, loadMore } =
+    useDocumentPages<DocRow>();
 
   const columns: ColumnDef<DocRow>[] = [
     { title: 'Title', key: 'title', sortable: true },
@@ -61,9 +39,20 @@ function Documents() {
       <Table
         data={documents}
         columns={columns}
-        loading={loading}
+        loading={loading && !documents.length}
         rowKey="doc_id"
       />
+      <div style={{ display: 'flex', gap: 8, alignItems: 'center' }}>
+        <span>
+          {documents.length} of {total ?? documents.length} documents
+        </span>
+        {hasMore && (
+          <Button
+            text={loading ? 'Loading...' : 'Load more'}
+            onClick={loadMore}
+          />
+        )}
+      </div>
     </div>
   );
 }
@@ -0,0 +1,61 @@
+'use client';
+
+import { useCallback, useEffect, useRef, useState } from 'react';
+
+const API_BASE = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+
+// GET /documents is keyset-paginated: one page per call, the next page's
+// cursor in X-Next-Cursor and a (capped) count in X-Total-Estimate on the
+// first page. Pages load on demand via loadMore().
+export function useDocumentPages<T>(pageSize = 100) {
+  const [documents, setDocuments] = useState<T[]>([]);
+  const [total, setTotal] = useState<string | null>(null);
+  const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const inFlight = useRef(false);
+
+  const loadPage = useCallback(
+    async (cursor: string | null) => {
+      if (inFlight.current) return;
+      inFlight.current = true;
+      setLoading(true);
+      try {
+        const params = new URLSearchParams({ limit: String(pageSize) });
+        if (cursor) params.set('cursor', cursor);
+        const res = await fetch(`${API_BASE}/documents?${params}`, {
+          credentials: 'include',
+        });
+        if (!res.ok) throw new Error('Unauthorized');
+        const page: T[] = await res.json();
+        setDocuments((prev) => (cursor ? [...prev, ...page] : page));
+        if (!cursor) setTotal(res.headers.get('X-Total-Estimate'));
+        setNextCursor(res.headers.get('X-Next-Cursor'));
+      } catch (err) {
+        console.warn('No active session');
+        if (!cursor) setDocuments([]);
+        setNextCursor(null);
+        // reroute to login
+      } finally {
+        inFlight.current = false;
+        setLoading(false);
+      }
+    },
+    [pageSize]
+  );
+
+  useEffect(() => {
+    loadPage(null);
+  }, [loadPage]);
+
+  const loadMore = () => {
+    if (nextCursor) loadPage(nextCursor);
+  };
+
+  return {
+    documents,
+    total,
+    loading,
+    hasMore: nextCursor !== null,
+    loadMore,
+  };
+}